@@ -0,0 +1,161 @@
+"""Benchmark attack target resolution as the player count grows.
+
+Compares the original linear scan over every player with the spatial grid
+the server resolves small batches through. Players are spread uniformly
+over the map. The grid timing runs each attack as its own tick through
+GameServer.simulate, including applying damage and queueing events, so it
+is a conservative comparison.
+
+The second table resolves growing batches of attacks in one tick with
+BATCH_PLAYERS players, through GameServer.simulate. "grid" forces
+combat's per-attacker path and "numpy" the vectorized one, which needs
+NumPy installed. Before timing anything, check_equivalence runs both
+paths on randomized batches and stops the benchmark if their hits or
+health columns differ.
+
+    python benchmarks/bench_attack.py
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import combat
+from server import GameServer, MAP_WIDTH, MAP_HEIGHT, TILE_SIZE
+
+PLAYER_COUNTS = [10, 100, 1000, 5000, 10000]
+ATTACKS = 2000
+BATCH_PLAYERS = 10000
+BATCH_SIZES = [1, 10, 100, 1000, 10000]
+BATCH_REPEATS = 5
+EQUIVALENCE_TRIALS = 200
+
+def populate(server, count):
+    """Fill the server with players at random positions"""
+    rng = random.Random(count)
+    for player_id in range(1, count + 1):
+        x = rng.uniform(0, MAP_WIDTH * TILE_SIZE)
+        y = rng.uniform(0, MAP_HEIGHT * TILE_SIZE)
+        server.players.add(player_id, f"bench{player_id}", x, y, server.MAX_HEALTH, server.MAX_HEALTH)
+        server.player_grid.update(player_id, x, y)
+
+def linear_targets(server, attacker_id):
+    """Target search as done before the spatial grid"""
+    players = server.players
+    attacker_x, attacker_y = players.position(attacker_id)
+    targets = []
+    for target_id in players:
+        if target_id == attacker_id:
+            continue
+        target_x, target_y = players.position(target_id)
+        distance = ((attacker_x - target_x) ** 2 + (attacker_y - target_y) ** 2) ** 0.5
+        if distance <= server.ATTACK_RANGE:
+            targets.append(target_id)
+    return targets
+
+def grid_attacks(server, attacker_ids):
+    for attacker_id in attacker_ids:
+        server.players.last_attack_time[server.players.slots[attacker_id]] = 0  # Skip the cooldown
+        server.simulate({}, [attacker_id])
+
+def check_equivalence(trials=EQUIVALENCE_TRIALS):
+    """Compare combat's NumPy path against the grid path on random batches"""
+    rng = random.Random(0)
+    server = GameServer()
+    for trial in range(trials):
+        # A crowded corner of the map, so targets take several hits and die
+        count = rng.randint(2, 400)
+        size = rng.choice([100, 400, MAP_WIDTH * TILE_SIZE])
+        for player_id in list(server.players):
+            server.players.remove(player_id)
+            server.player_grid.remove(player_id)
+        for player_id in range(1, count + 1):
+            x = rng.uniform(0, size)
+            y = rng.uniform(0, size)
+            server.players.add(player_id, f"bench{player_id}", x, y, rng.randint(1, server.MAX_HEALTH), server.MAX_HEALTH)
+            server.player_grid.update(player_id, x, y)
+        for player_id in rng.sample(range(1, count + 1), count // 5):  # Leave free slots
+            server.players.remove(player_id)
+            server.player_grid.remove(player_id)
+        live_slots = [server.players.slots[player_id] for player_id in server.players]
+        attacker_slots = rng.sample(live_slots, rng.randint(1, len(live_slots)))
+
+        health = server.players.health
+        before = health[:]
+        python_hits = combat.resolve_hits_python(server.players, attacker_slots, server.ATTACK_RANGE,
+                                                 server.ATTACK_DAMAGE, server.player_grid)
+        python_health = health[:]
+        health[:] = before
+        numpy_hits = combat.resolve_hits_numpy(server.players, attacker_slots, server.ATTACK_RANGE,
+                                               server.ATTACK_DAMAGE)
+        assert numpy_hits == python_hits, f"trial {trial}: hits differ"
+        assert health == python_health, f"trial {trial}: health differs"
+
+        # Batched respawns land on clear spots within range of the spawn point
+        killed = [target_slot for _, target_slot, remaining in numpy_hits if remaining <= 0]
+        for x, y in combat.respawn_numpy(server.players, killed, server.MAX_HEALTH, server.spawn_x,
+                                         server.spawn_y, server.spawn_range, server.collision_map):
+            assert abs(x - server.spawn_x) <= server.spawn_range and abs(y - server.spawn_y) <= server.spawn_range
+            assert server.is_valid_spawn_position(x, y)
+        assert all(health[target_slot] == server.MAX_HEALTH for target_slot in killed)
+    server.close()
+    print(f"NumPy and grid paths agree on {trials} random batches")
+
+def batch_ms(batch_size, vectorize_min):
+    """Average time to resolve one tick's batch of attacks"""
+    combat.VECTORIZE_MIN_ATTACKS = vectorize_min
+    server = GameServer()
+    populate(server, BATCH_PLAYERS)
+    rng = random.Random(batch_size)
+    total = 0.0
+    for _ in range(BATCH_REPEATS):
+        attacker_ids = rng.sample(range(1, BATCH_PLAYERS + 1), batch_size)
+        for attacker_id in attacker_ids:
+            server.players.last_attack_time[server.players.slots[attacker_id]] = 0  # Skip the cooldown
+        start = time.perf_counter()
+        server.simulate({}, attacker_ids)
+        total += time.perf_counter() - start
+    server.close()
+    return total / BATCH_REPEATS * 1000
+
+def main():
+    if combat.np is not None:
+        check_equivalence()
+        print()
+
+    print(f"{'players':>8} {'linear us/attack':>17} {'grid us/attack':>15} {'speedup':>8}")
+    for count in PLAYER_COUNTS:
+        server = GameServer()
+        populate(server, count)
+        rng = random.Random(0)
+        attacker_ids = [rng.randint(1, count) for _ in range(ATTACKS)]
+
+        start = time.perf_counter()
+        for attacker_id in attacker_ids:
+            linear_targets(server, attacker_id)
+        linear_us = (time.perf_counter() - start) / ATTACKS * 1e6
+
+        start = time.perf_counter()
+        grid_attacks(server, attacker_ids)
+        grid_us = (time.perf_counter() - start) / ATTACKS * 1e6
+
+        server.close()
+        print(f"{count:>8} {linear_us:>17.1f} {grid_us:>15.1f} {linear_us / grid_us:>7.1f}x")
+
+    print()
+    print(f"Batches with {BATCH_PLAYERS} players")
+    print(f"{'attacks':>8} {'grid ms':>9} {'numpy ms':>9} {'speedup':>8}")
+    default_min = combat.VECTORIZE_MIN_ATTACKS
+    for batch_size in BATCH_SIZES:
+        grid_ms = batch_ms(batch_size, float("inf"))
+        if combat.np is not None:
+            numpy_ms = batch_ms(batch_size, 0)
+            print(f"{batch_size:>8} {grid_ms:>9.2f} {numpy_ms:>9.2f} {grid_ms / numpy_ms:>7.1f}x")
+        else:
+            print(f"{batch_size:>8} {grid_ms:>9.2f} {'n/a':>9} {'-':>8}")
+    combat.VECTORIZE_MIN_ATTACKS = default_min
+
+if __name__ == "__main__":
+    main()
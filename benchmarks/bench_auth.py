@@ -0,0 +1,132 @@
+"""Benchmark a login burst: many clients connecting and logging in at once.
+
+Runs the threaded server on a local port and releases CONNECTS client
+threads together, each connecting and logging in to its own account.
+"legacy" is the original login path (a fresh sqlite3 connection per
+request, no WAL, unsalted SHA-256, last_login committed on every login).
+"current" is the server's own path: pooled UserStore, with scrypt
+verification in the password worker processes. Each variant gets its own
+scratch database directory. The max tick column shows whether the burst
+disturbed the game loop.
+
+    python benchmarks/bench_auth.py
+"""
+import hashlib
+import os
+import socket
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# The server creates its data directory relative to the working directory
+os.chdir(tempfile.mkdtemp(prefix="bench-auth-"))
+
+from passwords import hash_password
+from protocol import decode_payload, encode_message
+from server import GameServer
+
+CONNECTS = 200
+PASSWORD = "benchpass"
+PORT = 5590
+
+class LegacyAuthServer(GameServer):
+    """Login as done before the pooled UserStore"""
+
+    def login_user(self, username, password):
+        with self.lock:
+            if username in self.active_users:
+                return (False, "User already logged in")
+        password_hash = hashlib.sha256(password.encode()).hexdigest()
+        conn = sqlite3.connect(self.user_store.path)
+        cursor = conn.cursor()
+        cursor.execute("SELECT id FROM users WHERE username = ? AND password_hash = ?", (username, password_hash))
+        if not cursor.fetchone():
+            conn.close()
+            return (False, "Invalid username or password")
+        cursor.execute("UPDATE users SET last_login = ? WHERE username = ?", (datetime.now().isoformat(), username))
+        conn.commit()
+        conn.close()
+        with self.lock:
+            self.active_users[username] = True
+        return (True, "Login successful")
+
+def receive(sock):
+    header = b""
+    while len(header) < 4:
+        header += sock.recv(4 - len(header))
+    length = int.from_bytes(header, "big")
+    payload = b""
+    while len(payload) < length:
+        payload += sock.recv(length - len(payload))
+    return decode_payload(payload)
+
+def login_client(index, barrier, latencies, sockets):
+    barrier.wait()
+    start = time.perf_counter()
+    sock = socket.create_connection(("localhost", PORT))
+    sock.sendall(encode_message({"type": "login", "username": f"bench{index}", "password": PASSWORD}))
+    result = receive(sock)
+    while result.get("type") != "login_result":
+        result = receive(sock)
+    latencies.append((time.perf_counter() - start, result["success"]))
+    sockets.append(sock)
+
+def run(server_class, name, password_hash):
+    global PORT
+    PORT += 1
+    workdir = tempfile.mkdtemp(prefix=name + "-")
+    os.makedirs(os.path.join(workdir, "data"))
+    os.chdir(workdir)
+
+    server = server_class('localhost', PORT)
+    server.METRICS_REPORT_INTERVAL = float("inf")
+    for index in range(CONNECTS):
+        server.user_store.create_user(f"bench{index}", password_hash)
+    thread = threading.Thread(target=server.start)
+    thread.daemon = True
+    thread.start()
+    time.sleep(1.0)  # Let the password workers start
+    server.max_tick_time = 0.0
+
+    barrier = threading.Barrier(CONNECTS + 1)
+    latencies = []
+    sockets = []
+    clients = [threading.Thread(target=login_client, args=(i, barrier, latencies, sockets)) for i in range(CONNECTS)]
+    for client in clients:
+        client.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for client in clients:
+        client.join()
+    elapsed = time.perf_counter() - start
+
+    for sock in sockets:
+        sock.close()
+    server.close()
+    successes = sum(1 for _, success in latencies if success)
+    latencies = sorted(latency for latency, _ in latencies)
+    return (successes, successes / elapsed, latencies[len(latencies) // 2] * 1000,
+            latencies[int(len(latencies) * 0.99)] * 1000, server.max_tick_time * 1000)
+
+def main():
+    # Keep the server's per-connection logging out of the results
+    results = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+
+    # Every account shares one password, so one hash per scheme is enough
+    variants = [
+        (LegacyAuthServer, "legacy", hashlib.sha256(PASSWORD.encode()).hexdigest()),
+        (GameServer, "current", hash_password(PASSWORD)),
+    ]
+    print(f"{'variant':>8} {'ok':>4} {'logins/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'max tick ms':>12}", file=results)
+    for server_class, name, password_hash in variants:
+        successes, rate, p50, p99, max_tick = run(server_class, name, password_hash)
+        print(f"{name:>8} {successes:>4} {rate:>9.0f} {p50:>8.1f} {p99:>8.1f} {max_tick:>12.2f}", file=results)
+
+if __name__ == "__main__":
+    main()
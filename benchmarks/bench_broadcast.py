@@ -0,0 +1,76 @@
+"""Measure game_state fan-out cost for a crowd of clients that see each other.
+
+Each tick a share of the players move, every client acknowledges the
+previous state, and GameServer.send_game_state builds and encodes the
+deltas. The "per-client" column is what encoding every client's message
+separately would cost, the "shared" column is the server's actual encode
+time with records encoded once per tick.
+
+    python benchmarks/bench_broadcast.py
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from protocol import ENCODING_BINARY, ENCODING_JSON, decode_payload, encode_message
+from server import ClientConnection, GameServer
+
+CLIENT_COUNTS = [50, 200]
+TICKS = 60
+MOVING_SHARE = 0.5
+
+class FrameSink(ClientConnection):
+    """Connection that keeps the last queued frame instead of writing it"""
+
+    def start_writer(self):
+        self.last_frame = None
+
+    def enqueue(self, frame, kind=None):
+        self.last_frame = frame
+        return True
+
+def run(count, encoding):
+    server = GameServer()
+    server.METRICS_REPORT_INTERVAL = float("inf")
+    rng = random.Random(count)
+    for player_id in range(1, count + 1):
+        # Everyone inside one screen, so every client sees every player
+        server.players.add(player_id, f"bench{player_id}", 700 + rng.randint(0, 600), 700 + rng.randint(0, 400), 100, 100)
+        server.clients[player_id] = FrameSink(None, encoding=encoding)
+
+    tick_time = 0.0
+    per_client_time = 0.0
+    for tick in range(TICKS):
+        players = server.players
+        for player_id in rng.sample(list(players), int(count * MOVING_SHARE)):
+            players.x[players.slots[player_id]] += rng.choice([-5, 5])
+
+        start = time.perf_counter()
+        server.send_game_state()
+        tick_time += time.perf_counter() - start
+
+        # Cost of serializing each client's message on its own
+        messages = [decode_payload(client.last_frame[4:]) for client in server.clients.values()]
+        start = time.perf_counter()
+        for message in messages:
+            encode_message(message, encoding)
+        per_client_time += time.perf_counter() - start
+
+        for client in server.clients.values():
+            client.acked_seq = client.sent_seq
+
+    server.close()
+    return (per_client_time / TICKS * 1000, server.encode_time / TICKS * 1000, tick_time / TICKS * 1000)
+
+def main():
+    print(f"{'clients':>7} {'encoding':>8} {'per-client ms':>14} {'shared ms':>10} {'tick ms':>8}")
+    for count in CLIENT_COUNTS:
+        for encoding in (ENCODING_JSON, ENCODING_BINARY):
+            per_client, shared, tick = run(count, encoding)
+            print(f"{count:>7} {encoding:>8} {per_client:>14.2f} {shared:>10.2f} {tick:>8.2f}")
+
+if __name__ == "__main__":
+    main()
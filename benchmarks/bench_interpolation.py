@@ -0,0 +1,102 @@
+"""Measure how smoothly a remote player is drawn at 30 and 15 Hz broadcasts.
+
+A simulated remote player walks at the client's speed, turning now and
+then, on a 30 Hz server tick. Its game_state updates reach the client
+after LATENCY plus up to JITTER seconds, and every STALL_EVERY seconds
+the connection stalls for STALL seconds, after which the queued updates
+arrive together. The client draws at 60 FPS either the last received
+position ("latest", what it did before) or the InterpolationBuffer's.
+
+"frozen %" is the share of frames where the drawn player did not move
+while the real one did. "jerk px" is the mean change in drawn movement
+between consecutive frames, and zero for perfectly even motion. "lag px"
+is the mean distance behind the player's real position.
+
+    python benchmarks/bench_interpolation.py
+"""
+import math
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from interpolation import InterpolationBuffer
+
+DURATION = 60.0
+TICK_RATE = 30
+FPS = 60
+SPEED = 300  # Pixels per second
+LATENCY = 0.04
+JITTER = 0.03
+STALL_EVERY = 5.0
+STALL = 0.15
+
+def true_path(rng):
+    """Player position at every server tick"""
+    x, y = 1000.0, 1000.0
+    heading = 0.0
+    positions = []
+    for _ in range(int(DURATION * TICK_RATE)):
+        if rng.random() < 0.02:
+            heading = rng.uniform(0, 2 * math.pi)
+        x += math.cos(heading) * SPEED / TICK_RATE
+        y += math.sin(heading) * SPEED / TICK_RATE
+        positions.append((x, y))
+    return positions
+
+def arrivals(positions, broadcast_rate, rng):
+    """(arrival time, position) of every update the client receives, in order"""
+    every = TICK_RATE // broadcast_rate
+    received = []
+    last_arrival = 0.0
+    for tick in range(0, len(positions), every):
+        sent = tick / TICK_RATE
+        arrival = sent + LATENCY + rng.uniform(0, JITTER)
+        stall_start = math.floor(sent / STALL_EVERY) * STALL_EVERY
+        if sent - stall_start < STALL:
+            arrival = max(arrival, stall_start + STALL + LATENCY)  # Held back by the stall
+        last_arrival = max(last_arrival, arrival)  # One TCP stream, updates never overtake
+        received.append((last_arrival, positions[tick]))
+    return received
+
+def run(positions, broadcast_rate, interpolate, seed):
+    received = arrivals(positions, broadcast_rate, random.Random(seed))
+    buffer = InterpolationBuffer()
+    next_update = 0
+    latest = None
+    drawn = []
+    lags = []
+    for frame in range(int(1.0 * FPS), int((DURATION - 1.0) * FPS)):
+        now = frame / FPS
+        while next_update < len(received) and received[next_update][0] <= now:
+            latest = received[next_update][1]
+            buffer.push({"1": {"x": latest[0], "y": latest[1]}}, received[next_update][0])
+            next_update += 1
+        position = buffer.positions(now).get("1", latest) if interpolate else latest
+        drawn.append(position)
+        actual = positions[min(len(positions) - 1, int(now * TICK_RATE))]
+        lags.append(math.hypot(actual[0] - position[0], actual[1] - position[1]))
+
+    frozen = 0
+    jerk = 0.0
+    for i in range(2, len(drawn)):
+        step = (drawn[i][0] - drawn[i - 1][0], drawn[i][1] - drawn[i - 1][1])
+        previous_step = (drawn[i - 1][0] - drawn[i - 2][0], drawn[i - 1][1] - drawn[i - 2][1])
+        if step == (0, 0):
+            frozen += 1
+        jerk += math.hypot(step[0] - previous_step[0], step[1] - previous_step[1])
+    frames = len(drawn) - 2
+    return frozen / frames * 100, jerk / frames, sum(lags) / len(lags)
+
+def main():
+    positions = true_path(random.Random(1))
+    print(f"{'broadcast Hz':>12} {'drawing':>12} {'frozen %':>9} {'jerk px':>8} {'lag px':>7}")
+    for broadcast_rate in (30, 15):
+        for interpolate in (False, True):
+            frozen, jerk, lag = run(positions, broadcast_rate, interpolate, seed=2)
+            name = "interpolated" if interpolate else "latest"
+            print(f"{broadcast_rate:>12} {name:>12} {frozen:>9.1f} {jerk:>8.2f} {lag:>7.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Compare drawing the map tile by tile with blitting pre-rendered chunks.
+
+The camera pans across the whole map, and each frame clears the screen and
+draws the map the way the client does. "tiles" blits every visible tile,
+"chunks" blits the baked chunks overlapping the screen. The one-off bake
+cost (paid again only when the map seed changes) is reported separately.
+Runs headless with SDL's dummy video driver.
+
+    python benchmarks/bench_map_draw.py
+"""
+import os
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from client import (GameMap, MAP_HEIGHT, MAP_WIDTH, SCREEN_HEIGHT, SCREEN_WIDTH, TILE_SIZE, WHITE,
+                    create_tile_grass, create_tile_tree, screen)
+
+FRAMES = 600
+
+def camera_path():
+    """Camera positions panning diagonally back and forth over the map"""
+    max_x = MAP_WIDTH * TILE_SIZE - SCREEN_WIDTH
+    max_y = MAP_HEIGHT * TILE_SIZE - SCREEN_HEIGHT
+    for frame in range(FRAMES):
+        phase = frame / FRAMES * 2
+        fraction = phase if phase <= 1 else 2 - phase
+        yield int(max_x * fraction), int(max_y * fraction)
+
+def time_frames(draw):
+    start = time.perf_counter()
+    for camera_x, camera_y in camera_path():
+        screen.fill(WHITE)
+        draw(camera_x, camera_y)
+    return (time.perf_counter() - start) / FRAMES * 1000
+
+def main():
+    assets = {"grass": create_tile_grass(), "tree": create_tile_tree()}
+    game_map = GameMap()
+
+    tiles_ms = time_frames(lambda x, y: game_map.draw_tiles(screen, x, y, SCREEN_WIDTH, SCREEN_HEIGHT, assets))
+
+    start = time.perf_counter()
+    game_map.bake_chunks(assets)
+    bake_ms = (time.perf_counter() - start) * 1000
+
+    chunks_ms = time_frames(lambda x, y: game_map.draw(screen, x, y, assets))
+
+    print(f"{'method':>7} {'ms/frame':>9}")
+    print(f"{'tiles':>7} {tiles_ms:>9.3f}")
+    print(f"{'chunks':>7} {chunks_ms:>9.3f}")
+    print(f"bake: {bake_ms:.1f} ms for {len(game_map.chunks)} chunks, speedup {tiles_ms / chunks_ms:.1f}x")
+
+if __name__ == "__main__":
+    main()
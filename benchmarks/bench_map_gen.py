@@ -0,0 +1,62 @@
+"""Benchmark map generation for small and large worlds.
+
+"legacy" is the nested loop the server and client each used to run, with
+list-of-strings tiles and the global random module. "python" and "numpy"
+are the two paths of game_map.generate_tiles, and "cached" is
+game_map.load_tiles reading the file written by a previous start.
+
+    python benchmarks/bench_map_gen.py
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import game_map
+from game_map import generate_tiles_python, load_tiles
+
+SIZES = [(50, 50), (250, 250), (1000, 1000)]
+LEGACY_MAX_TILES = 250 * 250  # The legacy and python paths take seconds beyond this
+
+def legacy_map(seed, width, height):
+    """Map generation as done before game_map"""
+    random.seed(seed)
+    tiles = [["grass" for _ in range(width)] for _ in range(height)]
+    clusters = [(width // 5, height // 5), (4 * width // 5, height // 5),
+                (width // 5, 4 * height // 5), (4 * width // 5, 4 * height // 5)]
+    for y in range(height):
+        for x in range(width):
+            distance_to_center = ((x - width // 2) ** 2 + (y - height // 2) ** 2) ** 0.5
+            if distance_to_center > 20 and random.random() < 0.2:
+                tiles[y][x] = "tree"
+            elif 10 < distance_to_center <= 20 and random.random() < 0.08:
+                tiles[y][x] = "tree"
+            else:
+                for cx, cy in clusters:
+                    if ((x - cx) ** 2 + (y - cy) ** 2) ** 0.5 < 2 and random.random() < 0.7:
+                        tiles[y][x] = "tree"
+                        break
+    return tiles
+
+def time_call(function, *args):
+    start = time.perf_counter()
+    function(*args)
+    return (time.perf_counter() - start) * 1000
+
+def main():
+    cache_dir = tempfile.mkdtemp(prefix="bench-map-")
+    print(f"{'size':>10} {'legacy ms':>10} {'python ms':>10} {'numpy ms':>9} {'cached ms':>10}")
+    for width, height in SIZES:
+        small = width * height <= LEGACY_MAX_TILES
+        legacy = f"{time_call(legacy_map, 12345, width, height):.1f}" if small else "-"
+        python = f"{time_call(generate_tiles_python, 12345, width, height):.1f}" if small else "-"
+        numpy = f"{time_call(game_map.generate_tiles_numpy, 12345, width, height):.1f}" if game_map.np else "n/a"
+        load_tiles(12345, width, height, cache_dir)
+        cached = time_call(load_tiles, 12345, width, height, cache_dir)
+        print(f"{width:>4}x{height:<5} {legacy:>10} {python:>10} {numpy:>9} {cached:>10.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Measure server-side movement validation with 500 players.
+
+Every tick each player sends STEPS_PER_TICK positions, a batch as the
+client would send it, heading in a straight line until a tree or the map
+edge stops it. "tick ms" is GameServer.validate_moves for all players,
+speed budget and collision sweeps included. The sweep columns compare
+the CollisionMap tile walk with sampling the segment every pixel against
+the unpacked tiles, per checked step.
+
+    python benchmarks/bench_movement.py
+"""
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# The server creates its data directory relative to the working directory
+os.chdir(tempfile.mkdtemp(prefix="bench-movement-"))
+
+from game_map import COLLISION_OFFSET_X, COLLISION_OFFSET_Y, TREE
+from server import GameServer, MAP_WIDTH, MAP_HEIGHT, TILE_SIZE
+
+PLAYERS = 500
+TICKS = 100
+TICK_RATE = 30
+STEPS_PER_TICK = 2
+STEP_SIZES = [5, 15, 40]  # Pixels per step: client frames, bot steps, long jumps
+
+def sampled_clear(tiles, x0, y0, x1, y1):
+    """Segment check by testing a point every pixel, for comparison"""
+    samples = max(1, int(math.hypot(x1 - x0, y1 - y0)))
+    for i in range(1, samples + 1):
+        x = x0 + (x1 - x0) * i / samples
+        y = y0 + (y1 - y0) * i / samples
+        tile_x = int(x // TILE_SIZE)
+        tile_y = int(y // TILE_SIZE)
+        if (tile_x < 0 or tile_y < 0 or tile_x >= MAP_WIDTH or tile_y >= MAP_HEIGHT or
+                tiles[tile_y * MAP_WIDTH + tile_x] == TREE):
+            return False
+    return True
+
+def run(step_size):
+    server = GameServer()
+    server.MAX_MOVE_SPEED = step_size * STEPS_PER_TICK * TICK_RATE * 1.2  # Room for every step
+    rng = random.Random(step_size)
+    headings = {}
+    for player_id in range(1, PLAYERS + 1):
+        x, y = server.get_valid_spawn_position()
+        server.players.add(player_id, f"bench{player_id}", x, y, server.MAX_HEALTH, server.MAX_HEALTH)
+        headings[player_id] = rng.uniform(0, 2 * math.pi)
+
+    segments = []
+    tick_time = 0.0
+    interval = 1.0 / TICK_RATE
+    next_tick = time.perf_counter()
+    for _ in range(TICKS):
+        paths = {}
+        for player_id, heading in headings.items():
+            x, y = server.players.position(player_id)
+            path = []
+            for _ in range(STEPS_PER_TICK):
+                new_x = x + math.cos(heading) * step_size
+                new_y = y + math.sin(heading) * step_size
+                path.append((new_x, new_y))
+                segments.append((x + COLLISION_OFFSET_X, y + COLLISION_OFFSET_Y,
+                                 new_x + COLLISION_OFFSET_X, new_y + COLLISION_OFFSET_Y))
+                x, y = new_x, new_y
+            paths[player_id] = path
+
+        start = time.perf_counter()
+        moves = server.validate_moves(paths)
+        tick_time += time.perf_counter() - start
+        server.simulate(moves, [])
+
+        # Players that were stopped turn somewhere else
+        for player_id, path in paths.items():
+            if moves.get(player_id) != path[-1]:
+                headings[player_id] = rng.uniform(0, 2 * math.pi)
+
+        # Real time between ticks, since the speed budget refills by the clock
+        next_tick += interval
+        delay = next_tick - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+    rejected = server.moves_rejected.take_window()
+    server.close()
+    return tick_time / TICKS * 1000, segments, rejected.get("collision", 0), rejected.get("speed", 0)
+
+def time_sweeps(check, segments):
+    start = time.perf_counter()
+    for segment in segments:
+        check(*segment)
+    return (time.perf_counter() - start) / len(segments) * 1e6
+
+def main():
+    print(f"{PLAYERS} players, {STEPS_PER_TICK} steps per tick")
+    print(f"{'step px':>8} {'tick ms':>8} {'us/step':>8} {'blocked':>8} {'too fast':>9} "
+          f"{'tile walk us':>13} {'sampled us':>11}")
+    for step_size in STEP_SIZES:
+        tick_ms, segments, blocked, too_fast = run(step_size)
+        step_us = tick_ms * 1000 / (PLAYERS * STEPS_PER_TICK)
+        server = GameServer()
+        tiles = server.map_tiles
+        walk_us = time_sweeps(server.collision_map.segment_clear, segments)
+        sampled_us = time_sweeps(lambda *segment: sampled_clear(tiles, *segment), segments)
+        server.close()
+        print(f"{step_size:>8} {tick_ms:>8.3f} {step_us:>8.2f} {blocked:>8} {too_fast:>9} "
+              f"{walk_us:>13.2f} {sampled_us:>11.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""Measure write amplification of saving player state with 500 players moving.
+
+Every player moves on every tick at the server's tick rate for DURATION
+seconds, then everyone disconnects. "write-through" commits each change
+as the tick applies it, one transaction per player per tick. "write-behind"
+is the server's own path: dirty players are handed to the UserStore
+flusher every PLAYER_SAVE_INTERVAL and on disconnect, and written in one
+batched transaction each time.
+
+Write amplification is reported as rows written per player update and as
+bytes the process wrote to files (the wchar counter in /proc/self/io, so
+Linux only) per player update.
+
+Before measuring, check_rejoin logs a player in over a real socket, moves
+them, logs out and logs in again. It stops the benchmark unless the
+second login spawns them at the saved position in whole pixels.
+
+    python benchmarks/bench_persistence.py
+"""
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# The server creates its data directory relative to the working directory
+os.chdir(tempfile.mkdtemp(prefix="bench-persistence-"))
+
+from protocol import decode_payload, encode_message
+from server import GameServer, MAP_WIDTH, MAP_HEIGHT, TILE_SIZE
+from storage import UPSERT_PLAYER_STATE
+
+PLAYERS = 500
+DURATION = 10.0  # Seconds of play per variant
+TICK_RATE = 30
+REJOIN_PORT = 5580
+
+class WriteThroughServer(GameServer):
+    """Commits every player change on the tick that applied it"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.PLAYER_SAVE_INTERVAL = 0.0
+        self.conn = self.user_store.acquire()
+        self.rows = 0
+        self.transactions = 0
+
+    def save_dirty_players(self):
+        with self.lock:
+            states = [self.player_save_state(player_id)
+                      for player_id in self.dirty_players if player_id in self.players]
+            self.dirty_players.clear()
+        now = time.strftime("%Y-%m-%dT%H:%M:%S")
+        for state in states:
+            with self.conn:
+                self.conn.execute(UPSERT_PLAYER_STATE, state + (now,))
+            self.rows += 1
+            self.transactions += 1
+
+    def disconnect_player(self, player_id):
+        self.dirty_players.add(player_id)
+        self.save_dirty_players()
+        with self.lock:
+            self.players.remove(player_id)
+            self.player_grid.remove(player_id)
+
+def bytes_written():
+    try:
+        with open("/proc/self/io") as io_stats:
+            for line in io_stats:
+                if line.startswith("wchar:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+def populate(server):
+    rng = random.Random(PLAYERS)
+    for player_id in range(1, PLAYERS + 1):
+        x = rng.uniform(0, MAP_WIDTH * TILE_SIZE)
+        y = rng.uniform(0, MAP_HEIGHT * TILE_SIZE)
+        server.players.add(player_id, f"bench{player_id}", x, y, server.MAX_HEALTH, server.MAX_HEALTH)
+        server.player_grid.update(player_id, x, y)
+
+def receive(sock, message_type):
+    """Read messages until one of the given type arrives"""
+    while True:
+        header = b""
+        while len(header) < 4:
+            header += sock.recv(4 - len(header))
+        length = int.from_bytes(header, "big")
+        payload = b""
+        while len(payload) < length:
+            payload += sock.recv(length - len(payload))
+        message = decode_payload(payload)
+        if message.get("type") == message_type:
+            return message
+
+def log_in(username):
+    sock = socket.create_connection(("localhost", REJOIN_PORT))
+    sock.settimeout(5.0)
+    sock.sendall(encode_message({"type": "login", "username": username, "password": "benchpass"}))
+    assert receive(sock, "login_result")["success"]
+    return sock, receive(sock, "player_id")
+
+def check_rejoin():
+    """Log in, move, log out and log in again, and check the saved spawn"""
+    workdir = tempfile.mkdtemp(prefix="rejoin-")
+    os.makedirs(os.path.join(workdir, "data"))
+    os.chdir(workdir)
+
+    server = GameServer('localhost', REJOIN_PORT, TICK_RATE)
+    server.metrics_port = 0
+    server.METRICS_REPORT_INTERVAL = float("inf")
+    thread = threading.Thread(target=server.start)
+    thread.daemon = True
+    thread.start()
+    time.sleep(1.0)  # Let the password workers start
+    try:
+        sock = socket.create_connection(("localhost", REJOIN_PORT))
+        sock.sendall(encode_message({"type": "register", "username": "rejoin", "password": "benchpass"}))
+        assert receive(sock, "register_result")["success"]
+        sock.close()
+
+        sock, spawn = log_in("rejoin")
+        moved = (spawn["x"] + 5, spawn["y"])
+        sock.sendall(encode_message({"type": "input", "positions": [list(moved)]}))
+        time.sleep(0.5)
+        sock.close()
+        time.sleep(0.5)
+
+        sock, spawn = log_in("rejoin")
+        sock.close()
+        position = (spawn["x"], spawn["y"])
+        assert position == moved and all(type(value) is int for value in position), \
+            f"rejoined at {position!r}, expected {moved!r} in whole pixels"
+    finally:
+        server.close()
+
+def run(server_class, name):
+    workdir = tempfile.mkdtemp(prefix=name + "-")
+    os.makedirs(os.path.join(workdir, "data"))
+    os.chdir(workdir)
+
+    server = server_class('localhost', 0, TICK_RATE)
+    server.METRICS_REPORT_INTERVAL = float("inf")
+    populate(server)
+    rng = random.Random(0)
+    written_before = bytes_written()
+
+    interval = 1.0 / TICK_RATE
+    ticks = int(DURATION * TICK_RATE)
+    tick_times = []
+    next_tick = time.perf_counter()
+    for _ in range(ticks):
+        for player_id in server.players:
+            x, y = server.players.position(player_id)
+            server.input_queue.append((player_id, "move", [(x + rng.choice([-5, 5]), y)]))
+        start = time.perf_counter()
+        server.tick()
+        tick_times.append(time.perf_counter() - start)
+        next_tick += interval
+        delay = next_tick - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+    for player_id in list(server.players):
+        server.disconnect_player(player_id)
+    server.close()
+
+    updates = server.player_updates.total()
+    if isinstance(server, WriteThroughServer):
+        rows, transactions = server.rows, server.transactions
+    else:
+        rows = server.user_store.rows_written.total()
+        transactions = server.user_store.flushes.total()
+    written = bytes_written()
+    written = written - written_before if written is not None else None
+    tick_times.sort()
+    return (updates, rows, transactions, written,
+            sum(tick_times) / len(tick_times) * 1000, tick_times[int(len(tick_times) * 0.99)] * 1000)
+
+def main():
+    # Keep the server's connection logging out of the results
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    try:
+        check_rejoin()
+    finally:
+        sys.stdout = stdout
+    print("A returning player spawns at their saved position in whole pixels")
+    print()
+    print(f"{PLAYERS} players moving every tick at {TICK_RATE} Hz for {DURATION:.0f} s, then disconnecting")
+    print(f"{'variant':>13} {'updates':>8} {'rows':>7} {'txns':>6} {'rows/update':>12} "
+          f"{'KiB written':>12} {'bytes/update':>13} {'avg tick ms':>12} {'p99 tick ms':>12}")
+    for server_class, name in ((WriteThroughServer, "write-through"), (GameServer, "write-behind")):
+        updates, rows, transactions, written, avg_tick, p99_tick = run(server_class, name)
+        written_kib = f"{written / 1024:.0f}" if written is not None else "n/a"
+        per_update = f"{written / updates:.1f}" if written is not None else "n/a"
+        print(f"{name:>13} {updates:>8} {rows:>7} {transactions:>6} {rows / updates:>12.3f} "
+              f"{written_kib:>12} {per_update:>13} {avg_tick:>12.3f} {p99_tick:>12.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Measure player storage memory and tick time with 1k and 10k players.
+
+"dict bytes/player" is the dict-per-player layout the server used before
+players.PlayerStore, "store bytes/player" the struct-of-arrays store, both
+measured with tracemalloc and including the usernames. The tick columns run
+GameServer.tick with every player moving, ATTACK_SHARE of them attacking
+and OBSERVERS connected clients receiving game_state.
+
+    python benchmarks/bench_players.py
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# The server creates its data directory relative to the working directory
+os.chdir(tempfile.mkdtemp(prefix="bench-players-"))
+
+from players import PlayerStore
+from protocol import ENCODING_BINARY
+from server import ClientConnection, GameServer, MAP_WIDTH, MAP_HEIGHT, TILE_SIZE
+
+PLAYER_COUNTS = [1000, 10000]
+TICKS = 60
+ATTACK_SHARE = 0.01
+OBSERVERS = 50
+
+class FrameSink(ClientConnection):
+    """Connection that drops queued frames instead of writing them"""
+
+    def start_writer(self):
+        pass
+
+    def enqueue(self, frame, kind=None):
+        return True
+
+def positions(count):
+    rng = random.Random(count)
+    return [(player_id, rng.uniform(0, MAP_WIDTH * TILE_SIZE), rng.uniform(0, MAP_HEIGHT * TILE_SIZE))
+            for player_id in range(1, count + 1)]
+
+def dict_players(spawns):
+    return {player_id: {
+        "username": f"bench{player_id}",
+        "x": x,
+        "y": y,
+        "health": 100,
+        "max_health": 100,
+        "color": (0, 0, 255),
+        "last_attack_time": 0.0
+    } for player_id, x, y in spawns}
+
+def store_players(spawns):
+    store = PlayerStore()
+    for player_id, x, y in spawns:
+        store.add(player_id, f"bench{player_id}", x, y, 100, 100)
+    return store
+
+def measure_memory(build, spawns):
+    tracemalloc.start()
+    players = build(spawns)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del players
+    return size / len(spawns)
+
+def measure_tick(spawns):
+    server = GameServer()
+    server.METRICS_REPORT_INTERVAL = float("inf")
+    server.PLAYER_SAVE_INTERVAL = float("inf")
+    for player_id, x, y in spawns:
+        server.players.add(player_id, f"bench{player_id}", x, y, server.MAX_HEALTH, server.MAX_HEALTH)
+        server.player_grid.update(player_id, x, y)
+    for player_id, _, _ in spawns[:OBSERVERS]:
+        server.clients[player_id] = FrameSink(None, encoding=ENCODING_BINARY)
+
+    rng = random.Random(0)
+    player_ids = [player_id for player_id, _, _ in spawns]
+    tick_time = 0.0
+    for tick in range(TICKS + 1):
+        for player_id in player_ids:
+            x, y = server.players.position(player_id)
+            x = min(MAP_WIDTH * TILE_SIZE - 1, max(0, x + rng.choice([-5, 5])))
+            server.input_queue.append((player_id, "move", [(x, y)]))
+        for player_id in rng.sample(player_ids, int(len(player_ids) * ATTACK_SHARE)):
+            server.input_queue.append((player_id, "attack", []))
+        for client in server.clients.values():
+            client.acked_seq = client.sent_seq
+
+        start = time.perf_counter()
+        server.tick()
+        if tick:
+            tick_time += time.perf_counter() - start  # The first tick sends every observer a keyframe
+
+    server.close()
+    return tick_time / TICKS * 1000
+
+def main():
+    print(f"{'players':>8} {'dict bytes/player':>18} {'store bytes/player':>19} {'tick ms':>8}")
+    for count in PLAYER_COUNTS:
+        spawns = positions(count)
+        dict_size = measure_memory(dict_players, spawns)
+        store_size = measure_memory(store_players, spawns)
+        tick_ms = measure_tick(spawns)
+        print(f"{count:>8} {dict_size:>18.0f} {store_size:>19.0f} {tick_ms:>8.2f}")
+
+if __name__ == "__main__":
+    main()
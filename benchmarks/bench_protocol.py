@@ -0,0 +1,78 @@
+"""Compare bytes and CPU per tick for the JSON and binary wire encodings.
+
+A tick for one client is modelled as the game_state it receives (a keyframe
+when it joins, then deltas where a share of the visible players moved), a
+frame with a few attack events, and the movement update each player sends
+upstream. CPU time covers encoding and decoding the frames.
+
+    python benchmarks/bench_protocol.py
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from protocol import ENCODING_BINARY, ENCODING_JSON, decode_payload, encode_message
+
+VISIBLE_PLAYERS = [10, 50, 200]
+MOVING_SHARE = 0.3
+ATTACKS_PER_TICK = 2
+ROUNDS = 300
+
+def keyframe(rng, count):
+    players = {
+        player_id: {
+            "username": f"player{player_id}",
+            "x": rng.randint(0, 2000),
+            "y": rng.randint(0, 2000),
+            "health": 100,
+            "max_health": 100,
+            "color": (0, 0, 255)
+        }
+        for player_id in range(1, count + 1)
+    }
+    return {"type": "game_state", "seq": 1, "base": 0, "players": players, "removed": []}
+
+def movement_delta(rng, count):
+    moving = rng.sample(range(1, count + 1), max(1, int(count * MOVING_SHARE)))
+    players = {player_id: {"x": rng.randint(0, 2000), "y": rng.randint(0, 2000)} for player_id in moving}
+    return {"type": "game_state", "seq": 2, "base": 1, "players": players, "removed": []}
+
+def attack_event(rng):
+    return {
+        "type": "attack_event",
+        "attacker_id": rng.randint(1, 500),
+        "target_id": rng.randint(1, 500),
+        "damage": 10,
+        "remaining_health": rng.randint(0, 100)
+    }
+
+def measure(messages, encoding):
+    """Return (bytes, microseconds) to encode and decode the messages once"""
+    total_bytes = sum(len(encode_message(message, encoding)) for message in messages)
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        for message in messages:
+            frame = encode_message(message, encoding)
+            decode_payload(frame[4:])
+    return total_bytes, (time.perf_counter() - start) / ROUNDS * 1e6
+
+def main():
+    rng = random.Random(1)
+    print(f"{'visible':>7} {'message':>10} {'json B':>8} {'binary B':>9} {'json us':>8} {'binary us':>10}")
+    for count in VISIBLE_PLAYERS:
+        cases = {
+            "keyframe": [keyframe(rng, count)],
+            "delta": [movement_delta(rng, count),
+                      {"type": "attack_events", "events": [attack_event(rng) for _ in range(ATTACKS_PER_TICK)]}],
+            "upstream": [{"x": rng.randint(0, 2000), "y": rng.randint(0, 2000)} for _ in range(count)],
+        }
+        for name, messages in cases.items():
+            json_bytes, json_us = measure(messages, ENCODING_JSON)
+            binary_bytes, binary_us = measure(messages, ENCODING_BINARY)
+            print(f"{count:>7} {name:>10} {json_bytes:>8} {binary_bytes:>9} {json_us:>8.1f} {binary_us:>10.1f}")
+
+if __name__ == "__main__":
+    main()
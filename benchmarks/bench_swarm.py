@@ -0,0 +1,263 @@
+"""Load test a real server with headless bots and record the results.
+
+For each player count the server runs in its own process (in a scratch
+directory, so it gets a fresh database) and the bots are split over a few
+worker processes. After the bots log in and a warmup, the harness measures
+for a fixed time and reports:
+
+- server tick time p50/p99 and overruns
+- bytes and messages the server pushed to the bots, per second and per tick
+- inputs and attacks sent by the bots, per second
+- end-to-end latency p50/p99, from a bot sending a position to seeing it
+  in a game_state
+- server CPU (% of one core) and resident memory
+
+Each run is appended as a JSON line to benchmarks/results/swarm.jsonl and
+compared with the previous run of the same configuration, so regressions
+show up as the code changes.
+
+    python benchmarks/bench_swarm.py --players 10 100 500 --duration 20
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from bot import BotSwarm, percentile
+
+DEFAULT_PLAYERS = [10, 100, 500]
+DEFAULT_RESULTS = os.path.join(ROOT, "benchmarks", "results", "swarm.jsonl")
+BOTS_PER_WORKER = 125
+
+# Metrics compared against the previous run, with True where lower is better
+COMPARED_METRICS = {
+    "tick_p99_ms": True,
+    "latency_p50_ms": True,
+    "latency_p99_ms": True,
+    "bytes_per_sec": True,
+    "server_cpu_percent": True,
+    "server_rss_mb": True,
+}
+
+def current_rss_mb():
+    """Resident memory of this process, falling back to the peak where /proc is missing"""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def server_process(workdir, mode, port, tick_rate, json_only, pipe):
+    """Run a game server and answer sample requests from the harness"""
+    os.chdir(workdir)
+    sys.stdout = open(os.devnull, "w")
+
+    from protocol import ENCODING_JSON
+    from server import SERVER_MODES
+
+    class InstrumentedServer(SERVER_MODES[mode]):
+        """Server that records how long every tick takes"""
+
+        def tick(self):
+            start = time.perf_counter()
+            super().tick()
+            self.tick_samples.append(time.perf_counter() - start)
+
+    server = InstrumentedServer('localhost', port, tick_rate)
+    server.tick_samples = []
+    server.METRICS_REPORT_INTERVAL = float("inf")
+    if json_only:
+        server.encodings = [ENCODING_JSON]
+
+    thread = threading.Thread(target=server.start)
+    thread.daemon = True
+    thread.start()
+    pipe.send("ready")
+
+    try:
+        while True:
+            command = pipe.recv()
+            if command == "sample":
+                samples, server.tick_samples = server.tick_samples, []
+                usage = resource.getrusage(resource.RUSAGE_SELF)
+                pipe.send({
+                    "time": time.perf_counter(),
+                    "cpu": usage.ru_utime + usage.ru_stime,
+                    "rss_mb": current_rss_mb(),
+                    "ticks": samples,
+                    "overruns": server.tick_overruns
+                })
+            elif command == "stop":
+                break
+    finally:
+        # The password workers are not daemons, this process cannot exit while they run
+        server.close()
+
+def bot_process(port, count, prefix, attack_rate, seed, results, measure, stop):
+    """Run a share of the bots and report their counters for the measured window"""
+    sys.stdout = open(os.devnull, "w")
+    swarm = BotSwarm('localhost', port, count, attack_rate, prefix, seed)
+    results.put(("ready", swarm.start()))
+
+    measure.wait()
+    swarm.reset_stats()
+    stop.wait()
+    results.put(("stats", swarm.stats()))
+    swarm.stop()
+
+def run(players, args, port):
+    """Run one load level and return its result record"""
+    workdir = tempfile.mkdtemp(prefix="swarm-")
+    server_pipe, child_pipe = multiprocessing.Pipe()
+    server = multiprocessing.Process(target=server_process,
+                                     args=(workdir, args.mode, port, args.tick_rate, args.json_only, child_pipe))
+    server.start()
+    server_pipe.recv()
+    time.sleep(0.5)  # Let the server bind before the bots connect
+
+    results = multiprocessing.Queue()
+    measure = multiprocessing.Event()
+    stop = multiprocessing.Event()
+    workers = []
+    remaining = players
+    while remaining > 0:
+        count = min(BOTS_PER_WORKER, remaining)
+        index = len(workers)
+        worker = multiprocessing.Process(target=bot_process,
+                                         args=(port, count, f"bot{index}_", args.attack_rate, index,
+                                               results, measure, stop))
+        worker.start()
+        workers.append(worker)
+        remaining -= count
+
+    logged_in = sum(results.get()[1] for _ in workers)
+    time.sleep(args.warmup)
+
+    server_pipe.send("sample")
+    before = server_pipe.recv()
+    measure.set()
+    time.sleep(args.duration)
+    server_pipe.send("sample")
+    after = server_pipe.recv()
+    stop.set()
+
+    stats = [results.get()[1] for _ in workers]
+    for worker in workers:
+        worker.join()
+    server_pipe.send("stop")
+    server.join()
+
+    elapsed = after["time"] - before["time"]
+    ticks = after["ticks"]
+    latencies = [latency for worker_stats in stats for latency in worker_stats["latencies"]]
+    bytes_received = sum(worker_stats["bytes_received"] for worker_stats in stats)
+    messages_received = sum(worker_stats["messages_received"] for worker_stats in stats)
+    return {
+        "players": players,
+        "logged_in": logged_in,
+        "connected": sum(worker_stats["bots"] for worker_stats in stats),
+        "tick_p50_ms": percentile(ticks, 0.5) * 1000,
+        "tick_p99_ms": percentile(ticks, 0.99) * 1000,
+        "tick_overruns": after["overruns"] - before["overruns"],
+        "bytes_per_sec": bytes_received / elapsed,
+        "bytes_per_tick": bytes_received / max(1, len(ticks)),
+        "messages_per_sec": messages_received / elapsed,
+        "inputs_per_sec": sum(worker_stats["inputs_sent"] for worker_stats in stats) / elapsed,
+        "attacks_per_sec": sum(worker_stats["attacks_sent"] for worker_stats in stats) / elapsed,
+        "latency_p50_ms": percentile(latencies, 0.5) * 1000,
+        "latency_p99_ms": percentile(latencies, 0.99) * 1000,
+        "server_cpu_percent": (after["cpu"] - before["cpu"]) / elapsed * 100,
+        "server_rss_mb": after["rss_mb"]
+    }
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def load_previous(path):
+    """Last recorded result for every configuration"""
+    previous = {}
+    if not os.path.exists(path):
+        return previous
+    with open(path) as results:
+        for line in results:
+            if line.strip():
+                record = json.loads(line)
+                previous[config_key(record)] = record
+    return previous
+
+def config_key(record):
+    return (record["mode"], record["json_only"], record["tick_rate"], record["attack_rate"], record["players"])
+
+def compare(record, previous):
+    """Describe how the key metrics moved since the previous run"""
+    if previous is None:
+        return "first run"
+    changes = []
+    for name, lower_is_better in COMPARED_METRICS.items():
+        old = previous.get(name)
+        if not old:
+            continue
+        change = (record[name] - old) / old * 100
+        worse = change > 0 if lower_is_better else change < 0
+        flag = " !" if worse and abs(change) >= 10 else ""
+        changes.append(f"{name} {change:+.0f}%{flag}")
+    return f"vs {previous.get('commit')}: " + ", ".join(changes)
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the game server with headless bots")
+    parser.add_argument("--players", type=int, nargs="+", default=DEFAULT_PLAYERS)
+    parser.add_argument("--mode", choices=["threaded", "asyncio"], default="threaded")
+    parser.add_argument("--json-only", action="store_true")
+    parser.add_argument("--tick-rate", type=int, default=30)
+    parser.add_argument("--attack-rate", type=float, default=0.5, help="attacks per bot per second")
+    parser.add_argument("--duration", type=float, default=20.0, help="measured seconds per load level")
+    parser.add_argument("--warmup", type=float, default=3.0)
+    parser.add_argument("--port", type=int, default=5600)
+    parser.add_argument("--results", default=DEFAULT_RESULTS)
+    args = parser.parse_args()
+
+    previous = load_previous(args.results)
+    os.makedirs(os.path.dirname(os.path.abspath(args.results)), exist_ok=True)
+    revision = git_revision()
+
+    print(f"{'players':>7} {'tick p50':>9} {'tick p99':>9} {'KiB/s':>8} {'B/tick':>8} {'msg/s':>8} "
+          f"{'in/s':>7} {'lat p50':>8} {'lat p99':>8} {'cpu %':>6} {'rss MB':>7}")
+    for offset, players in enumerate(args.players):
+        result = run(players, args, args.port + offset)
+        record = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": revision,
+            "mode": args.mode,
+            "json_only": args.json_only,
+            "tick_rate": args.tick_rate,
+            "attack_rate": args.attack_rate,
+            "duration": args.duration,
+            **result
+        }
+        with open(args.results, "a") as results:
+            results.write(json.dumps(record) + "\n")
+
+        print(f"{players:>7} {record['tick_p50_ms']:>9.2f} {record['tick_p99_ms']:>9.2f} "
+              f"{record['bytes_per_sec'] / 1024:>8.1f} {record['bytes_per_tick']:>8.0f} "
+              f"{record['messages_per_sec']:>8.0f} {record['inputs_per_sec']:>7.0f} "
+              f"{record['latency_p50_ms']:>8.1f} {record['latency_p99_ms']:>8.1f} "
+              f"{record['server_cpu_percent']:>6.1f} {record['server_rss_mb']:>7.1f}")
+        if record["connected"] < players:
+            print(f"        only {record['connected']} of {players} bots stayed connected")
+        print(f"        {compare(record, previous.get(config_key(record)))}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Benchmark the simulation step with the world split into zone processes.
+
+Every player moves on every tick and ATTACK_SHARE of them try to attack,
+subject to the usual cooldown. "1" is the single-process
+GameServer.simulate; the other rows run the same inputs through
+ZonedGameServer with that many zone workers. "sim ms" is
+the front-end's wall time per tick, "zone ms" the slowest zone's own work
+per tick, and the difference is pickling and pipe overhead. Zones only
+pay off when there are at least as many free cores as zones.
+
+    python benchmarks/bench_zones.py
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# The server creates its data directory relative to the working directory
+os.chdir(tempfile.mkdtemp(prefix="bench-zones-"))
+
+from server import GameServer, MAP_WIDTH, MAP_HEIGHT, TILE_SIZE
+from zones import ZonedGameServer
+
+PLAYER_COUNTS = [1000, 5000]
+ZONE_COUNTS = [1, 2, 4]
+TICKS = 100
+ATTACK_SHARE = 0.01  # About one attack every 3 seconds per player
+
+def populate(server, count):
+    rng = random.Random(count)
+    for player_id in range(1, count + 1):
+        x = rng.uniform(0, MAP_WIDTH * TILE_SIZE)
+        y = rng.uniform(0, MAP_HEIGHT * TILE_SIZE)
+        server.players.add(player_id, f"bench{player_id}", x, y, server.MAX_HEALTH, server.MAX_HEALTH)
+        server.player_grid.update(player_id, x, y)
+        if isinstance(server, ZonedGameServer):
+            server.assign_zone(player_id)
+
+def run(count, zones):
+    if zones == 1:
+        server = GameServer()
+    else:
+        server = ZonedGameServer(zones=zones)
+        server.start_zones()
+    populate(server, count)
+    rng = random.Random(0)
+    player_ids = list(server.players)
+
+    sim_time = 0.0
+    for tick in range(TICKS + 1):
+        moves = {}
+        for player_id in player_ids:
+            x, y = server.players.position(player_id)
+            moves[player_id] = (min(MAP_WIDTH * TILE_SIZE - 1, max(0, x + rng.choice([-20, 20]))), y)
+        attackers = rng.sample(player_ids, int(count * ATTACK_SHARE))
+
+        start = time.perf_counter()
+        server.simulate(moves, attackers)
+        if tick:
+            sim_time += time.perf_counter() - start  # The first tick also sends every join
+
+    zone_time = 0.0
+    handoffs = 0
+    if zones > 1:
+        steps = server.zone_step_duration.take_window()
+        zone_time = max(step_sum / step_count for step_count, step_sum, _ in steps.values())
+        handoffs = server.zone_handoffs.total()
+    server.close()
+    return sim_time / TICKS * 1000, zone_time * 1000, handoffs / (TICKS + 1)
+
+def main():
+    print(f"{os.cpu_count()} CPUs")
+    print(f"{'players':>8} {'zones':>6} {'sim ms':>8} {'zone ms':>8} {'handoffs/tick':>14}")
+    for count in PLAYER_COUNTS:
+        for zones in ZONE_COUNTS:
+            sim_ms, zone_ms, handoffs = run(count, zones)
+            zone_column = f"{zone_ms:.3f}" if zones > 1 else "-"
+            print(f"{count:>8} {zones:>6} {sim_ms:>8.3f} {zone_column:>8} {handoffs:>14.1f}")
+
+if __name__ == "__main__":
+    main()
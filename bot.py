@@ -0,0 +1,249 @@
+"""Headless bot players for load testing the game server.
+
+Bots use the same NetworkClient as the pygame client: they register (or log
+in to an existing account), then wander the map and attack at a configurable
+rate. Each bot also measures end-to-end latency, from sending a position to
+seeing it in a game_state from the server.
+
+    python bot.py --bots 100
+"""
+import argparse
+import random
+import threading
+import time
+
+from game_map import COLLISION_OFFSET_X, COLLISION_OFFSET_Y, CollisionMap, load_tiles
+from network import NetworkClient
+
+# Map constants (must match the server)
+MAP_WIDTH = 50
+MAP_HEIGHT = 50
+TILE_SIZE = 40
+
+BOT_SPEED = 300  # Pixels per second, the client's 5 px per frame at 60 FPS
+BOT_STEP_RATE = 20  # Bot updates (and input sends) per second
+BOT_PASSWORD = "botpass"
+
+collision_maps = {}  # Map seed -> CollisionMap, shared by every bot
+
+def collision_map_for(seed):
+    collision_map = collision_maps.get(seed)
+    if collision_map is None:
+        tiles = load_tiles(seed, MAP_WIDTH, MAP_HEIGHT)
+        collision_map = collision_maps[seed] = CollisionMap(tiles, MAP_WIDTH, MAP_HEIGHT, TILE_SIZE)
+    return collision_map
+
+class BotClient(NetworkClient):
+    """NetworkClient driven by a wandering bot instead of a player"""
+
+    def __init__(self, host, port, name, attack_rate, rng):
+        super().__init__(host, port)
+        self.name = name
+        self.attack_rate = attack_rate  # Attacks per second
+        self.rng = rng
+        self.x = None
+        self.y = None
+        self.target = None
+        self.known_spawn = None
+
+        # Positions sent but not yet seen in a game_state, with their send time
+        self.sent_positions = {}
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.latencies = []
+        self.inputs_sent = 0
+        self.attacks_sent = 0
+        self.bytes_received = 0
+        self.messages_received = 0
+
+    def log_in(self, timeout=10.0):
+        """Register the bot's account if needed and log in"""
+        self.register(self.name, BOT_PASSWORD)
+        if not self.wait_for("last_register_result", timeout):
+            return False
+
+        self.login(self.name, BOT_PASSWORD)
+        result = self.wait_for("last_login_result", timeout)
+        if not result or not result.get("success"):
+            return False
+
+        deadline = time.time() + timeout
+        while self.player_id is None and time.time() < deadline:
+            time.sleep(0.01)
+        return self.player_id is not None
+
+    def wait_for(self, attribute, timeout):
+        deadline = time.time() + timeout
+        while time.time() < deadline and self.connected:
+            if hasattr(self, attribute):
+                result = getattr(self, attribute)
+                delattr(self, attribute)
+                return result
+            time.sleep(0.01)
+        return None
+
+    def step(self, dt):
+        """Move toward the current wander target and maybe attack"""
+        if not self.connected or self.player_id is None:
+            return
+
+        # Follow the server when it respawns us
+        if (self.spawn_x, self.spawn_y) != self.known_spawn:
+            self.known_spawn = (self.spawn_x, self.spawn_y)
+            self.x, self.y = self.spawn_x, self.spawn_y
+            self.target = None
+
+        # Or when it refused a move
+        if self.position_correction is not None:
+            self.x, self.y = self.position_correction
+            self.position_correction = None
+            self.target = None
+
+        if self.target is None:
+            self.target = (self.rng.randint(0, MAP_WIDTH * TILE_SIZE - 30),
+                           self.rng.randint(0, MAP_HEIGHT * TILE_SIZE - 40))
+
+        dx = self.target[0] - self.x
+        dy = self.target[1] - self.y
+        distance = (dx * dx + dy * dy) ** 0.5
+        step = BOT_SPEED * dt
+        if distance <= step:
+            new_x, new_y = self.target
+            self.target = None
+        else:
+            new_x = int(self.x + dx / distance * step)
+            new_y = int(self.y + dy / distance * step)
+
+        # Trees block bots like players, so wander somewhere else instead
+        if collision_map_for(self.map_seed).segment_clear(self.x + COLLISION_OFFSET_X, self.y + COLLISION_OFFSET_Y,
+                                                          new_x + COLLISION_OFFSET_X, new_y + COLLISION_OFFSET_Y):
+            self.x, self.y = new_x, new_y
+        else:
+            self.target = None
+
+        self.queue_position(self.x, self.y)
+        if self.pending_positions:
+            self.sent_positions[(self.x, self.y)] = time.perf_counter()
+            self.inputs_sent += 1
+        self.flush_input(force=True)
+
+        if self.rng.random() < self.attack_rate * dt:
+            self.send_attack()
+            self.attacks_sent += 1
+
+    def apply_game_state(self, data):
+        super().apply_game_state(data)
+
+        # Latency of our own moves, from send to seeing them in the state
+        me = self.other_players.get(str(self.player_id))
+        if me is not None:
+            sent = self.sent_positions.pop((me.get("x"), me.get("y")), None)
+            if sent is not None:
+                self.latencies.append(time.perf_counter() - sent)
+
+        # Forget positions the server skipped over (only the latest per tick is applied)
+        if len(self.sent_positions) > 100:
+            cutoff = time.perf_counter() - 5.0
+            self.sent_positions = {pos: sent for pos, sent in self.sent_positions.items() if sent > cutoff}
+
+class BotSwarm:
+    """A group of bots stepped together from one thread"""
+
+    def __init__(self, host='localhost', port=5555, count=10, attack_rate=0.5, prefix="bot", seed=0):
+        self.host = host
+        self.port = port
+        self.count = count
+        self.attack_rate = attack_rate
+        self.prefix = prefix
+        self.rng = random.Random(seed)
+        self.bots = []
+        self.running = False
+        self.step_thread = None
+
+    def start(self, ramp_rate=200):
+        """Connect and log in every bot, at most ramp_rate per second, then start stepping them"""
+        for i in range(self.count):
+            bot = BotClient(self.host, self.port, f"{self.prefix}{i}", self.attack_rate,
+                            random.Random(self.rng.random()))
+            if bot.connect() and bot.log_in():
+                self.bots.append(bot)
+            else:
+                print(f"Bot {bot.name} could not log in")
+                bot.disconnect()
+            time.sleep(1.0 / ramp_rate)
+
+        self.running = True
+        self.step_thread = threading.Thread(target=self.run)
+        self.step_thread.daemon = True
+        self.step_thread.start()
+        return len(self.bots)
+
+    def run(self):
+        interval = 1.0 / BOT_STEP_RATE
+        next_step = time.perf_counter()
+        while self.running:
+            for bot in self.bots:
+                bot.step(interval)
+            next_step += interval
+            delay = next_step - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_step = time.perf_counter()
+
+    def reset_stats(self):
+        for bot in self.bots:
+            bot.reset_stats()
+
+    def stats(self):
+        """Counters summed over all bots since the last reset"""
+        return {
+            "bots": sum(1 for bot in self.bots if bot.connected),
+            "latencies": [latency for bot in self.bots for latency in bot.latencies],
+            "bytes_received": sum(bot.bytes_received for bot in self.bots),
+            "messages_received": sum(bot.messages_received for bot in self.bots),
+            "inputs_sent": sum(bot.inputs_sent for bot in self.bots),
+            "attacks_sent": sum(bot.attacks_sent for bot in self.bots),
+        }
+
+    def stop(self):
+        self.running = False
+        if self.step_thread:
+            self.step_thread.join()
+        for bot in self.bots:
+            if bot.connected:
+                bot.disconnect()
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run headless bot players against a game server")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=5555)
+    parser.add_argument("--bots", type=int, default=10)
+    parser.add_argument("--attack-rate", type=float, default=0.5, help="attacks per bot per second")
+    parser.add_argument("--prefix", default="bot", help="account name prefix")
+    parser.add_argument("--report-interval", type=float, default=5.0)
+    args = parser.parse_args()
+
+    swarm = BotSwarm(args.host, args.port, args.bots, args.attack_rate, args.prefix)
+    print(f"{swarm.start()} bots logged in")
+    try:
+        while True:
+            time.sleep(args.report_interval)
+            stats = swarm.stats()
+            swarm.reset_stats()
+            latencies = stats["latencies"]
+            print(f"{stats['bots']} bots, "
+                  f"{stats['bytes_received'] / args.report_interval / 1024:.1f} KiB/s received, "
+                  f"latency p50 {percentile(latencies, 0.5) * 1000:.1f} ms "
+                  f"p99 {percentile(latencies, 0.99) * 1000:.1f} ms")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        swarm.stop()
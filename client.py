@@ -1,12 +1,16 @@
 import pygame
 import sys
-import socket
-import json
-import threading
+import argparse
 import random
 import math
 import time
 import os
+from collections import OrderedDict
+
+from game_map import COLLISION_OFFSET_X, COLLISION_OFFSET_Y, TILE_TYPES, CollisionMap, load_tiles
+from interpolation import InterpolationBuffer
+from network import NetworkClient
+from profiler import FrameProfiler
 
 # Initialize pygame
 pygame.init()
@@ -19,6 +23,7 @@ PLAYER_SPEED = 5
 TILE_SIZE = 40  # Size of map tiles
 MAP_WIDTH = 50  # Width in tiles
 MAP_HEIGHT = 50  # Height in tiles
+MAP_CHUNK_SIZE = 512  # Pixel size of the pre-rendered map chunks
 
 # Combat constants
 ATTACK_RANGE = 60
@@ -33,6 +38,11 @@ BUTTON_WIDTH = 140
 BUTTON_HEIGHT = 40
 PADDING = 15
 
+# Sprite constants
+PLAYER_CLOTHES_COLOR = (70, 70, 180)  # Recolored with each player's color
+TINTED_SPRITE_CACHE_SIZE = 256  # Tinted player sprites kept, by (color, direction)
+ATTACK_EFFECT_FRAMES = 24  # Pre-rendered frames of the attack effect animation
+
 # Colors
 WHITE = (255, 255, 255)
 BLACK = (0, 0, 0)
@@ -80,11 +90,43 @@ screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
 pygame.display.set_caption("2D MMO Game - Client")
 clock = pygame.time.Clock()
 
-# Setup fonts
-font = pygame.font.SysFont(None, 28)
-small_font = pygame.font.SysFont(None, 22)
-title_font = pygame.font.SysFont(None, 44)
-tiny_font = pygame.font.SysFont(None, 18)
+# Setup fonts, preloaded for every size used including the damage number pulse
+DAMAGE_FONT_SIZE = 24
+DAMAGE_FONT_SIZES = range(DAMAGE_FONT_SIZE, int(DAMAGE_FONT_SIZE * 1.5) + 1)
+fonts = {size: pygame.font.SysFont(None, size) for size in sorted({18, 22, 28, 44, *DAMAGE_FONT_SIZES})}
+font = fonts[28]
+small_font = fonts[22]
+title_font = fonts[44]
+tiny_font = fonts[18]
+
+def get_font(size):
+    if size not in fonts:
+        fonts[size] = pygame.font.SysFont(None, size)
+    return fonts[size]
+
+TEXT_CACHE_SIZE = 512  # Rendered text surfaces kept
+
+class TextCache:
+    """Rendered text surfaces by (font, text, color), least recently used evicted first"""
+
+    def __init__(self, max_size=TEXT_CACHE_SIZE):
+        self.max_size = max_size
+        self.surfaces = OrderedDict()
+
+    def render(self, text_font, text, color):
+        key = (text_font, text, tuple(color))
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            return surface
+
+        surface = text_font.render(text, True, color)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_size:
+            self.surfaces.popitem(last=False)
+        return surface
+
+text_cache = TextCache()
 
 # Load or create game assets
 def create_simple_image(color, size, shape="rect"):
@@ -105,9 +147,11 @@ def create_game_assets():
     
     # Character assets
     assets["player_base"] = create_player_sprite()
+    assets["tinted_players"] = TintedSpriteCache(assets["player_base"])
     
     # Combat assets
     assets["attack_effect"] = create_attack_effect()
+    assets["attack_effect_frames"] = create_attack_effect_frames(assets["attack_effect"])
     
     # Load sounds
     assets["sound_attack"] = pygame.mixer.Sound("data/attack.wav")
@@ -172,10 +216,64 @@ def create_attack_effect():
     
     return surf
 
+def create_attack_effect_frames(attack_effect, count=ATTACK_EFFECT_FRAMES):
+    # Bake the grow, fade and spin of the attack animation into a list of frames
+    frames = []
+    for i in range(count):
+        progress = i / count
+        
+        # Scale and fade based on progress
+        scale = 1.0 + progress * 0.5  # Grows to 1.5x size
+        alpha = int(255 * (1.0 - progress))  # Fades out
+        scaled_effect = pygame.transform.scale(
+            attack_effect,
+            (int(attack_effect.get_width() * scale), int(attack_effect.get_height() * scale))
+        )
+        
+        # Rotate up to 80 degrees, then fold the fade into the per-pixel alpha
+        frame = pygame.transform.rotate(scaled_effect, progress * 80)
+        frame.fill((255, 255, 255, alpha), special_flags=pygame.BLEND_RGBA_MULT)
+        
+        # Keep the offset that centers the frame on the attack point
+        frames.append((frame, frame.get_width() // 2, frame.get_height() // 2))
+    return frames
+
+class TintedSpriteCache:
+    """Player sprites recolored per player color and facing, built once each"""
+
+    def __init__(self, sprite, max_size=TINTED_SPRITE_CACHE_SIZE):
+        self.sprite = sprite
+        self.max_size = max_size
+        self.sprites = OrderedDict()
+
+        # Mask of the clothing pixels, matched on RGB like the old per-pixel check
+        self.clothes_mask = pygame.mask.from_threshold(sprite, PLAYER_CLOTHES_COLOR + (255,), (1, 1, 1, 255))
+
+    def get(self, color, direction=1):
+        key = (color, direction)
+        sprite = self.sprites.get(key)
+        if sprite is not None:
+            self.sprites.move_to_end(key)
+            return sprite
+
+        if direction < 0:
+            sprite = pygame.transform.flip(self.get(color, 1), True, False)
+        else:
+            sprite = self.sprite.copy()
+            tint = self.clothes_mask.to_surface(setcolor=color, unsetcolor=(0, 0, 0, 0))
+            sprite.blit(tint, (0, 0))
+
+        self.sprites[key] = sprite
+        if len(self.sprites) > self.max_size:
+            self.sprites.popitem(last=False)  # Evict the least recently used
+        return sprite
+
 class DamageNumber:
-    def __init__(self, x, y, amount, color=(255, 50, 50)):
+    def __init__(self, x, y, amount, color=(255, 50, 50), player_id=None, offset=(0, 0)):
         self.x = x
         self.y = y
+        self.player_id = player_id  # Player the number follows, at offset from where they are drawn
+        self.offset = offset
         self.amount = amount
         self.color = color
         self.start_time = time.time()
@@ -199,18 +297,18 @@ class DamageNumber:
         
         # Render text with size pulsing
         scale = 1.0 + 0.5 * math.sin(progress * math.pi)  # Pulse size
-        font_size = int(24 * scale)
-        damage_font = pygame.font.SysFont(None, font_size)
+        font_size = int(DAMAGE_FONT_SIZE * scale)
+        damage_font = get_font(font_size)
         
-        # Render the damage number
-        text = damage_font.render(f"-{self.amount}", True, self.color)
-        text.set_alpha(alpha)
+        # Render the damage number (cached surfaces are shared, so alpha is set right before each blit)
+        text = text_cache.render(damage_font, f"-{self.amount}", self.color)
         
         # Draw with slight glow effect
-        glow = damage_font.render(f"-{self.amount}", True, (255, 255, 200))
+        glow = text_cache.render(damage_font, f"-{self.amount}", (255, 255, 200))
         glow.set_alpha(int(alpha * 0.5))
-        
         surface.blit(glow, (screen_x+2, screen_y+2))
+        
+        text.set_alpha(alpha)
         surface.blit(text, (screen_x, screen_y))
 
 class AnimationManager:
@@ -218,17 +316,19 @@ class AnimationManager:
         self.animations = []
         self.damage_numbers = []
     
-    def add_attack_animation(self, x, y, duration=0.3):
+    def add_attack_animation(self, x, y, duration=0.3, player_id=None, offset=(0, 0)):
         self.animations.append({
             "type": "attack",
             "x": x,
             "y": y,
+            "player_id": player_id,
+            "offset": offset,
             "start_time": time.time(),
             "duration": duration
         })
     
-    def add_damage_number(self, x, y, amount):
-        self.damage_numbers.append(DamageNumber(x, y, amount))
+    def add_damage_number(self, x, y, amount, player_id=None, offset=(0, 0)):
+        self.damage_numbers.append(DamageNumber(x, y, amount, player_id=player_id, offset=offset))
     
     def update(self):
         # Remove expired animations
@@ -238,9 +338,16 @@ class AnimationManager:
         # Remove expired damage numbers
         self.damage_numbers = [dmg for dmg in self.damage_numbers if not dmg.is_expired()]
     
-    def draw(self, surface, camera_x, camera_y, assets):
+    def draw(self, surface, camera_x, camera_y, assets, anchors=None):
+        """Draw effects, moved along with their players to anchors (player ID -> drawn position)"""
+        anchors = anchors or {}
+        
         # Draw attack animations
         for anim in self.animations:
+            anchor = anchors.get(anim["player_id"])
+            if anchor is not None:
+                anim["x"] = anchor[0] + anim["offset"][0]
+                anim["y"] = anchor[1] + anim["offset"][1]
             if anim["type"] == "attack":
                 # Draw attack animation
                 screen_x = anim["x"] - camera_x
@@ -249,30 +356,17 @@ class AnimationManager:
                 # Calculate animation progress (0.0 to 1.0)
                 progress = (time.time() - anim["start_time"]) / anim["duration"]
                 
-                # Scale and fade based on progress
-                scale = 1.0 + progress * 0.5  # Grows to 1.5x size
-                alpha = int(255 * (1.0 - progress))  # Fades out
-                
-                # Get and scale the attack effect
-                attack_effect = assets["attack_effect"]
-                scaled_effect = pygame.transform.scale(
-                    attack_effect, 
-                    (int(attack_effect.get_width() * scale), int(attack_effect.get_height() * scale))
-                )
-                
-                # Set alpha
-                scaled_effect.set_alpha(alpha)
-                
-                # Apply rotation animation
-                angle = progress * 80  # Rotate up to 80 degrees
-                rotated_effect = pygame.transform.rotate(scaled_effect, angle)
-                
-                # Draw the effect centered on attack point
-                effect_rect = rotated_effect.get_rect(center=(screen_x, screen_y))
-                surface.blit(rotated_effect, effect_rect)
+                # Pick the pre-rendered frame and draw it centered on the attack point
+                frames = assets["attack_effect_frames"]
+                frame, half_width, half_height = frames[min(len(frames) - 1, max(0, int(progress * len(frames))))]
+                surface.blit(frame, (screen_x - half_width, screen_y - half_height))
         
         # Draw damage numbers
         for damage_number in self.damage_numbers:
+            anchor = anchors.get(damage_number.player_id)
+            if anchor is not None:
+                damage_number.x = anchor[0] + damage_number.offset[0]
+                damage_number.y = anchor[1] + damage_number.offset[1]
             damage_number.draw(surface, camera_x, camera_y)
 
 # Generate a fixed map based on a seed
@@ -281,89 +375,70 @@ class GameMap:
         self.width = width
         self.height = height
         self.tile_size = TILE_SIZE
-        self.tiles = []
+        self.tiles = b""  # Tile codes, row-major
+        self.collision = None  # Blocked tiles, shared rules with the server
         self.seed = seed
+        self.chunks = None  # Pre-rendered map surfaces by (chunk_x, chunk_y)
         self.generate_map()
         
     def generate_map(self):
-        # Set the random seed for consistent generation
-        random.seed(self.seed)
-        
-        # Initialize with grass
-        self.tiles = [["grass" for _ in range(self.width)] for _ in range(self.height)]
-        
-        # Add fewer trees in a more structured pattern
-        # Create a central clearing with trees around the edges
-        
-        # Forest edges - much fewer trees
-        for y in range(self.height):
-            for x in range(self.width):
-                # Keep the center completely clear to ensure safe spawning
-                distance_to_center = ((x - self.width//2)**2 + (y - self.height//2)**2)**0.5
-                
-                # Create fewer trees in the outer areas
-                if distance_to_center > 20 and random.random() < 0.2:  # Reduced from 0.6 to 0.2
-                    self.tiles[y][x] = "tree"
-                
-                # Create very scattered trees in the mid-range
-                elif 10 < distance_to_center <= 20 and random.random() < 0.08:  # Reduced from 0.05
-                    self.tiles[y][x] = "tree"
-                    
-                # Create a few decorative tree clusters
-                elif self.is_in_tree_cluster(x, y):
-                    self.tiles[y][x] = "tree"
-    
-    def is_in_tree_cluster(self, x, y):
-        # Define smaller tree cluster centers (decorative)
-        clusters = [
-            (self.width//5, self.height//5),
-            (4*self.width//5, self.height//5),
-            (self.width//5, 4*self.height//5),
-            (4*self.width//5, 4*self.height//5)
-        ]
-        
-        # Check if within any cluster radius - smaller clusters
-        for cx, cy in clusters:
-            dist = ((x - cx)**2 + (y - cy)**2)**0.5
-            if dist < 2 and random.random() < 0.7:  # Smaller clusters
-                return True
-        return False
+        # Same tiles the server validates spawns against, cached on disk by seed and size
+        self.tiles = load_tiles(self.seed, self.width, self.height)
+        self.collision = CollisionMap(self.tiles, self.width, self.height, TILE_SIZE)
         
     def set_seed(self, seed):
         self.seed = seed
         self.generate_map()
+        self.chunks = None  # Rebake with the new tiles
+    
+    def bake_chunks(self, assets):
+        """Render the whole map into MAP_CHUNK_SIZE chunks, once per seed"""
+        self.chunks = {}
+        map_width = self.width * TILE_SIZE
+        map_height = self.height * TILE_SIZE
+        for chunk_y in range(0, map_height, MAP_CHUNK_SIZE):
+            for chunk_x in range(0, map_width, MAP_CHUNK_SIZE):
+                size = (min(MAP_CHUNK_SIZE, map_width - chunk_x), min(MAP_CHUNK_SIZE, map_height - chunk_y))
+                chunk = pygame.Surface(size).convert()
+                chunk.fill(WHITE)  # Same background the screen is cleared to
+                self.draw_tiles(chunk, chunk_x, chunk_y, size[0], size[1], assets)
+                self.chunks[(chunk_x // MAP_CHUNK_SIZE, chunk_y // MAP_CHUNK_SIZE)] = chunk
     
     def draw(self, surface, camera_x, camera_y, assets):
+        if self.chunks is None:
+            self.bake_chunks(assets)
+        
+        # Blit the 1-4 chunks overlapping the screen
+        start_x = max(0, camera_x // MAP_CHUNK_SIZE)
+        end_x = (camera_x + SCREEN_WIDTH - 1) // MAP_CHUNK_SIZE
+        start_y = max(0, camera_y // MAP_CHUNK_SIZE)
+        end_y = (camera_y + SCREEN_HEIGHT - 1) // MAP_CHUNK_SIZE
+        for chunk_y in range(start_y, end_y + 1):
+            for chunk_x in range(start_x, end_x + 1):
+                chunk = self.chunks.get((chunk_x, chunk_y))
+                if chunk is not None:
+                    surface.blit(chunk, (chunk_x * MAP_CHUNK_SIZE - camera_x, chunk_y * MAP_CHUNK_SIZE - camera_y))
+    
+    def draw_tiles(self, surface, camera_x, camera_y, view_width, view_height, assets):
         # Calculate visible area
         start_x = max(0, camera_x // TILE_SIZE)
-        end_x = min(self.width, (camera_x + SCREEN_WIDTH) // TILE_SIZE + 1)
+        end_x = min(self.width, (camera_x + view_width) // TILE_SIZE + 1)
         start_y = max(0, camera_y // TILE_SIZE)
-        end_y = min(self.height, (camera_y + SCREEN_HEIGHT) // TILE_SIZE + 1)
+        end_y = min(self.height, (camera_y + view_height) // TILE_SIZE + 1)
         
         # Draw visible tiles
+        tile_assets = [assets[tile_type] for tile_type in TILE_TYPES]
         for y in range(start_y, end_y):
+            row = y * self.width
             for x in range(start_x, end_x):
-                tile_type = self.tiles[y][x]
-                tile_asset = assets[tile_type]
+                tile_asset = tile_assets[self.tiles[row + x]]
                 screen_x = x * TILE_SIZE - camera_x
                 screen_y = y * TILE_SIZE - camera_y
                 surface.blit(tile_asset, (screen_x, screen_y))
                 
-    def is_valid_position(self, x, y):
-        # Check map boundaries
-        if x < 0 or y < 0 or x >= self.width * TILE_SIZE or y >= self.height * TILE_SIZE:
-            return False
-            
-        # Get tile coordinates
-        tile_x = int(x // TILE_SIZE)
-        tile_y = int(y // TILE_SIZE)
-        
-        # Check if tile is traversable (not a tree)
-        if tile_x >= self.width or tile_y >= self.height:
-            return False
-            
-        tile_type = self.tiles[tile_y][tile_x]
-        return tile_type != "tree"
+    def is_valid_move(self, x0, y0, x1, y1):
+        # No tree tile anywhere along the way, as the server checks it
+        return self.collision.segment_clear(x0, y0, x1, y1)
 
 class Camera:
     def __init__(self):
@@ -469,188 +544,6 @@ class InputBox:
     def set_error(self, has_error=True):
         self.error = has_error
 
-class NetworkClient:
-    def __init__(self, host='localhost', port=5555):
-        self.host = host
-        self.port = port
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.player_id = None
-        self.other_players = {}
-        self.connected = False
-        self.receive_thread = None
-        
-        # Initialize spawn position
-        self.spawn_x = 500
-        self.spawn_y = 500
-        
-        # Map data
-        self.map_seed = 12345
-        
-    def connect(self):
-        try:
-            self.socket.connect((self.host, self.port))
-            self.connected = True
-            # Start receiving thread
-            self.receive_thread = threading.Thread(target=self.receive_data_thread)
-            self.receive_thread.daemon = True
-            self.receive_thread.start()
-            return True
-        except Exception as e:
-            print(f"Connection error: {e}")
-            return False
-        
-    def register(self, username, password):
-        if not self.connected:
-            return (False, "Not connected to server")
-        
-        data = {
-            "type": "register",
-            "username": username,
-            "password": password
-        }
-        self.send_data(data)
-        
-        # The response will be handled in the receive_data_thread
-    
-    def login(self, username, password):
-        if not self.connected:
-            return (False, "Not connected to server")
-            
-        data = {
-            "type": "login",
-            "username": username,
-            "password": password
-        }
-        self.send_data(data)
-        
-        # The response will be handled in the receive_data_thread
-    
-    def send_attack(self):
-        if self.connected and self.player_id is not None:
-            self.send_data({
-                "type": "attack"
-            })
-    
-    def send_data(self, data):
-        try:
-            # Convert data to JSON string
-            message = json.dumps(data).encode('utf-8')
-            # Send message length first (4 bytes)
-            message_length = len(message).to_bytes(4, byteorder='big')
-            self.socket.send(message_length + message)
-        except Exception as e:
-            print(f"Error sending data: {e}")
-            self.connected = False
-    
-    def receive_data(self):
-        try:
-            # Receive message length (4 bytes)
-            message_length_bytes = self.socket.recv(4)
-            if not message_length_bytes:
-                return None
-                
-            message_length = int.from_bytes(message_length_bytes, byteorder='big')
-            
-            # Receive the actual message
-            message = b""
-            bytes_received = 0
-            
-            while bytes_received < message_length:
-                chunk = self.socket.recv(min(message_length - bytes_received, 4096))
-                if not chunk:
-                    return None
-                message += chunk
-                bytes_received += len(chunk)
-                
-            return json.loads(message.decode('utf-8'))
-        except Exception as e:
-            print(f"Error receiving data: {e}")
-            self.connected = False
-            return None
-    
-    def receive_data_thread(self):
-        while self.connected:
-            data = self.receive_data()
-            if not data:
-                self.connected = False
-                break
-                
-            # Handle different types of messages
-            if data.get("type") == "player_id":
-                self.player_id = data.get("id")
-                
-                # Get spawn position from server
-                self.spawn_x = data.get("x", self.spawn_x)
-                self.spawn_y = data.get("y", self.spawn_y)
-                
-                print(f"Assigned player ID: {self.player_id} at position ({self.spawn_x}, {self.spawn_y})")
-                
-            elif data.get("type") == "game_state":
-                self.other_players = data.get("players", {})
-                
-            elif data.get("type") == "register_result":
-                print(f"Registration result: {data.get('message')}")
-                # Store the result for the UI to use
-                self.last_register_result = data
-                
-            elif data.get("type") == "login_result":
-                print(f"Login result: {data.get('message')}")
-                # Store the result for the UI to use
-                self.last_login_result = data
-                
-            elif data.get("type") == "map_data":
-                # Update map seed
-                self.map_seed = data.get("seed", 12345)
-                print(f"Received map seed: {self.map_seed}")
-                
-            elif data.get("type") == "attack_event":
-                # Store attack event for rendering
-                self.last_attack_event = data
-                
-                # Get damage amount
-                damage = data.get("damage", 0)
-                
-                # Process respawn if needed
-                if data.get("target_id") == self.player_id and data.get("killed", False):
-                    self.spawn_x = data.get("respawn_x", self.spawn_x)
-                    self.spawn_y = data.get("respawn_y", self.spawn_y)
-                
-                # Play sound effect
-                if hasattr(self, "play_sound") and callable(self.play_sound):
-                    if data.get("attacker_id") == self.player_id:
-                        self.play_sound("sound_attack")
-                    elif data.get("target_id") == self.player_id:
-                        self.play_sound("sound_hit")
-                
-                # Add to animation queue and damage display
-                if hasattr(self, "animation_callback") and callable(self.animation_callback):
-                    attacker_id = data.get("attacker_id")
-                    target_id = data.get("target_id")
-                    
-                    # Show attack animation from attacker
-                    if str(attacker_id) in self.other_players:
-                        attacker = self.other_players[str(attacker_id)]
-                        attack_x = attacker.get("x", 0) + 15  # Center of player
-                        attack_y = attacker.get("y", 0) + 20
-                        self.animation_callback("attack", attack_x, attack_y)
-                    
-                    # Show damage number at target
-                    if str(target_id) in self.other_players:
-                        target = self.other_players[str(target_id)]
-                        damage_x = target.get("x", 0) + 15  # Center of player
-                        damage_y = target.get("y", 0) - 10   # Above the player
-                        self.animation_callback("damage", damage_x, damage_y, damage)
-    
-    def disconnect(self):
-        self.connected = False
-        self.socket.close()
-        
-    def register_animation_callback(self, callback):
-        self.animation_callback = callback
-        
-    def register_sound_callback(self, callback):
-        self.play_sound = callback
-
 class Player:
     def __init__(self, x, y):
         self.x = x
@@ -671,18 +564,15 @@ class Player:
         # Handle movement input
         moved = self.handle_input()
         
-        # Ensure we're not stuck in obstacles
-        if not game_map.is_valid_position(self.x + self.width // 2, self.y + self.height // 2):
-            # Try to find a valid position nearby
-            for dx, dy in [(0, 0), (-5, 0), (5, 0), (0, -5), (0, 5)]:
-                test_x = prev_x + dx
-                test_y = prev_y + dy
-                if game_map.is_valid_position(test_x + self.width // 2, test_y + self.height // 2):
+        # Ensure we don't walk into or through obstacles, checked like the server does
+        if not game_map.is_valid_move(prev_x + COLLISION_OFFSET_X, prev_y + COLLISION_OFFSET_Y,
+                                      self.x + COLLISION_OFFSET_X, self.y + COLLISION_OFFSET_Y):
+            # Slide along the obstacle on one axis, or stay where we were
+            for test_x, test_y in [(self.x, prev_y), (prev_x, self.y), (prev_x, prev_y)]:
+                if game_map.is_valid_move(prev_x + COLLISION_OFFSET_X, prev_y + COLLISION_OFFSET_Y,
+                                          test_x + COLLISION_OFFSET_X, test_y + COLLISION_OFFSET_Y):
                     self.x, self.y = test_x, test_y
                     break
-            else:
-                # If no valid position found, go back to previous position
-                self.x, self.y = prev_x, prev_y
         
     def draw(self, surface, camera_x, camera_y, assets):
         screen_x = self.x - camera_x
@@ -1057,15 +947,22 @@ class LoginUI:
             req_rect = req_text.get_rect(center=(SCREEN_WIDTH//2, self.back_button.rect.bottom + 15))
             surface.blit(req_text, req_rect)
 
-def draw_other_players(surface, other_players, my_id, camera_x, camera_y, assets):
+# Last seen x and facing direction of other players, by player ID
+remote_player_facing = {}
+
+def draw_other_players(surface, other_players, my_id, camera_x, camera_y, assets, positions=None):
     for player_id, player_data in other_players.items():
         # Convert player_id to integer for comparison
         try:
+            position = positions.get(player_id) if positions else None
             player_id = int(player_id)
             if player_id != my_id:
-                # Extract player position
-                player_x = player_data["x"]
-                player_y = player_data["y"]
+                # Extract player position, smoothed between updates when interpolating
+                if position is not None:
+                    player_x, player_y = position
+                else:
+                    player_x = player_data["x"]
+                    player_y = player_data["y"]
                 
                 # Draw player sprite
                 screen_x = player_x - camera_x
@@ -1073,36 +970,28 @@ def draw_other_players(surface, other_players, my_id, camera_x, camera_y, assets
                 
                 # Only draw if player is on screen
                 if -30 <= screen_x <= SCREEN_WIDTH and -40 <= screen_y <= SCREEN_HEIGHT:
-                    # Use the player base sprite for all players
-                    sprite = assets["player_base"]
-                    
-                    # Add custom color for player
-                    colored_sprite = sprite.copy()
-                    
                     # Get player color or use default blue
                     color = player_data.get("color", BLUE)
                     if isinstance(color, list):
                         color = tuple(color)
-                        
-                    # Apply color to the clothes part of the sprite
-                    # This is a simple approach - in a real game, you'd use separate layers
-                    pixels = pygame.PixelArray(colored_sprite)
-                    for x in range(colored_sprite.get_width()):
-                        for y in range(colored_sprite.get_height()):
-                            # Check if pixel is blue (the default clothing color)
-                            if colored_sprite.get_at((x, y))[0:3] == (70, 70, 180):
-                                pixels[x, y] = color
-                    del pixels
+                    
+                    # Face the way the player last moved
+                    last_x, direction = remote_player_facing.get(player_id, (player_x, 1))
+                    if player_x != last_x:
+                        direction = 1 if player_x > last_x else -1
+                    remote_player_facing[player_id] = (player_x, direction)
+                    
+                    # Sprite with the clothes recolored, cached per color and direction
+                    colored_sprite = assets["tinted_players"].get(color, direction)
                     
                     surface.blit(colored_sprite, (screen_x, screen_y))
                     
                     # Draw username if available
                     if "username" in player_data:
-                        name_text = small_font.render(player_data["username"], True, BLACK)
+                        name_text = text_cache.render(small_font, player_data["username"], BLACK)
                         name_rect = name_text.get_rect(centerx=screen_x + 15, bottom=screen_y - 5)
-                        # Draw with shadow for better visibility
-                        shadow_text = small_font.render(player_data["username"], True, (0, 0, 0))
-                        surface.blit(shadow_text, (name_rect.x + 1, name_rect.y + 1))
+                        # Draw with shadow for better visibility (same color, so the same surface)
+                        surface.blit(name_text, (name_rect.x + 1, name_rect.y + 1))
                         surface.blit(name_text, name_rect)
                     
                     # Draw health bar
@@ -1138,6 +1027,11 @@ def draw_other_players(surface, other_players, my_id, camera_x, camera_y, assets
                     pygame.draw.rect(surface, HEALTH_BAR_BORDER, (bar_x, bar_y, bar_width, bar_height), 1)
         except:
             pass  # Skip invalid player data
+    
+    # Forget players that left
+    if len(remote_player_facing) > 2 * len(other_players) + 16:
+        for player_id in [p for p in remote_player_facing if str(p) not in other_players]:
+            del remote_player_facing[player_id]
 
 def draw_attack_range(surface, player, camera_x, camera_y, color=(255, 200, 200, 80)):
     # Draw a circle showing attack range
@@ -1175,14 +1069,36 @@ def draw_hud(surface, player):
         pygame.draw.rect(surface, BLACK, (bar_x, bar_y, bar_width, bar_height), 1)
         
         # Draw text
-        text = small_font.render("Attack Cooldown", True, WHITE)
+        text = text_cache.render(small_font, "Attack Cooldown", WHITE)
         surface.blit(text, (bar_x + 5, bar_y - 20))
     else:
         # Draw "Ready" text
-        text = small_font.render("Attack Ready! (Left Click to Attack)", True, GREEN)
+        text = text_cache.render(small_font, "Attack Ready! (Left Click to Attack)", GREEN)
         surface.blit(text, (10, SCREEN_HEIGHT - 30))
 
-def main():
+def draw_profiler_overlay(surface, profiler):
+    # Rolling p50/p99 per frame phase in the top right corner
+    stats = profiler.get_stats()
+    if not stats:
+        return
+    
+    line_height = 16
+    panel_width = 230
+    panel = pygame.Surface((panel_width, (len(stats) + 1) * line_height + 8), pygame.SRCALPHA)
+    panel.fill((0, 0, 0, 160))
+    panel.blit(text_cache.render(tiny_font, "phase            p50 ms   p99 ms", WHITE), (6, 4))
+    for i, (name, (p50, p99)) in enumerate(stats.items()):
+        y = 4 + (i + 1) * line_height
+        color = LOW_HEALTH_COLOR if name != "frame" and name != "idle" and p99 > 8 else WHITE
+        panel.blit(text_cache.render(tiny_font, name, color), (6, y))
+        panel.blit(tiny_font.render(f"{p50:6.2f}   {p99:6.2f}", True, color), (120, y))
+    surface.blit(panel, (SCREEN_WIDTH - panel_width - 10, 10))
+
+def main(profile=False, trace_path=None):
+    # Frame phase timings, shown with F3 when profiling
+    profiler = FrameProfiler(profile, trace_path)
+    show_profiler = profile
+    
     # Make sure data directory exists for sounds
     os.makedirs("data", exist_ok=True)
     
@@ -1203,16 +1119,17 @@ def main():
     
     # Create network client
     network_client = NetworkClient()
+    network_client.interpolation = InterpolationBuffer()  # Draw remote players between updates
     if not network_client.connect():
         print("Could not connect to server")
         return
         
     # Register animation callback
-    def animation_handler(anim_type, x, y, amount=None):
+    def animation_handler(anim_type, x, y, amount=None, player_id=None, offset=(0, 0)):
         if anim_type == "attack":
-            animation_manager.add_attack_animation(x, y)
+            animation_manager.add_attack_animation(x, y, player_id=player_id, offset=offset)
         elif anim_type == "damage":
-            animation_manager.add_damage_number(x, y, amount)
+            animation_manager.add_damage_number(x, y, amount, player_id=player_id, offset=offset)
     
     network_client.register_animation_callback(animation_handler)
     
@@ -1232,6 +1149,8 @@ def main():
     # Main game loop
     running = True
     while running:
+        profiler.start_frame()
+        
         # Handle events
         events = pygame.event.get()
         for event in events:
@@ -1244,6 +1163,9 @@ def main():
                         if network_client.send_attack():
                             # Attack animation will be triggered by server response
                             player.attack()
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3 and profiler.enabled:
+                show_profiler = not show_profiler
+        profiler.lap("events")
                 
         # Get mouse position for UI updates
         mouse_pos = pygame.mouse.get_pos()
@@ -1259,11 +1181,18 @@ def main():
                 # Use spawn position from server
                 player = Player(network_client.spawn_x, network_client.spawn_y)
                 
+            # Snap back to where the server has us if it refused a move
+            if network_client.position_correction is not None:
+                player.x, player.y = network_client.position_correction
+                network_client.position_correction = None
+            
             # Update player
             player.update(game_map)
+            profiler.lap("player.update")
             
             # Update animations
             animation_manager.update()
+            profiler.lap("animations.update")
             
             # Update player health from server data
             if network_client.player_id and str(network_client.player_id) in network_client.other_players:
@@ -1284,47 +1213,65 @@ def main():
             # Update camera
             camera.update(player.x, player.y)
             
-            # Send player position to server
+            # Send player position to server, batched at the input send rate
             if network_client.connected and network_client.player_id is not None:
-                network_client.send_data({
-                    "x": player.x,
-                    "y": player.y
-                })
+                network_client.queue_position(player.x, player.y)
+                network_client.flush_input()
+            profiler.lap("network")
                 
             # Draw game
             screen.fill(WHITE)
             
             # Draw map
             game_map.draw(screen, camera.x, camera.y, assets)
+            profiler.lap("map")
             
             # Draw attack range when ready
             if player.can_attack():
                 draw_attack_range(screen, player, camera.x, camera.y)
             
             # Draw other players
+            anchors = {}
             if network_client.player_id:
-                draw_other_players(screen, network_client.other_players, network_client.player_id, camera.x, camera.y, assets)
+                positions = network_client.interpolation.positions(time.perf_counter())
+                draw_other_players(screen, network_client.other_players, network_client.player_id, camera.x, camera.y, assets,
+                                   positions)
+                
+                # Effects follow players where they are drawn, not where the newest update has them
+                anchors = {int(player_id): position for player_id, position in positions.items()}
+                anchors[network_client.player_id] = (player.x, player.y)
+            profiler.lap("other players")
                 
             # Draw animations
-            animation_manager.draw(screen, camera.x, camera.y, assets)
+            animation_manager.draw(screen, camera.x, camera.y, assets, anchors)
+            profiler.lap("animations")
                 
             # Draw player
             player.draw(screen, camera.x, camera.y, assets)
             
             # Draw HUD
             draw_hud(screen, player)
+            profiler.lap("hud")
             
         else:
             # Handle login/register UI
             login_ui.handle_events(events)
             login_ui.update(mouse_pos)
             login_ui.draw(screen)
+            profiler.lap("login ui")
+        
+        if show_profiler:
+            draw_profiler_overlay(screen, profiler)
+            profiler.lap("overlay")
         
         # Update display
         pygame.display.flip()
+        profiler.lap("flip")
         clock.tick(60)
+        profiler.lap("idle")
     
     # Clean up
+    profiler.write_trace()
     if network_client.connected:
         network_client.disconnect()
     pygame.quit()
@@ -1384,6 +1331,11 @@ def create_basic_sound(filename, sound_type):
             f.write(b'RIFF\x24\x00\x00\x00WAVEfmt \x10\x00\x00\x00\x01\x00\x01\x00\x44\xac\x00\x00\x88\x58\x01\x00\x02\x00\x10\x00data\x00\x00\x00\x00')
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="2D MMO game client")
+    parser.add_argument("--profile", action="store_true", help="time each frame phase and show the overlay (F3 toggles it)")
+    parser.add_argument("--trace", metavar="FILE", help="also write the phase timings to FILE as a Chrome trace on exit")
+    args = parser.parse_args()
+    
     # Set a consistent random seed for testing
     random.seed(42)
-    main() 
\ No newline at end of file
+    main(args.profile, args.trace)
@@ -0,0 +1,195 @@
+"""Attack resolution over the player store's columns.
+
+Every attack queued in a tick resolves at once, against positions as they
+were at the start of the tick. Each attacker hits every other player
+within range. Damage then applies in attack order, and a target stops
+taking hits once its health reaches zero. With NumPy installed both steps
+are array operations over all attackers together, reading the columns
+in place through np.frombuffer. Without it, or for a handful of attacks,
+the same hits are found through the spatial grid one attacker at a time.
+Both paths give identical results.
+
+Killed targets then respawn together: every spawn try for every kill is
+drawn and checked against the collision map in one go, and the columns
+are written in place.
+"""
+import random
+
+from game_map import COLLISION_OFFSET_X, COLLISION_OFFSET_Y
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Below this many attacks in a batch the grid lookups beat the array setup
+VECTORIZE_MIN_ATTACKS = 48
+VECTORIZE_MIN_RESPAWNS = 32  # Same for kills, about 60 us of setup either way
+SPAWN_TRIES = 20
+
+rng = np.random.default_rng() if np is not None else None
+
+def resolve_hits(players, attacker_slots, attack_range, damage, grid):
+    """Apply a batch of attacks to the health column
+
+    Returns (attacker slot, target slot, remaining health) for every hit,
+    ordered by attacker and then target slot. Killed targets are left at
+    zero health for the caller to respawn.
+    """
+    if np is not None and len(attacker_slots) >= VECTORIZE_MIN_ATTACKS:
+        return resolve_hits_numpy(players, attacker_slots, attack_range, damage)
+    return resolve_hits_python(players, attacker_slots, attack_range, damage, grid)
+
+def resolve_hits_python(players, attacker_slots, attack_range, damage, grid):
+    x = players.x
+    y = players.y
+    slots = players.slots
+    range_squared = attack_range * attack_range
+
+    # Find every hit before applying any, so all attacks see the same positions
+    hits = []
+    for attacker_slot in attacker_slots:
+        attacker_x = x[attacker_slot]
+        attacker_y = y[attacker_slot]
+        targets = []
+        for target_id in grid.query_rect(attacker_x - attack_range, attacker_y - attack_range,
+                                         attacker_x + attack_range, attacker_y + attack_range):
+            target_slot = slots[target_id]
+            dx = attacker_x - x[target_slot]
+            dy = attacker_y - y[target_slot]
+            if dx * dx + dy * dy <= range_squared and target_slot != attacker_slot:
+                targets.append(target_slot)
+        targets.sort()
+        hits.extend((attacker_slot, target_slot) for target_slot in targets)
+
+    health = players.health
+    results = []
+    for attacker_slot, target_slot in hits:
+        remaining = health[target_slot]
+        if remaining <= 0:
+            continue  # Killed earlier in the batch
+        remaining = max(0, remaining - damage)
+        health[target_slot] = remaining
+        results.append((attacker_slot, target_slot, remaining))
+    return results
+
+def resolve_hits_numpy(players, attacker_slots, attack_range, damage):
+    # Views share memory with the columns, and only live until this returns
+    ids = np.frombuffer(players.ids, dtype=np.longlong)
+    x = np.frombuffer(players.x, dtype=np.double)
+    y = np.frombuffer(players.y, dtype=np.double)
+    health = np.frombuffer(players.health, dtype=np.intc)
+
+    # Sort live players by the grid cell they are in, row by row. The
+    # cells are one attack range wide, so an attack covers at most three
+    # cells of each of three rows, and each row's cells are one run of the
+    # sorted order.
+    live = np.flatnonzero(ids)
+    live_x = x[live]
+    live_y = y[live]
+    cell_x = np.floor(live_x / attack_range).astype(np.int64)
+    cell_y = np.floor(live_y / attack_range).astype(np.int64)
+    min_cell_x = cell_x.min()
+    min_cell_y = cell_y.min()
+    cell_x -= min_cell_x
+    cell_y -= min_cell_y
+    columns = int(cell_x.max()) + 1
+    rows = int(cell_y.max()) + 1
+    order = np.argsort(cell_y * columns + cell_x, kind="stable")
+    sorted_keys = (cell_y * columns + cell_x)[order]
+
+    # Cell rectangle each attack covers, clipped to the occupied cells
+    attackers = np.asarray(attacker_slots, dtype=np.int64)
+    attacker_x = x[attackers]
+    attacker_y = y[attackers]
+    left = np.clip(np.floor((attacker_x - attack_range) / attack_range).astype(np.int64) - min_cell_x, 0, columns - 1)
+    right = np.clip(np.floor((attacker_x + attack_range) / attack_range).astype(np.int64) - min_cell_x, -1, columns - 1)
+    top = np.clip(np.floor((attacker_y - attack_range) / attack_range).astype(np.int64) - min_cell_y, 0, rows - 1)
+    bottom = np.clip(np.floor((attacker_y + attack_range) / attack_range).astype(np.int64) - min_cell_y, -1, rows - 1)
+    row_counts = np.maximum(0, bottom - top + 1)
+    row_counts[right < left] = 0
+
+    # One sorted run per (attack, row), expanded into candidate pairs
+    run_attack = np.repeat(np.arange(len(attackers)), row_counts)
+    run_row = top[run_attack] + np.arange(len(run_attack)) - np.repeat(np.cumsum(row_counts) - row_counts, row_counts)
+    run_start = np.searchsorted(sorted_keys, run_row * columns + left[run_attack], side="left")
+    run_end = np.searchsorted(sorted_keys, run_row * columns + right[run_attack], side="right")
+    run_lengths = run_end - run_start
+    pair_attack = np.repeat(run_attack, run_lengths)
+    pair_live = order[np.repeat(run_start - (np.cumsum(run_lengths) - run_lengths), run_lengths) +
+                      np.arange(len(pair_attack))]
+
+    # Keep the pairs in range, ordered by attack and then target slot
+    dx = attacker_x[pair_attack] - live_x[pair_live]
+    dy = attacker_y[pair_attack] - live_y[pair_live]
+    pair_target = live[pair_live]
+    in_range = (dx * dx + dy * dy <= attack_range * attack_range) & (pair_target != attackers[pair_attack])
+    pair_attack = pair_attack[in_range]
+    pair_target = pair_target[in_range]
+    hit_order = np.argsort(pair_attack * len(ids) + pair_target, kind="stable")
+    pair_attack = pair_attack[hit_order]
+    pair_target = pair_target[hit_order]
+
+    # Number each target's hits in attack order, and drop hits after a kill
+    by_target = np.argsort(pair_target, kind="stable")
+    sorted_targets = pair_target[by_target]
+    first_hits = np.flatnonzero(np.r_[True, sorted_targets[1:] != sorted_targets[:-1]])
+    hit_counts = np.diff(np.r_[first_hits, len(sorted_targets)])
+    hit_number = np.empty(len(pair_target), dtype=np.int64)
+    hit_number[by_target] = np.arange(len(sorted_targets)) - np.repeat(first_hits, hit_counts)
+    before = health[pair_target].astype(np.int64) - damage * hit_number
+    landed = before > 0
+    remaining = np.maximum(0, before - damage)
+
+    # Write each target's health after its last landed hit
+    pair_attack = pair_attack[landed]
+    pair_target = pair_target[landed]
+    remaining = remaining[landed]
+    targets, landed_hits = np.unique(pair_target, return_counts=True)
+    health[targets] = np.maximum(0, health[targets] - damage * landed_hits)
+
+    return list(zip(attackers[pair_attack].tolist(), pair_target.tolist(), remaining.tolist()))
+
+def respawn(players, target_slots, health, spawn_x, spawn_y, spawn_range, collision_map):
+    """Move killed targets to random clear spots around the spawn point at full health
+
+    Each target gets up to SPAWN_TRIES random spots within spawn_range
+    and falls back to the spawn point itself. Returns the (x, y) chosen
+    for each target, in order.
+    """
+    if np is not None and len(target_slots) >= VECTORIZE_MIN_RESPAWNS:
+        return respawn_numpy(players, target_slots, health, spawn_x, spawn_y, spawn_range, collision_map)
+    return respawn_python(players, target_slots, health, spawn_x, spawn_y, spawn_range, collision_map)
+
+def respawn_python(players, target_slots, health, spawn_x, spawn_y, spawn_range, collision_map):
+    positions = []
+    for target_slot in target_slots:
+        x, y = spawn_x, spawn_y
+        for _ in range(SPAWN_TRIES):
+            try_x = spawn_x + random.randint(-spawn_range, spawn_range)
+            try_y = spawn_y + random.randint(-spawn_range, spawn_range)
+            if collision_map.point_clear(try_x + COLLISION_OFFSET_X, try_y + COLLISION_OFFSET_Y):
+                x, y = try_x, try_y
+                break
+        players.health[target_slot] = health
+        players.x[target_slot] = x
+        players.y[target_slot] = y
+        positions.append((x, y))
+    return positions
+
+def respawn_numpy(players, target_slots, health, spawn_x, spawn_y, spawn_range, collision_map):
+    # Every try for every target at once, then the first clear one per row
+    tries_x = spawn_x + rng.integers(-spawn_range, spawn_range, size=(len(target_slots), SPAWN_TRIES), endpoint=True)
+    tries_y = spawn_y + rng.integers(-spawn_range, spawn_range, size=(len(target_slots), SPAWN_TRIES), endpoint=True)
+    clear = collision_map.points_clear(tries_x + COLLISION_OFFSET_X, tries_y + COLLISION_OFFSET_Y)
+    rows = np.arange(len(target_slots))
+    first = clear.argmax(axis=1)
+    found = clear[rows, first]
+    x = np.where(found, tries_x[rows, first], spawn_x)
+    y = np.where(found, tries_y[rows, first], spawn_y)
+
+    targets = np.asarray(target_slots, dtype=np.int64)
+    np.frombuffer(players.health, dtype=np.intc)[targets] = health
+    np.frombuffer(players.x, dtype=np.double)[targets] = x
+    np.frombuffer(players.y, dtype=np.double)[targets] = y
+    return list(zip(x.tolist(), y.tolist()))
@@ -0,0 +1,236 @@
+"""Tile map generation shared by the server and the client.
+
+The map is a width x height grid of tile codes stored row-major in a
+bytes object, one byte per tile (tiles[y * width + x]). Randomness comes
+from a counter-based hash of (seed, tile index), not the global random
+module, so generation has no side effects and every tile can be computed
+independently. With NumPy installed the whole grid is generated in a few
+array operations. Without it the same values are computed tile by tile,
+so both ends agree whichever path they take.
+
+Generated maps are cached on disk keyed by (seed, width, height), so
+later starts only read the file. CollisionMap packs the blocked tiles into
+a bitmap and checks movement against it, the same way on both ends.
+"""
+import os
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+GRASS = 0
+TREE = 1
+TILE_TYPES = ("grass", "tree")  # Tile code -> asset name
+
+# Players collide at the centre of their 30x40 sprite, relative to their (x, y)
+COLLISION_OFFSET_X = 15
+COLLISION_OFFSET_Y = 20
+
+MAP_CACHE_DIR = os.path.join("data", "maps")
+MAP_VERSION = 1  # Bump when generation changes so stale cache files are ignored
+
+# Tree density: scattered in the outer ring, sparse in the mid ring, none
+# near the center so spawning is safe, plus four small decorative clusters
+CLEAR_RADIUS = 10
+OUTER_RADIUS = 20
+OUTER_TREE_CHANCE = 0.2
+MID_TREE_CHANCE = 0.08
+CLUSTER_RADIUS = 2
+CLUSTER_TREE_CHANCE = 0.7
+
+MASK64 = 0xFFFFFFFFFFFFFFFF
+GOLDEN_GAMMA = 0x9E3779B97F4A7C15
+DRAW_BITS = 53  # Draws are compared as integers below chance * 2**53
+
+def threshold(chance):
+    return int(chance * (1 << DRAW_BITS))
+
+def mix64(z):
+    """splitmix64 finalizer on a Python int"""
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK64
+    return z ^ (z >> 31)
+
+def cluster_centers(width, height):
+    return [(width // 5, height // 5), (4 * width // 5, height // 5),
+            (width // 5, 4 * height // 5), (4 * width // 5, 4 * height // 5)]
+
+def generate_tiles(seed, width, height):
+    """Generate the tile grid for a seed as row-major bytes"""
+    if np is not None:
+        return generate_tiles_numpy(seed, width, height)
+    return generate_tiles_python(seed, width, height)
+
+def generate_tiles_python(seed, width, height):
+    outer, mid, cluster = threshold(OUTER_TREE_CHANCE), threshold(MID_TREE_CHANCE), threshold(CLUSTER_TREE_CHANCE)
+    center_x, center_y = width // 2, height // 2
+    near_cluster = {(cx + dx, cy + dy) for cx, cy in cluster_centers(width, height)
+                    for dy in range(1 - CLUSTER_RADIUS, CLUSTER_RADIUS)
+                    for dx in range(1 - CLUSTER_RADIUS, CLUSTER_RADIUS)
+                    if dx * dx + dy * dy < CLUSTER_RADIUS ** 2}
+
+    # Each tile's draws are mix64(base + (2 * index + stream + 1) * GOLDEN_GAMMA)
+    # in the top DRAW_BITS bits, with the seed hashed once up front
+    base = mix64(seed & MASK64)
+    shift = 64 - DRAW_BITS
+    tiles = bytearray(width * height)
+    for y in range(height):
+        row_distance = (y - center_y) ** 2
+        for x in range(width):
+            index = y * width + x
+            distance_squared = (x - center_x) ** 2 + row_distance
+            if distance_squared > OUTER_RADIUS ** 2:
+                chance = outer
+            elif distance_squared > CLEAR_RADIUS ** 2:
+                chance = mid
+            else:
+                chance = 0
+            if chance and mix64((base + (2 * index + 1) * GOLDEN_GAMMA) & MASK64) >> shift < chance:
+                tiles[index] = TREE
+            elif (x, y) in near_cluster and mix64((base + (2 * index + 2) * GOLDEN_GAMMA) & MASK64) >> shift < cluster:
+                tiles[index] = TREE
+    return bytes(tiles)
+
+def mix64_array(z):
+    # uint64 arithmetic wraps, matching the masked Python version
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+def generate_tiles_numpy(seed, width, height):
+    ys, xs = np.ogrid[0:height, 0:width]
+    ys = ys.astype(np.int64)
+    xs = xs.astype(np.int64)
+    index = (ys * width + xs).astype(np.uint64)
+
+    base = np.uint64(mix64(seed & MASK64))
+    gamma = np.uint64(GOLDEN_GAMMA)
+    shift = np.uint64(64 - DRAW_BITS)
+    counter = np.uint64(2) * index + np.uint64(1)
+    region_draw = mix64_array(base + counter * gamma) >> shift
+    cluster_draw = mix64_array(base + (counter + np.uint64(1)) * gamma) >> shift
+
+    distance_squared = (xs - width // 2) ** 2 + (ys - height // 2) ** 2
+    chance = np.where(distance_squared > OUTER_RADIUS ** 2, threshold(OUTER_TREE_CHANCE),
+                      np.where(distance_squared > CLEAR_RADIUS ** 2, threshold(MID_TREE_CHANCE), 0)).astype(np.uint64)
+    trees = region_draw < chance
+
+    near_cluster = np.zeros((height, width), dtype=bool)
+    for cx, cy in cluster_centers(width, height):
+        near_cluster |= (xs - cx) ** 2 + (ys - cy) ** 2 < CLUSTER_RADIUS ** 2
+    trees |= near_cluster & (cluster_draw < np.uint64(threshold(CLUSTER_TREE_CHANCE)))
+
+    return trees.astype(np.uint8).tobytes()
+
+def cache_path(seed, width, height, cache_dir=MAP_CACHE_DIR):
+    return os.path.join(cache_dir, f"map_v{MAP_VERSION}_{seed}_{width}x{height}.bin")
+
+def load_tiles(seed, width, height, cache_dir=MAP_CACHE_DIR):
+    """Return the tile grid for a seed, from the disk cache when possible"""
+    path = cache_path(seed, width, height, cache_dir)
+    try:
+        with open(path, "rb") as cache_file:
+            tiles = cache_file.read()
+        if len(tiles) == width * height:
+            return tiles
+    except OSError:
+        pass
+
+    tiles = generate_tiles(seed, width, height)
+    try:
+        # Write to a temporary file first so a concurrent reader never sees half a map
+        os.makedirs(cache_dir, exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as cache_file:
+            cache_file.write(tiles)
+        os.replace(temp_path, path)
+    except OSError as e:
+        print(f"Could not cache map: {e}")
+    return tiles
+
+def pack_blocked(tiles):
+    """Bitmap of tree tiles, bit (index & 7) of byte (index >> 3) set for a blocked tile"""
+    if np is not None:
+        return np.packbits(np.frombuffer(tiles, dtype=np.uint8) == TREE, bitorder="little").tobytes()
+    bits = bytearray((len(tiles) + 7) // 8)
+    for index, tile in enumerate(tiles):
+        if tile == TREE:
+            bits[index >> 3] |= 1 << (index & 7)
+    return bytes(bits)
+
+class CollisionMap:
+    """Blocked tiles packed one bit per tile, for point and movement checks
+    
+    Positions are in pixels and everything outside the map is blocked. A
+    move is checked by walking the tiles its segment crosses, so the cost
+    grows with the tiles crossed, not the distance in pixels.
+    """
+    
+    def __init__(self, tiles, width, height, tile_size):
+        self.width = width
+        self.height = height
+        self.tile_size = tile_size
+        self.bits = pack_blocked(tiles)
+    
+    def blocked(self, tile_x, tile_y):
+        if tile_x < 0 or tile_y < 0 or tile_x >= self.width or tile_y >= self.height:
+            return True
+        index = tile_y * self.width + tile_x
+        return self.bits[index >> 3] >> (index & 7) & 1 == 1
+    
+    def point_clear(self, x, y):
+        return not self.blocked(int(x // self.tile_size), int(y // self.tile_size))
+    
+    def points_clear(self, xs, ys):
+        """point_clear over NumPy arrays of positions, as a boolean array"""
+        tile_x = np.floor_divide(xs, self.tile_size).astype(np.int64)
+        tile_y = np.floor_divide(ys, self.tile_size).astype(np.int64)
+        inside = (tile_x >= 0) & (tile_y >= 0) & (tile_x < self.width) & (tile_y < self.height)
+        index = np.where(inside, tile_y * self.width + tile_x, 0)
+        bits = np.frombuffer(self.bits, dtype=np.uint8)
+        return inside & ((bits[index >> 3] >> (index & 7) & 1) == 0)
+    
+    def segment_clear(self, x0, y0, x1, y1):
+        """Check that a move from (x0, y0) to (x1, y1) enters no blocked tile
+        
+        The starting tile is not checked, so a player placed inside a tree
+        can still walk out of it.
+        """
+        tile_size = self.tile_size
+        tile_x = int(x0 // tile_size)
+        tile_y = int(y0 // tile_size)
+        end_x = int(x1 // tile_size)
+        end_y = int(y1 // tile_size)
+        steps = abs(end_x - tile_x) + abs(end_y - tile_y)
+        if not steps:
+            return True
+        
+        # Grid traversal (Amanatides and Woo): step to whichever tile
+        # boundary the segment reaches first, one tile per iteration
+        dx = x1 - x0
+        dy = y1 - y0
+        step_x = 1 if dx > 0 else -1
+        step_y = 1 if dy > 0 else -1
+        if dx:
+            next_x = ((tile_x + (step_x > 0)) * tile_size - x0) / dx
+            delta_x = tile_size / abs(dx)
+        else:
+            next_x = delta_x = float("inf")
+        if dy:
+            next_y = ((tile_y + (step_y > 0)) * tile_size - y0) / dy
+            delta_y = tile_size / abs(dy)
+        else:
+            next_y = delta_y = float("inf")
+        
+        for _ in range(steps):
+            # Exact corners step along x first, which also checks the side tile
+            if tile_y == end_y or (tile_x != end_x and next_x <= next_y):
+                tile_x += step_x
+                next_x += delta_x
+            else:
+                tile_y += step_y
+                next_y += delta_y
+            if self.blocked(tile_x, tile_y):
+                return False
+        return True
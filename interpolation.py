@@ -0,0 +1,125 @@
+"""Smooth remote player movement between game_state updates.
+
+Each applied game_state is stored with its arrival time. Remote players
+are drawn a little in the past, INTERPOLATION_INTERVALS broadcast
+intervals behind the newest update, so there is usually an update on
+either side of the render time to interpolate between. When updates stop
+arriving the last velocity is extrapolated for at most one update
+interval, and never more than MAX_EXTRAPOLATION seconds. After that
+players are drawn at their newest received positions. Quiet periods are
+usually players who stopped, so they do not drift past where they stood.
+
+The broadcast interval is estimated from the median of recent arrival
+gaps. Updates held up by a stall arrive together, so each one is
+timestamped at least half an interval after the one before, and the
+backlog plays out quickly instead of all at once. The server sends
+nothing while nothing changes nearby. After such a pause the previous
+positions are repeated one interval before the new update, so a player
+who stood still and then moved does not glide across the whole pause.
+"""
+import threading
+from collections import deque
+
+SNAPSHOT_BUFFER = 32  # Updates kept
+INTERPOLATION_INTERVALS = 2  # Render delay in broadcast intervals
+MIN_INTERVAL = 1.0 / 60  # Bounds on the estimated broadcast interval
+MAX_INTERVAL = 0.25
+DEFAULT_INTERVAL = 1.0 / 15
+INTERVAL_SAMPLES = 15  # Arrival gaps the interval is estimated from
+PAUSE_INTERVALS = 2.5  # A gap this many intervals long was a pause, not motion
+MIN_SPACING = 0.5  # Minimum time between buffered updates, in intervals
+MAX_EXTRAPOLATION = 0.25  # Longest extrapolation past the newest update, in seconds
+TELEPORT_DISTANCE = 200  # Pixels between updates treated as a jump (respawn), not motion
+
+class InterpolationBuffer:
+    """Timestamped game_state positions, sampled at a delayed render time"""
+
+    def __init__(self):
+        self.snapshots = deque(maxlen=SNAPSHOT_BUFFER)  # (arrival time, player ID -> (x, y))
+        self.gaps = deque(maxlen=INTERVAL_SAMPLES)
+        self.interval = DEFAULT_INTERVAL
+        self.lock = threading.Lock()  # Filled by the network thread, read by the render loop
+
+    def push(self, players, now):
+        """Store the positions of an applied game_state's players"""
+        positions = {player_id: (record["x"], record["y"])
+                     for player_id, record in players.items() if "x" in record and "y" in record}
+        with self.lock:
+            if self.snapshots:
+                last_time, last_positions = self.snapshots[-1]
+                now = max(now, last_time + self.interval * MIN_SPACING)
+                gap = now - last_time
+                if gap <= MAX_INTERVAL:
+                    self.gaps.append(gap)
+                    self.interval = max(MIN_INTERVAL, sorted(self.gaps)[len(self.gaps) // 2])
+                if gap > self.interval * PAUSE_INTERVALS:
+                    # Nothing was sent during the pause, so everyone stayed put until just now
+                    self.snapshots.append((now - self.interval, last_positions))
+            self.snapshots.append((now, positions))
+
+    def clear(self):
+        with self.lock:
+            self.snapshots.clear()
+            self.gaps.clear()
+            self.interval = DEFAULT_INTERVAL
+
+    def positions(self, now):
+        """Player ID -> (x, y) to draw at time now, for players in the newest update"""
+        with self.lock:
+            if not self.snapshots:
+                return {}
+            render_time = now - self.interval * INTERPOLATION_INTERVALS
+            newest_time, newest = self.snapshots[-1]
+
+            # Past the newest update: extrapolate from the last two, for no
+            # longer than the gap between them, then show the newest as is
+            if render_time >= newest_time:
+                if len(self.snapshots) < 2:
+                    return dict(newest)
+                previous_time, previous = self.snapshots[-2]
+                gap = newest_time - previous_time
+                if render_time - newest_time > min(gap, MAX_EXTRAPOLATION):
+                    return dict(newest)
+                ahead = (render_time - newest_time) / gap
+                return {player_id: extrapolate(previous.get(player_id), position, ahead)
+                        for player_id, position in newest.items()}
+
+            # Find the updates on either side of the render time
+            later_time, later = self.snapshots[-1]
+            earlier_time, earlier = later_time, later
+            for snapshot_time, positions in reversed(self.snapshots):
+                earlier_time, earlier = snapshot_time, positions
+                if snapshot_time <= render_time:
+                    break
+                later_time, later = snapshot_time, positions
+            if earlier_time >= render_time:
+                fraction = 0.0  # Older than anything buffered, show the oldest known positions
+                later = earlier
+            else:
+                fraction = (render_time - earlier_time) / (later_time - earlier_time)
+
+        result = {}
+        for player_id, position in newest.items():
+            end = later.get(player_id)
+            if end is None:
+                result[player_id] = position  # Entered view after the render time, show it where it is now
+                continue
+            start = earlier.get(player_id, end)
+            result[player_id] = interpolate(start, end, fraction)
+        return result
+
+def interpolate(start, end, fraction):
+    dx = end[0] - start[0]
+    dy = end[1] - start[1]
+    if dx * dx + dy * dy > TELEPORT_DISTANCE * TELEPORT_DISTANCE:
+        return start  # Jumped, stay at the old spot until the update that moved it
+    return (start[0] + dx * fraction, start[1] + dy * fraction)
+
+def extrapolate(previous, position, ahead):
+    if previous is None:
+        return position
+    dx = position[0] - previous[0]
+    dy = position[1] - previous[1]
+    if dx * dx + dy * dy > TELEPORT_DISTANCE * TELEPORT_DISTANCE:
+        return position
+    return (position[0] + dx * ahead, position[1] + dy * ahead)
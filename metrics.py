@@ -0,0 +1,244 @@
+"""Server metrics in the Prometheus text format.
+
+Counters, gauges and histograms live in a MetricsRegistry, which renders
+them for the HTTP endpoint started by start_metrics_server (bound to
+localhost only). Counters and histograms also keep the totals since the
+last take_window() call, so the server's periodic log can summarize the
+last interval while the endpoint keeps cumulative values.
+"""
+import bisect
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Histogram bucket upper bounds for durations, in seconds
+DURATION_BUCKETS = (0.00001, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+def format_labels(label_name, label_value, extra=""):
+    labels = []
+    if label_name is not None:
+        labels.append(f'{label_name}="{label_value}"')
+    if extra:
+        labels.append(extra)
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+def format_value(value):
+    return repr(float(value)) if value != float("inf") else "+Inf"
+
+class Counter:
+    """Monotonic count, optionally split by one label"""
+
+    def __init__(self, name, help_text, label=None):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.values = {}
+        self.reported = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, label_value=None):
+        with self.lock:
+            self.values[label_value] = self.values.get(label_value, 0) + amount
+
+    def total(self):
+        return sum(self.values.values())
+
+    def take_window(self):
+        """Increase per label value since the previous call"""
+        with self.lock:
+            window = {key: value - self.reported.get(key, 0) for key, value in self.values.items()}
+            self.reported = dict(self.values)
+        return {key: value for key, value in window.items() if value}
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            values = sorted(self.values.items(), key=lambda item: str(item[0]))
+        for label_value, value in values:
+            lines.append(f"{self.name}{format_labels(self.label, label_value)} {format_value(value)}")
+        return lines
+
+class Gauge:
+    """Current value, either set directly or read from a function at render time"""
+
+    def __init__(self, name, help_text, function=None):
+        self.name = name
+        self.help_text = help_text
+        self.function = function
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def get(self):
+        return self.function() if self.function else self.value
+
+    def render(self):
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge",
+                f"{self.name} {format_value(self.get())}"]
+
+class Histogram:
+    """Distribution of observed values in cumulative buckets, optionally split by one label"""
+
+    def __init__(self, name, help_text, buckets=DURATION_BUCKETS, label=None):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.label = label
+        self.series = {}  # Label value -> [bucket counts, count, sum, window count, window sum, window max]
+        self.lock = threading.Lock()
+
+    def observe(self, value, label_value=None):
+        with self.lock:
+            series = self.series.get(label_value)
+            if series is None:
+                series = self.series[label_value] = [[0] * (len(self.buckets) + 1), 0, 0.0, 0, 0.0, 0.0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += 1
+            series[2] += value
+            series[3] += 1
+            series[4] += value
+            if value > series[5]:
+                series[5] = value
+
+    def time(self, label_value=None):
+        """Context manager observing the duration of its block"""
+        return HistogramTimer(self, label_value)
+
+    def take_window(self):
+        """(count, sum, max) per label value since the previous call"""
+        with self.lock:
+            window = {}
+            for label_value, series in self.series.items():
+                window[label_value] = (series[3], series[4], series[5])
+                series[3] = 0
+                series[4] = 0.0
+                series[5] = 0.0
+        return window
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            series_items = sorted(((key, [list(s[0]), s[1], s[2]]) for key, s in self.series.items()),
+                                  key=lambda item: str(item[0]))
+        for label_value, (bucket_counts, count, total) in series_items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), bucket_counts):
+                cumulative += bucket_count
+                labels = format_labels(self.label, label_value, f'le="{format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = format_labels(self.label, label_value)
+            lines.append(f"{self.name}_sum{labels} {format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+class HistogramTimer:
+    def __init__(self, histogram, label_value):
+        self.histogram = histogram
+        self.label_value = label_value
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, self.label_value)
+        return False
+
+class TimedLock:
+    """threading.Lock that records how long callers wait for it and hold it"""
+
+    def __init__(self, wait_histogram, hold_histogram):
+        self.lock = threading.Lock()
+        self.wait_histogram = wait_histogram
+        self.hold_histogram = hold_histogram
+        self.acquired_at = 0.0
+
+    def acquire(self, blocking=True, timeout=-1):
+        start = time.perf_counter()
+        acquired = self.lock.acquire(blocking, timeout)
+        if acquired:
+            self.acquired_at = time.perf_counter()
+            self.wait_histogram.observe(self.acquired_at - start)
+        return acquired
+
+    def release(self):
+        # Only the holder writes acquired_at, so it is ours until release
+        self.hold_histogram.observe(time.perf_counter() - self.acquired_at)
+        self.lock.release()
+
+    def locked(self):
+        return self.lock.locked()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+        return False
+
+class MetricsRegistry:
+    """Named metrics plus collectors that render extra lines at scrape time"""
+
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def counter(self, name, help_text, label=None):
+        return self.register(Counter(name, help_text, label))
+
+    def gauge(self, name, help_text, function=None):
+        return self.register(Gauge(name, help_text, function))
+
+    def histogram(self, name, help_text, buckets=DURATION_BUCKETS, label=None):
+        return self.register(Histogram(name, help_text, buckets, label))
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        """Register a function returning extra exposition lines"""
+        self.collectors.append(collector)
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for collector in self.collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    registry = None
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes would flood the server log
+
+def start_metrics_server(registry, port, host="127.0.0.1"):
+    """Serve the registry at http://host:port/metrics from a daemon thread"""
+    handler = type("RegistryMetricsHandler", (MetricsHandler,), {"registry": registry})
+    http_server = ThreadingHTTPServer((host, port), handler)
+    http_server.daemon_threads = True
+    thread = threading.Thread(target=http_server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return http_server
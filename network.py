@@ -0,0 +1,281 @@
+"""Game server connection shared by the pygame client and headless bots"""
+import socket
+import threading
+import time
+
+from protocol import ENCODING_JSON, ENCODINGS, decode_payload, encode_message
+
+# Network constants
+INPUT_SEND_RATE = 20  # Position batches per second while moving
+KEEPALIVE_INTERVAL = 1.0  # Seconds between keepalives while idle
+
+class NetworkClient:
+    def __init__(self, host='localhost', port=5555, send_rate=INPUT_SEND_RATE, keepalive_interval=KEEPALIVE_INTERVAL):
+        self.host = host
+        self.port = port
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.player_id = None
+        self.other_players = {}
+        self.connected = False
+        self.receive_thread = None
+        self.send_lock = threading.Lock()  # Acks go out from the receive thread
+        self.bytes_received = 0
+        self.messages_received = 0
+        self.encoding = ENCODING_JSON  # Switched to what the server picks at login
+        
+        # Applied game_state snapshots by sequence number (0 is the empty keyframe base)
+        self.snapshots = {0: {}}
+        self.interpolation = None  # InterpolationBuffer fed with every applied game_state, if set
+        
+        # Positions waiting for the next input batch
+        self.send_interval = 1.0 / send_rate
+        self.keepalive_interval = keepalive_interval
+        self.pending_positions = []
+        self.last_position = None
+        self.last_send_time = 0
+        self.position_correction = None  # Position the server moved us back to, until applied
+        
+        # Initialize spawn position
+        self.spawn_x = 500
+        self.spawn_y = 500
+        
+        # Map data
+        self.map_seed = 12345
+        
+    def connect(self):
+        try:
+            self.socket.connect((self.host, self.port))
+            self.connected = True
+            # Start receiving thread
+            self.receive_thread = threading.Thread(target=self.receive_data_thread)
+            self.receive_thread.daemon = True
+            self.receive_thread.start()
+            return True
+        except Exception as e:
+            print(f"Connection error: {e}")
+            return False
+        
+    def register(self, username, password):
+        if not self.connected:
+            return (False, "Not connected to server")
+        
+        data = {
+            "type": "register",
+            "username": username,
+            "password": password
+        }
+        self.send_data(data)
+        
+        # The response will be handled in the receive_data_thread
+    
+    def login(self, username, password):
+        if not self.connected:
+            return (False, "Not connected to server")
+            
+        data = {
+            "type": "login",
+            "username": username,
+            "password": password,
+            "encodings": ENCODINGS
+        }
+        self.send_data(data)
+        
+        # The response will be handled in the receive_data_thread
+    
+    def send_attack(self):
+        if self.connected and self.player_id is not None:
+            # Make sure the server resolves the attack from where we are now
+            self.flush_input(force=True)
+            self.send_data({
+                "type": "attack"
+            })
+    
+    def queue_position(self, x, y):
+        # Only changes are worth sending
+        if (x, y) != self.last_position:
+            self.pending_positions.append([x, y])
+            self.last_position = (x, y)
+    
+    def flush_input(self, force=False):
+        # Send queued positions at the input send rate, or a keepalive when idle
+        now = time.time()
+        elapsed = now - self.last_send_time
+        if self.pending_positions and (force or elapsed >= self.send_interval):
+            self.send_data({
+                "type": "input",
+                "positions": self.pending_positions
+            })
+            self.pending_positions = []
+            self.last_send_time = now
+        elif elapsed >= self.keepalive_interval:
+            self.send_data({"type": "keepalive"})
+            self.last_send_time = now
+    
+    def send_data(self, data):
+        try:
+            # Length-prefixed frame in the negotiated encoding
+            frame = encode_message(data, self.encoding)
+            with self.send_lock:
+                self.socket.sendall(frame)
+        except Exception as e:
+            print(f"Error sending data: {e}")
+            self.connected = False
+    
+    def receive_data(self):
+        try:
+            # Receive message length (4 bytes)
+            message_length_bytes = self.socket.recv(4)
+            if not message_length_bytes:
+                return None
+                
+            message_length = int.from_bytes(message_length_bytes, byteorder='big')
+            
+            # Receive the actual message
+            message = b""
+            bytes_received = 0
+            
+            while bytes_received < message_length:
+                chunk = self.socket.recv(min(message_length - bytes_received, 4096))
+                if not chunk:
+                    return None
+                message += chunk
+                bytes_received += len(chunk)
+            
+            self.bytes_received += 4 + message_length
+            self.messages_received += 1
+            return decode_payload(message)
+        except Exception as e:
+            print(f"Error receiving data: {e}")
+            self.connected = False
+            return None
+    
+    def receive_data_thread(self):
+        while self.connected:
+            data = self.receive_data()
+            if not data:
+                self.connected = False
+                break
+                
+            # Handle different types of messages
+            if data.get("type") == "player_id":
+                self.player_id = data.get("id")
+                
+                # Get spawn position from server
+                self.spawn_x = data.get("x", self.spawn_x)
+                self.spawn_y = data.get("y", self.spawn_y)
+                
+                print(f"Assigned player ID: {self.player_id} at position ({self.spawn_x}, {self.spawn_y})")
+                
+            elif data.get("type") == "game_state":
+                self.apply_game_state(data)
+                
+            elif data.get("type") == "position_correction":
+                # The server refused a move, continue from where it has us
+                self.position_correction = (data["x"], data["y"])
+                self.pending_positions = []
+                self.last_position = self.position_correction
+                
+            elif data.get("type") == "register_result":
+                print(f"Registration result: {data.get('message')}")
+                # Store the result for the UI to use
+                self.last_register_result = data
+                
+            elif data.get("type") == "login_result":
+                print(f"Login result: {data.get('message')}")
+                if data.get("success"):
+                    self.encoding = data.get("encoding", ENCODING_JSON)
+                # Store the result for the UI to use
+                self.last_login_result = data
+                
+            elif data.get("type") == "map_data":
+                # Update map seed
+                self.map_seed = data.get("seed", 12345)
+                print(f"Received map seed: {self.map_seed}")
+                
+            elif data.get("type") == "attack_event":
+                self.handle_attack_event(data)
+                
+            elif data.get("type") == "attack_events":
+                # A tick's attack events, in the order they happened
+                for event in data.get("events", []):
+                    self.handle_attack_event(event)
+    
+    def handle_attack_event(self, data):
+        # Store attack event for rendering, unless it would hide our own death the game loop has not seen yet
+        pending = getattr(self, "last_attack_event", None)
+        if not (pending and pending.get("target_id") == self.player_id and pending.get("killed", False)):
+            self.last_attack_event = data
+        
+        # Get damage amount
+        damage = data.get("damage", 0)
+        
+        # Process respawn if needed
+        if data.get("target_id") == self.player_id and data.get("killed", False):
+            self.spawn_x = data.get("respawn_x", self.spawn_x)
+            self.spawn_y = data.get("respawn_y", self.spawn_y)
+        
+        # Play sound effect
+        if hasattr(self, "play_sound") and callable(self.play_sound):
+            if data.get("attacker_id") == self.player_id:
+                self.play_sound("sound_attack")
+            elif data.get("target_id") == self.player_id:
+                self.play_sound("sound_hit")
+        
+        # Add to animation queue and damage display
+        if hasattr(self, "animation_callback") and callable(self.animation_callback):
+            attacker_id = data.get("attacker_id")
+            target_id = data.get("target_id")
+            
+            # Show attack animation from attacker, following them as they are drawn
+            if str(attacker_id) in self.other_players:
+                attacker = self.other_players[str(attacker_id)]
+                attack_x = attacker.get("x", 0) + 15  # Center of player
+                attack_y = attacker.get("y", 0) + 20
+                self.animation_callback("attack", attack_x, attack_y, player_id=attacker_id,
+                                        offset=(15, 20))
+            
+            # Show damage number at target
+            if str(target_id) in self.other_players:
+                target = self.other_players[str(target_id)]
+                damage_x = target.get("x", 0) + 15  # Center of player
+                damage_y = target.get("y", 0) - 10   # Above the player
+                self.animation_callback("damage", damage_x, damage_y, damage, player_id=target_id,
+                                        offset=(15, -10))
+    
+    def apply_game_state(self, data):
+        # Deltas are relative to a snapshot we acknowledged earlier
+        base_seq = data.get("base", 0)
+        base = self.snapshots.get(base_seq)
+        if base is None:
+            return  # Server will resend from a baseline we still have
+        
+        # Records are never modified in place, so unchanged ones can be shared
+        players = dict(base)
+        for player_id, changes in data.get("players", {}).items():
+            players[player_id] = {**players.get(player_id, {}), **changes}
+        for player_id in data.get("removed", []):
+            players.pop(str(player_id), None)
+        
+        seq = data.get("seq", 0)
+        self.snapshots[seq] = players
+        
+        # The server never sends deltas older than the baseline it just used
+        for old_seq in [s for s in self.snapshots if 0 < s < base_seq]:
+            del self.snapshots[old_seq]
+        
+        self.other_players = players
+        if self.interpolation is not None:
+            self.interpolation.push(players, time.perf_counter())
+        self.send_data({"type": "ack", "seq": seq})
+    
+    def disconnect(self):
+        self.connected = False
+        self.socket.close()
+        if self.interpolation is not None:
+            self.interpolation.clear()  # Nothing buffered from this session carries over
+        
+    def register_animation_callback(self, callback):
+        self.animation_callback = callback
+        
+    def register_sound_callback(self, callback):
+        self.play_sound = callback
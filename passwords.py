@@ -0,0 +1,161 @@
+"""Salted password hashing with scrypt, run in a pool of worker processes.
+
+Stored hashes look like "scrypt$<n>$<r>$<p>$<salt hex>$<hash hex>". Plain
+64-character SHA-256 hex digests from before are still accepted and are
+flagged for rehashing, as are scrypt hashes made with older parameters.
+
+A KDF costs tens of milliseconds of CPU per call, so PasswordHasher runs
+it in separate processes. The auth thread waits without holding the GIL,
+so the game loop keeps its tick rate during a login storm. At most
+max_pending requests are queued or running. Beyond that callers wait up
+to queue_timeout for a slot and then get HasherBusy.
+"""
+import hashlib
+import hmac
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# scrypt cost parameters for new hashes (about 16 MiB and tens of ms per hash)
+SCRYPT_N = 2 ** 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+SALT_BYTES = 16
+HASH_BYTES = 32
+
+HASH_WORKERS = max(1, min(4, os.cpu_count() or 1))  # Worker processes
+MAX_PENDING_HASHES = 64  # Requests queued or running before callers wait
+HASH_QUEUE_TIMEOUT = 10.0  # Seconds a caller waits for a slot before giving up
+HASH_WORKER_NICENESS = 10  # Workers yield the CPU to the game loop when both are busy
+PARENT_CHECK_INTERVAL = 1.0  # Seconds between a worker's checks that the server is still alive
+
+# Well-formed hash at the current parameters that no password matches. Logins
+# for unknown usernames are checked against it, so they cost as much as real ones.
+DUMMY_HASH = f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${'00' * SALT_BYTES}${'00' * HASH_BYTES}"
+
+class HasherBusy(Exception):
+    """Raised when the hashing queue stays full for longer than the timeout"""
+
+def hash_password(password, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P):
+    """Hash a password with a fresh salt in the stored format"""
+    salt = os.urandom(SALT_BYTES)
+    digest = _scrypt(password, salt, n, r, p)
+    return f"scrypt${n}${r}${p}${salt.hex()}${digest.hex()}"
+
+def verify_password(password, stored):
+    """Return (valid, needs_rehash) for a password against a stored hash"""
+    if _is_legacy(stored):
+        digest = hashlib.sha256(password.encode()).hexdigest()
+        return hmac.compare_digest(digest, stored), True
+
+    try:
+        scheme, n, r, p, salt, expected = stored.split("$")
+        n, r, p = int(n), int(r), int(p)
+        salt, expected = bytes.fromhex(salt), bytes.fromhex(expected)
+    except ValueError:
+        return False, False
+    if scheme != "scrypt":
+        return False, False
+
+    valid = hmac.compare_digest(_scrypt(password, salt, n, r, p, len(expected)), expected)
+    return valid, valid and (n, r, p) != (SCRYPT_N, SCRYPT_R, SCRYPT_P)
+
+def _scrypt(password, salt, n, r, p, dklen=HASH_BYTES):
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, maxmem=256 * r * n, dklen=dklen)
+
+def _is_legacy(stored):
+    return len(stored) == 64 and all(c in "0123456789abcdef" for c in stored)
+
+def _init_worker(server_pid):
+    # Runs once in each worker process
+    try:
+        os.nice(HASH_WORKER_NICENESS)
+    except (AttributeError, OSError):
+        pass  # Not supported on this platform
+
+    # A killed server cannot shut the pool down, so exit once we are orphaned
+    watcher = threading.Thread(target=_exit_with_parent, args=(server_pid,))
+    watcher.daemon = True
+    watcher.start()
+
+def _exit_with_parent(server_pid):
+    while os.getppid() == server_pid:
+        time.sleep(PARENT_CHECK_INTERVAL)
+    os._exit(0)
+
+def _timed(function, *args):
+    # Runs in a worker: report when the job started so the caller can tell queue wait from work
+    started = time.time()
+    result = function(*args)
+    return result, started, time.time() - started
+
+class PasswordHasher:
+    """Bounded process pool for hashing and verifying passwords"""
+
+    def __init__(self, registry=None, workers=HASH_WORKERS, max_pending=MAX_PENDING_HASHES,
+                 queue_timeout=HASH_QUEUE_TIMEOUT):
+        self.workers = workers
+        self.queue_timeout = queue_timeout
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.executor = None
+        self.executor_lock = threading.Lock()
+
+        self.pending = 0
+        self.pending_lock = threading.Lock()
+        if registry is not None:
+            self.queue_wait = registry.histogram("game_password_queue_seconds",
+                                                 "Time password jobs waited for a worker process")
+            self.work_time = registry.histogram("game_password_work_seconds",
+                                                "Time spent hashing or verifying in a worker", label="op")
+            self.rejected = registry.counter("game_password_rejected_total",
+                                             "Password jobs refused because the queue stayed full")
+            registry.gauge("game_password_pending", "Password jobs queued or running", lambda: self.pending)
+        else:
+            self.queue_wait = self.work_time = self.rejected = None
+
+    def start(self):
+        """Create the worker processes now rather than on the first login"""
+        with self.executor_lock:
+            if self.executor is None:
+                # Spawned, not forked: the server has threads (and held locks) by now
+                self.executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                                    initializer=_init_worker, initargs=(os.getpid(),))
+        return self.executor
+
+    def hash(self, password):
+        """Hash a new password in a worker, blocking the calling thread"""
+        return self.run("hash", hash_password, password)
+
+    def verify(self, password, stored):
+        """Return (valid, needs_rehash), checking scrypt hashes in a worker"""
+        if _is_legacy(stored):
+            return verify_password(password, stored)  # A single SHA-256, not worth a round trip
+        return self.run("verify", verify_password, password, stored)
+
+    def run(self, op, function, *args):
+        if not self.slots.acquire(timeout=self.queue_timeout):
+            if self.rejected is not None:
+                self.rejected.inc()
+            raise HasherBusy("Too many password requests queued")
+
+        with self.pending_lock:
+            self.pending += 1
+        try:
+            submitted = time.time()
+            result, started, duration = self.start().submit(_timed, function, *args).result()
+            if self.queue_wait is not None:
+                self.queue_wait.observe(max(0.0, started - submitted))
+                self.work_time.observe(duration, op)
+            return result
+        finally:
+            with self.pending_lock:
+                self.pending -= 1
+            self.slots.release()
+
+    def close(self):
+        with self.executor_lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait=False, cancel_futures=True)
+                self.executor = None
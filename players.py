@@ -0,0 +1,167 @@
+"""Struct-of-arrays storage for the server's players.
+
+Instead of a dict per player, every field is a column. The numeric fields
+(x, y, health, max_health, last_attack_time and the movement budget) are
+typed arrays, and username and color are plain lists. A player ID maps to
+a slot, an index into every column. Slots freed by disconnects are reused
+by the next player, so the columns stay dense. The hot paths read and
+write the columns by slot, and a tick's snapshot copies each column
+instead of building a dict per player.
+"""
+import sys
+from array import array
+
+# Player fields sent to clients in game_state updates, in record order
+STATE_FIELDS = ("username", "x", "y", "health", "max_health", "color")
+
+def wire_coord(value):
+    # Whole pixel positions go out as ints, as they did when stored that way
+    return int(value) if value.is_integer() else value
+
+class PlayerStore:
+    """Player fields in parallel columns, addressed by slot"""
+
+    def __init__(self):
+        self.slots = {}  # Player ID -> slot
+        self.ids = array('q')  # Slot -> player ID, 0 for a free slot
+        self.free_slots = []
+        self.x = array('d')
+        self.y = array('d')
+        self.health = array('i')
+        self.max_health = array('i')
+        self.last_attack_time = array('d')
+        self.move_budget = array('d')  # Pixels the player may still move
+        self.move_time = array('d')    # When the budget was last refilled
+        self.usernames = []
+        self.colors = []
+
+    def add(self, player_id, username, x, y, health, max_health, color=(0, 0, 255), last_attack_time=0.0):
+        """Store a new player, reusing a free slot when there is one"""
+        if player_id in self.slots:
+            self.remove(player_id)
+        if self.free_slots:
+            slot = self.free_slots.pop()
+            self.ids[slot] = player_id
+            self.x[slot] = x
+            self.y[slot] = y
+            self.health[slot] = health
+            self.max_health[slot] = max_health
+            self.last_attack_time[slot] = last_attack_time
+            self.move_budget[slot] = 0.0
+            self.move_time[slot] = 0.0
+            self.usernames[slot] = username
+            self.colors[slot] = color
+        else:
+            slot = len(self.ids)
+            self.ids.append(player_id)
+            self.x.append(x)
+            self.y.append(y)
+            self.health.append(health)
+            self.max_health.append(max_health)
+            self.last_attack_time.append(last_attack_time)
+            self.move_budget.append(0.0)
+            self.move_time.append(0.0)
+            self.usernames.append(username)
+            self.colors.append(color)
+        self.slots[player_id] = slot
+        return slot
+
+    def remove(self, player_id):
+        """Free a player's slot for reuse"""
+        slot = self.slots.pop(player_id)
+        self.ids[slot] = 0
+        self.usernames[slot] = None
+        self.colors[slot] = None
+        self.free_slots.append(slot)
+
+    def __contains__(self, player_id):
+        return player_id in self.slots
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __iter__(self):
+        return iter(self.slots)
+
+    def position(self, player_id):
+        slot = self.slots[player_id]
+        return self.x[slot], self.y[slot]
+
+    def username(self, player_id):
+        return self.usernames[self.slots[player_id]]
+
+    def snapshot(self):
+        return PlayerSnapshot(self)
+
+    def memory_usage(self):
+        """Approximate bytes held by the columns and the slot map"""
+        size = sys.getsizeof(self.slots) + sys.getsizeof(self.free_slots)
+        for column in (self.ids, self.x, self.y, self.health, self.max_health, self.last_attack_time,
+                       self.move_budget, self.move_time, self.usernames, self.colors):
+            size += sys.getsizeof(column)
+        return size
+
+class PlayerSnapshot:
+    """Copy of the client-visible columns at one tick"""
+
+    def __init__(self, store):
+        self.slots = dict(store.slots)
+        self.x = store.x[:]
+        self.y = store.y[:]
+        self.health = store.health[:]
+        self.max_health = store.max_health[:]
+        self.usernames = store.usernames[:]
+        self.colors = store.colors[:]
+        self.position_map = None
+
+    def __eq__(self, other):
+        # Column comparisons run in C, so an idle tick costs a few memcmps
+        return (isinstance(other, PlayerSnapshot) and self.slots == other.slots and
+                self.x == other.x and self.y == other.y and self.health == other.health and
+                self.max_health == other.max_health and self.usernames == other.usernames and
+                self.colors == other.colors)
+
+    def __contains__(self, player_id):
+        return player_id in self.slots
+
+    def __len__(self):
+        return len(self.slots)
+
+    def positions(self):
+        """Player ID -> (x, y), built once for the AOI queries of every client"""
+        if self.position_map is None:
+            x = self.x
+            y = self.y
+            self.position_map = {player_id: (x[slot], y[slot]) for player_id, slot in self.slots.items()}
+        return self.position_map
+
+    def fields(self, player_id):
+        """Full game_state record for a player"""
+        slot = self.slots[player_id]
+        return {
+            "username": self.usernames[slot],
+            "x": wire_coord(self.x[slot]),
+            "y": wire_coord(self.y[slot]),
+            "health": self.health[slot],
+            "max_health": self.max_health[slot],
+            "color": self.colors[slot]
+        }
+
+    def changed_fields(self, player_id, base):
+        """Fields of a player that differ from an earlier snapshot"""
+        slot = self.slots[player_id]
+        base_slot = base.slots[player_id]
+        fields = {}
+        if self.usernames[slot] != base.usernames[base_slot]:
+            fields["username"] = self.usernames[slot]
+        if self.x[slot] != base.x[base_slot]:
+            fields["x"] = wire_coord(self.x[slot])
+        if self.y[slot] != base.y[base_slot]:
+            fields["y"] = wire_coord(self.y[slot])
+        if self.health[slot] != base.health[base_slot]:
+            fields["health"] = self.health[slot]
+        if self.max_health[slot] != base.max_health[base_slot]:
+            fields["max_health"] = self.max_health[slot]
+        if self.colors[slot] != base.colors[base_slot]:
+            fields["color"] = self.colors[slot]
+        return fields
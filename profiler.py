@@ -0,0 +1,83 @@
+"""Frame-time profiler for the game client.
+
+The main loop calls start_frame() at the top of each frame and lap(name)
+after each phase, attributing the time since the previous lap to that
+phase. The profiler keeps a rolling window of durations per phase for the
+p50/p99 overlay and can record every phase as a Chrome trace event
+(open the file in chrome://tracing or https://ui.perfetto.dev).
+"""
+import json
+import time
+from collections import deque
+
+PROFILE_WINDOW = 300  # Frames kept for the rolling percentiles
+STATS_INTERVAL = 0.5  # Seconds between percentile updates
+MAX_TRACE_EVENTS = 1000000  # Trace recording stops here (about half an hour at 60 FPS)
+
+class FrameProfiler:
+    """Times named phases of each frame, does nothing when disabled"""
+
+    def __init__(self, enabled=False, trace_path=None, window=PROFILE_WINDOW):
+        self.enabled = enabled or trace_path is not None
+        self.trace_path = trace_path
+        self.window = window
+        self.samples = {}  # Phase name -> recent durations in seconds, in first-seen order
+        self.trace_events = []
+        self.origin = time.perf_counter()
+        self.frame_start = None
+        self.last_lap = None
+        self.stats = {}
+        self.last_stats_time = 0
+
+    def start_frame(self):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        if self.frame_start is not None:
+            self.record("frame", self.frame_start, now)
+        self.frame_start = now
+        self.last_lap = now
+
+    def lap(self, name):
+        """Attribute the time since the previous lap to the named phase"""
+        if not self.enabled or self.last_lap is None:
+            return
+        now = time.perf_counter()
+        self.record(name, self.last_lap, now)
+        self.last_lap = now
+
+    def record(self, name, start, end):
+        samples = self.samples.get(name)
+        if samples is None:
+            samples = self.samples[name] = deque(maxlen=self.window)
+        samples.append(end - start)
+
+        if self.trace_path is not None and len(self.trace_events) < MAX_TRACE_EVENTS:
+            self.trace_events.append({
+                "name": name,
+                "ph": "X",
+                "ts": (start - self.origin) * 1e6,
+                "dur": (end - start) * 1e6,
+                "pid": 1,
+                "tid": 0 if name == "frame" else 1
+            })
+
+    def get_stats(self):
+        """(p50, p99) in milliseconds per phase, refreshed every STATS_INTERVAL"""
+        now = time.perf_counter()
+        if now - self.last_stats_time >= STATS_INTERVAL:
+            self.last_stats_time = now
+            self.stats = {}
+            for name, samples in self.samples.items():
+                ordered = sorted(samples)
+                self.stats[name] = (ordered[len(ordered) // 2] * 1000,
+                                    ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000)
+        return self.stats
+
+    def write_trace(self):
+        """Write the recorded phases as a Chrome trace file"""
+        if self.trace_path is None:
+            return
+        with open(self.trace_path, "w") as trace_file:
+            json.dump({"traceEvents": self.trace_events, "displayTimeUnit": "ms"}, trace_file)
+        print(f"Wrote {len(self.trace_events)} trace events to {self.trace_path}")
@@ -0,0 +1,374 @@
+"""Wire protocol shared by the game server and clients.
+
+Every message is a frame: a 4-byte big-endian payload length followed by
+the payload. Payloads are JSON objects by default. A client that offers the
+binary encoding at login also exchanges the frequent messages (movement,
+input batches, keepalives, attack, ack, game_state and attack events) as
+compact binary payloads. Their first byte is a message type below 0x20, so
+they are never mistaken for the "{" that starts a JSON payload. Anything
+without a binary form stays JSON.
+"""
+import json
+import struct
+
+ENCODING_JSON = "json"
+ENCODING_BINARY = "binary"
+ENCODINGS = [ENCODING_BINARY, ENCODING_JSON]  # In order of preference
+
+# Binary message type bytes
+MSG_MOVE = 0x01
+MSG_ATTACK = 0x02
+MSG_ACK = 0x03
+MSG_INPUT = 0x04
+MSG_KEEPALIVE = 0x05
+MSG_GAME_STATE = 0x10
+MSG_ATTACK_EVENT = 0x11
+MSG_ATTACK_EVENTS = 0x12  # A tick's attack events in one frame
+
+_LENGTH = struct.Struct(">I")
+_POSITION = struct.Struct(">ff")
+_ID = struct.Struct(">I")
+_COUNT = struct.Struct(">H")
+_STATE_HEADER = struct.Struct(">IIHH")  # seq, base, record count, removed count
+_RECORD_HEADER = struct.Struct(">IB")   # player ID, field mask
+_SHORT = struct.Struct(">h")
+_COORD = struct.Struct(">f")
+_COLOR = struct.Struct(">BBB")
+_ATTACK_EVENT = struct.Struct(">IIhhB")  # attacker, target, damage, health, killed
+
+# game_state record fields in wire order, with the mask bit flagging each one
+_RECORD_FIELDS = [
+    ("username", 0x01),
+    ("x", 0x02),
+    ("y", 0x04),
+    ("health", 0x08),
+    ("max_health", 0x10),
+    ("color", 0x20),
+]
+
+# Precompiled layouts for the two common records: position-only deltas and
+# full records (everything after the username)
+_MOVE_FIELDS = {"x", "y"}
+_MOVE_MASK = 0x02 | 0x04
+_MOVE_RECORD = struct.Struct(">IBff")
+_FULL_FIELDS = {name for name, _ in _RECORD_FIELDS}
+_FULL_MASK = 0x3F
+_FULL_TAIL = struct.Struct(">ffhhBBB")
+
+def encode_message(data, encoding=ENCODING_JSON):
+    """Encode a message as a length-prefixed frame"""
+    payload = encode_payload(data, encoding)
+    return _LENGTH.pack(len(payload)) + payload
+
+def encode_payload(data, encoding=ENCODING_JSON):
+    if encoding == ENCODING_BINARY:
+        try:
+            payload = _encode_binary(data)
+        except (KeyError, TypeError, ValueError, struct.error):
+            payload = None  # Not representable, fall back to JSON
+        if payload is not None:
+            return payload
+    return json.dumps(data).encode('utf-8')
+
+def decode_payload(payload):
+    """Decode a frame payload in either encoding"""
+    if payload and payload[0] < 0x20:
+        return _decode_binary(payload)
+    return json.loads(payload.decode('utf-8'))
+
+def encode_game_state(seq, base, records, removed, encoding=ENCODING_JSON, cache=None):
+    """Encode a game_state frame from (cache_key, player_id, fields) records
+
+    Encoded records are kept in cache under their key, so frames built for
+    different clients in the same tick share them instead of re-encoding.
+    """
+    if cache is None:
+        cache = {}
+
+    if encoding == ENCODING_BINARY:
+        parts = [bytes([MSG_GAME_STATE]), _STATE_HEADER.pack(seq, base, len(records), len(removed))]
+        for key, player_id, fields in records:
+            record = cache.get((ENCODING_BINARY, key))
+            if record is None:
+                try:
+                    record = _encode_record(player_id, fields)
+                except (KeyError, TypeError, ValueError, struct.error):
+                    record = None
+                if record is None:
+                    break  # Not representable, fall back to JSON
+                cache[(ENCODING_BINARY, key)] = record
+            parts.append(record)
+        else:
+            for player_id in removed:
+                parts.append(_ID.pack(player_id))
+            payload = b"".join(parts)
+            return _LENGTH.pack(len(payload)) + payload
+
+    # Same bytes json.dumps would produce for the whole message
+    fragments = []
+    for key, player_id, fields in records:
+        fragment = cache.get((ENCODING_JSON, key))
+        if fragment is None:
+            fragment = (json.dumps(str(player_id)) + ": " + json.dumps(fields)).encode('utf-8')
+            cache[(ENCODING_JSON, key)] = fragment
+        fragments.append(fragment)
+    payload = b"".join([
+        b'{"type": "game_state", "seq": %d, "base": %d, "players": {' % (seq, base),
+        b", ".join(fragments),
+        b'}, "removed": ',
+        json.dumps(removed).encode('utf-8'),
+        b"}"
+    ])
+    return _LENGTH.pack(len(payload)) + payload
+
+def encode_attack_events(events, encoding=ENCODING_JSON, cache=None):
+    """Encode an attack_events frame from (cache_key, event) pairs
+
+    Like encode_game_state, encoded events are kept in cache under their
+    key and shared by the frames built for different clients.
+    """
+    if cache is None:
+        cache = {}
+
+    if encoding == ENCODING_BINARY:
+        try:
+            parts = [bytes([MSG_ATTACK_EVENTS]), _COUNT.pack(len(events))]
+            for key, event in events:
+                body = cache.get((ENCODING_BINARY, key))
+                if body is None:
+                    body = _attack_event_body(event)
+                    if body is None:
+                        break  # Not representable, fall back to JSON
+                    cache[(ENCODING_BINARY, key)] = body
+                parts.append(body)
+            else:
+                payload = b"".join(parts)
+                return _LENGTH.pack(len(payload)) + payload
+        except (KeyError, TypeError, ValueError, struct.error):
+            pass
+
+    fragments = []
+    for key, event in events:
+        fragment = cache.get((ENCODING_JSON, key))
+        if fragment is None:
+            fragment = cache[(ENCODING_JSON, key)] = json.dumps(event).encode('utf-8')
+        fragments.append(fragment)
+    payload = b'{"type": "attack_events", "events": [' + b", ".join(fragments) + b"]}"
+    return _LENGTH.pack(len(payload)) + payload
+
+def choose_encoding(offered, supported=ENCODINGS):
+    """Pick the preferred encoding both sides support, JSON if none match"""
+    for encoding in supported:
+        if offered and encoding in offered:
+            return encoding
+    return ENCODING_JSON
+
+def _encode_binary(data):
+    msg_type = data.get("type")
+
+    # Movement updates carry no type, just coordinates
+    if msg_type is None:
+        if data.keys() == {"x", "y"}:
+            return bytes([MSG_MOVE]) + _POSITION.pack(data["x"], data["y"])
+        return None
+
+    if msg_type == "attack" and len(data) == 1:
+        return bytes([MSG_ATTACK])
+    if msg_type == "ack":
+        return bytes([MSG_ACK]) + _ID.pack(data["seq"])
+    if msg_type == "input" and len(data) == 2:
+        positions = data["positions"]
+        parts = [bytes([MSG_INPUT]), _COUNT.pack(len(positions))]
+        parts.extend(_POSITION.pack(x, y) for x, y in positions)
+        return b"".join(parts)
+    if msg_type == "keepalive" and len(data) == 1:
+        return bytes([MSG_KEEPALIVE])
+    if msg_type == "game_state":
+        return _encode_game_state(data)
+    if msg_type == "attack_event":
+        return _encode_attack_event(data)
+    if msg_type == "attack_events" and len(data) == 2:
+        events = data["events"]
+        parts = [bytes([MSG_ATTACK_EVENTS]), _COUNT.pack(len(events))]
+        for event in events:
+            body = _attack_event_body(event)
+            if body is None:
+                return None
+            parts.append(body)
+        return b"".join(parts)
+    return None
+
+def _encode_game_state(data):
+    players = data["players"]
+    removed = data["removed"]
+    parts = [bytes([MSG_GAME_STATE]), _STATE_HEADER.pack(data["seq"], data["base"], len(players), len(removed))]
+
+    for player_id, fields in players.items():
+        record = _encode_record(player_id, fields)
+        if record is None:
+            return None
+        parts.append(record)
+
+    for player_id in removed:
+        parts.append(_ID.pack(player_id))
+    return b"".join(parts)
+
+def _encode_record(player_id, fields):
+    keys = fields.keys()
+    if keys == _MOVE_FIELDS:
+        return _MOVE_RECORD.pack(int(player_id), _MOVE_MASK, fields["x"], fields["y"])
+    if keys == _FULL_FIELDS:
+        username = fields["username"].encode('utf-8')
+        return b"".join([
+            _RECORD_HEADER.pack(int(player_id), _FULL_MASK),
+            bytes([len(username)]),
+            username,
+            _FULL_TAIL.pack(fields["x"], fields["y"], fields["health"], fields["max_health"], *fields["color"])
+        ])
+
+    mask = 0
+    body = []
+    for name, bit in _RECORD_FIELDS:
+        if name not in fields:
+            continue
+        mask |= bit
+        value = fields[name]
+        if name == "username":
+            encoded = value.encode('utf-8')
+            body.append(bytes([len(encoded)]) + encoded)
+        elif name == "x" or name == "y":
+            body.append(_COORD.pack(value))
+        elif name == "color":
+            body.append(_COLOR.pack(*value))
+        else:
+            body.append(_SHORT.pack(value))
+
+    if len(body) != len(fields):
+        return None  # Field without a binary form
+    return _RECORD_HEADER.pack(int(player_id), mask) + b"".join(body)
+
+def _encode_attack_event(data):
+    body = _attack_event_body(data)
+    if body is None:
+        return None
+    return bytes([MSG_ATTACK_EVENT]) + body
+
+def _attack_event_body(data):
+    if not data.keys() <= {"type", "attacker_id", "target_id", "damage", "remaining_health",
+                           "killed", "respawn_x", "respawn_y"}:
+        return None
+    killed = data.get("killed", False)
+    body = _ATTACK_EVENT.pack(data["attacker_id"], data["target_id"], data["damage"], data["remaining_health"], killed)
+    if killed:
+        body += _POSITION.pack(data["respawn_x"], data["respawn_y"])
+    return body
+
+def _decode_coord(value):
+    # Whole pixel positions come back as ints, like they would from JSON
+    return int(value) if value.is_integer() else value
+
+def _decode_binary(payload):
+    msg_type = payload[0]
+
+    if msg_type == MSG_MOVE:
+        x, y = _POSITION.unpack_from(payload, 1)
+        return {"x": _decode_coord(x), "y": _decode_coord(y)}
+    if msg_type == MSG_ATTACK:
+        return {"type": "attack"}
+    if msg_type == MSG_ACK:
+        return {"type": "ack", "seq": _ID.unpack_from(payload, 1)[0]}
+    if msg_type == MSG_INPUT:
+        count = _COUNT.unpack_from(payload, 1)[0]
+        positions = []
+        for i in range(count):
+            x, y = _POSITION.unpack_from(payload, 1 + _COUNT.size + i * _POSITION.size)
+            positions.append([_decode_coord(x), _decode_coord(y)])
+        return {"type": "input", "positions": positions}
+    if msg_type == MSG_KEEPALIVE:
+        return {"type": "keepalive"}
+    if msg_type == MSG_GAME_STATE:
+        return _decode_game_state(payload)
+    if msg_type == MSG_ATTACK_EVENT:
+        return _decode_attack_event(payload, 1)[0]
+    if msg_type == MSG_ATTACK_EVENTS:
+        count = _COUNT.unpack_from(payload, 1)[0]
+        offset = 1 + _COUNT.size
+        events = []
+        for _ in range(count):
+            event, offset = _decode_attack_event(payload, offset)
+            events.append(event)
+        return {"type": "attack_events", "events": events}
+    raise ValueError(f"Unknown binary message type {msg_type}")
+
+def _decode_game_state(payload):
+    seq, base, record_count, removed_count = _STATE_HEADER.unpack_from(payload, 1)
+    offset = 1 + _STATE_HEADER.size
+
+    # Player IDs become strings, matching JSON object keys
+    players = {}
+    for _ in range(record_count):
+        player_id, mask = _RECORD_HEADER.unpack_from(payload, offset)
+        offset += _RECORD_HEADER.size
+
+        if mask == _MOVE_MASK:
+            x, y = _POSITION.unpack_from(payload, offset)
+            offset += _POSITION.size
+            players[str(player_id)] = {"x": _decode_coord(x), "y": _decode_coord(y)}
+            continue
+        if mask == _FULL_MASK:
+            length = payload[offset]
+            username = payload[offset + 1:offset + 1 + length].decode('utf-8')
+            offset += 1 + length
+            x, y, health, max_health, red, green, blue = _FULL_TAIL.unpack_from(payload, offset)
+            offset += _FULL_TAIL.size
+            players[str(player_id)] = {
+                "username": username,
+                "x": _decode_coord(x),
+                "y": _decode_coord(y),
+                "health": health,
+                "max_health": max_health,
+                "color": [red, green, blue]
+            }
+            continue
+
+        fields = {}
+        for name, bit in _RECORD_FIELDS:
+            if not mask & bit:
+                continue
+            if name == "username":
+                length = payload[offset]
+                fields[name] = payload[offset + 1:offset + 1 + length].decode('utf-8')
+                offset += 1 + length
+            elif name == "x" or name == "y":
+                fields[name] = _decode_coord(_COORD.unpack_from(payload, offset)[0])
+                offset += _COORD.size
+            elif name == "color":
+                fields[name] = list(_COLOR.unpack_from(payload, offset))
+                offset += _COLOR.size
+            else:
+                fields[name] = _SHORT.unpack_from(payload, offset)[0]
+                offset += _SHORT.size
+        players[str(player_id)] = fields
+
+    removed = [_ID.unpack_from(payload, offset + i * _ID.size)[0] for i in range(removed_count)]
+
+    return {"type": "game_state", "seq": seq, "base": base, "players": players, "removed": removed}
+
+def _decode_attack_event(payload, offset):
+    """Decode the attack event at offset, returning it and the offset after it"""
+    attacker_id, target_id, damage, remaining_health, killed = _ATTACK_EVENT.unpack_from(payload, offset)
+    offset += _ATTACK_EVENT.size
+    data = {
+        "type": "attack_event",
+        "attacker_id": attacker_id,
+        "target_id": target_id,
+        "damage": damage,
+        "remaining_health": remaining_health
+    }
+    if killed:
+        respawn_x, respawn_y = _POSITION.unpack_from(payload, offset)
+        offset += _POSITION.size
+        data["killed"] = True
+        data["respawn_x"] = _decode_coord(respawn_x)
+        data["respawn_y"] = _decode_coord(respawn_y)
+    return data, offset
@@ -1,53 +1,315 @@
 import socket
 import threading
-import json
+import asyncio
+import argparse
 import time
-import sqlite3
-import hashlib
 import os
 import random
 import math
-from datetime import datetime
+from collections import deque
+
+from combat import resolve_hits, respawn
+from game_map import COLLISION_OFFSET_X, COLLISION_OFFSET_Y, CollisionMap, load_tiles
+from metrics import MetricsRegistry, TimedLock, start_metrics_server
+from passwords import DUMMY_HASH, HasherBusy, PasswordHasher
+from players import PlayerStore, wire_coord
+from protocol import (ENCODING_JSON, ENCODINGS, choose_encoding, decode_payload, encode_attack_events,
+                      encode_game_state, encode_message)
+from storage import DATABASE_PATH, UserStore
 
 # Ensure database directory exists
 os.makedirs('data', exist_ok=True)
 
-# Set up database
-def setup_database():
-    conn = sqlite3.connect('data/game_users.db')
-    cursor = conn.cursor()
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS users (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        username TEXT UNIQUE NOT NULL,
-        password_hash TEXT NOT NULL,
-        created_at TEXT NOT NULL,
-        last_login TEXT
-    )
-    ''')
-    conn.commit()
-    conn.close()
-
-# Initialize database
-setup_database()
-
 # Map constants
 MAP_WIDTH = 50
 MAP_HEIGHT = 50
 TILE_SIZE = 40
 
+DEFAULT_BROADCAST_RATE = 15  # game_state sends per second, capped at the tick rate
+
+# Client positions beyond this are rejected, far outside the map but always finite
+MAX_COORD = 1e6
+
+# Area of interest: clients only receive players around their viewport
+VIEW_WIDTH = 800      # Client screen size in pixels
+VIEW_HEIGHT = 600
+AOI_MARGIN = 100      # Extra pixels around the viewport a player enters at
+AOI_LEAVE_MARGIN = 200  # Larger margin a player leaves at, to avoid flapping
+AOI_CELL_SIZE = 200   # Grid cell size used to find nearby players and attack events
+
+def view_origin(x, y):
+    """Top-left of the viewport of a player at (x, y), clamped to the map like the client camera"""
+    view_x = max(0, min(x - VIEW_WIDTH // 2, MAP_WIDTH * TILE_SIZE - VIEW_WIDTH))
+    view_y = max(0, min(y - VIEW_HEIGHT // 2, MAP_HEIGHT * TILE_SIZE - VIEW_HEIGHT))
+    return view_x, view_y
+
+class SpatialGrid:
+    """Uniform grid bucketing IDs by position for neighbourhood queries"""
+    
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.cells = {}  # (cell_x, cell_y) -> set of IDs
+        self.item_cells = {}  # ID -> (cell_x, cell_y)
+    
+    def cell_of(self, x, y):
+        return (int(x // self.cell_size), int(y // self.cell_size))
+    
+    def update(self, item_id, x, y):
+        """Insert an ID or move it to the cell containing (x, y)"""
+        cell = self.cell_of(x, y)
+        old_cell = self.item_cells.get(item_id)
+        if old_cell == cell:
+            return
+        if old_cell is not None:
+            self.discard_from_cell(item_id, old_cell)
+        self.cells.setdefault(cell, set()).add(item_id)
+        self.item_cells[item_id] = cell
+    
+    def remove(self, item_id):
+        old_cell = self.item_cells.pop(item_id, None)
+        if old_cell is not None:
+            self.discard_from_cell(item_id, old_cell)
+    
+    def discard_from_cell(self, item_id, cell):
+        members = self.cells[cell]
+        members.discard(item_id)
+        if not members:
+            del self.cells[cell]
+    
+    def query_rect(self, left, top, right, bottom):
+        """Yield the IDs in every cell overlapping the rectangle"""
+        min_x, min_y = self.cell_of(left, top)
+        max_x, max_y = self.cell_of(right, bottom)
+        for cell_y in range(min_y, max_y + 1):
+            for cell_x in range(min_x, max_x + 1):
+                members = self.cells.get((cell_x, cell_y))
+                if members:
+                    yield from members
+
+class ClientConnection:
+    """Outbound side of a connected client.
+    
+    Frames are queued and written by a dedicated writer thread, so the
+    game lock is never held while talking to a socket. Only the newest
+    queued game_state is kept, and a client whose queue keeps growing or
+    whose socket stops accepting data is disconnected. A tick queues at
+    most a game_state, one frame of attack events and a position
+    correction, so a full queue means seconds of backlog, not a busy tick.
+    """
+    
+    MAX_QUEUED_FRAMES = 128  # Queue depth at which a client is dropped
+    STALL_TIMEOUT = 5.0      # Seconds a single write may block
+    
+    def __init__(self, sock, addr=None, encoding=ENCODING_JSON, sent_counter=None):
+        self.sock = sock
+        self.addr = addr
+        self.encoding = encoding  # Negotiated at login
+        self.queue = deque()  # (kind, frame) pairs
+        self.closed = False
+        self.send_started = None  # When the in-flight write began
+        self.acked_seq = 0  # Last game_state the client confirmed (delta baseline)
+        self.sent_seq = 0   # Last game_state queued for the client
+        self.visible_history = {}  # seq -> player IDs the client was sent at that seq
+        self.write_time = 0.0  # Seconds spent writing frames, reset by the broadcast report
+        self.bytes_sent = 0
+        self.bytes_reported = 0  # bytes_sent at the last metrics report
+        self.sent_counter = sent_counter  # Server-wide bytes sent counter
+        self.condition = threading.Condition()
+        self.start_writer()
+    
+    def start_writer(self):
+        writer_thread = threading.Thread(target=self.write_loop)
+        writer_thread.daemon = True
+        writer_thread.start()
+    
+    def send(self, data):
+        """Queue a message for delivery, returning False if the client was dropped"""
+        return self.enqueue(encode_message(data, self.encoding), data.get("type"))
+    
+    def enqueue(self, frame, kind=None):
+        with self.condition:
+            if self.closed:
+                return False
+            
+            # Slow consumer: the socket has been blocked for too long
+            if self.send_started and time.time() - self.send_started > self.STALL_TIMEOUT:
+                return self.drop("write stalled")
+            
+            # Replace a queued game_state rather than sending stale ones
+            if kind == "game_state":
+                for i, (queued_kind, _) in enumerate(self.queue):
+                    if queued_kind == "game_state":
+                        self.queue[i] = (kind, frame)
+                        return True
+            
+            if len(self.queue) >= self.MAX_QUEUED_FRAMES:
+                return self.drop("send queue full")
+            
+            self.queue.append((kind, frame))
+            self.notify_writer()
+            return True
+    
+    def drop(self, reason):
+        print(f"Disconnecting slow client {self.addr}: {reason}")
+        self.close()
+        return False
+    
+    def notify_writer(self):
+        self.condition.notify()
+    
+    def next_frame(self):
+        """Pop the next queued frame and mark it in flight"""
+        with self.condition:
+            if self.closed or not self.queue:
+                return None
+            _, frame = self.queue.popleft()
+            self.send_started = time.time()
+            return frame
+    
+    def write_loop(self):
+        try:
+            while True:
+                with self.condition:
+                    while not self.queue and not self.closed:
+                        self.condition.wait()
+                frame = self.next_frame()
+                if frame is None:
+                    break
+                # sendall retries partial writes until the whole frame is out
+                start = time.perf_counter()
+                self.sock.sendall(frame)
+                self.write_time += time.perf_counter() - start
+                self.count_sent(len(frame))
+                self.send_started = None
+        except OSError:
+            pass
+        finally:
+            self.close()
+    
+    def count_sent(self, size):
+        self.bytes_sent += size
+        if self.sent_counter is not None:
+            self.sent_counter.inc(size)
+    
+    def close(self):
+        with self.condition:
+            if self.closed:
+                return
+            self.closed = True
+            self.queue.clear()
+            self.condition.notify_all()
+        try:
+            # Shutdown wakes up the reader thread blocked in recv
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+class AsyncClientConnection(ClientConnection):
+    """ClientConnection drained by a coroutine on the running event loop"""
+    
+    def __init__(self, writer, encoding=ENCODING_JSON, sent_counter=None):
+        self.writer = writer
+        self.wakeup = asyncio.Event()
+        super().__init__(None, writer.get_extra_info("peername"), encoding, sent_counter)
+    
+    def start_writer(self):
+        self.writer_task = asyncio.create_task(self.write_loop())
+    
+    def notify_writer(self):
+        self.wakeup.set()
+    
+    async def write_loop(self):
+        try:
+            while not self.closed:
+                frame = self.next_frame()
+                if frame is None:
+                    self.wakeup.clear()
+                    await self.wakeup.wait()
+                    continue
+                start = time.perf_counter()
+                self.writer.write(frame)
+                # Wait for the transport buffer to drain before the next frame
+                await self.writer.drain()
+                self.write_time += time.perf_counter() - start
+                self.count_sent(len(frame))
+                self.send_started = None
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self.close()
+    
+    def close(self):
+        with self.condition:
+            if self.closed:
+                return
+            self.closed = True
+            self.queue.clear()
+        self.wakeup.set()
+        self.writer.close()
+
 class GameServer:
-    def __init__(self, host='localhost', port=5555):
+    def __init__(self, host='localhost', port=5555, tick_rate=30, broadcast_rate=None):
+        if not tick_rate > 0:
+            raise ValueError(f"Tick rate must be above 0, got {tick_rate}")
+        if broadcast_rate is None:
+            broadcast_rate = min(DEFAULT_BROADCAST_RATE, tick_rate)
+        if not 0 < broadcast_rate <= tick_rate:
+            raise ValueError(f"Broadcast rate must be above 0 and at most the tick rate ({tick_rate}), got {broadcast_rate}")
         self.host = host
         self.port = port
+        self.tick_rate = tick_rate  # Simulation ticks per second
+        self.broadcast_rate = broadcast_rate  # game_state sends per second, clients interpolate in between
+        self.ticks_until_broadcast = 0
         self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         self.clients = {}
-        self.players = {}
+        self.players = PlayerStore()  # Player fields in columns, see players.py
         self.active_users = {}  # Track active user sessions by username
         self.player_count = 0
         self.running = False
-        self.lock = threading.Lock()
+        self.closed = False
+        self.encodings = ENCODINGS  # Wire encodings offered to clients at login
+        
+        # Metrics served on localhost:metrics_port and summarized in the periodic report
+        self.metrics = MetricsRegistry()
+        self.metrics_port = None
+        self.setup_metrics()
+        self.lock = TimedLock(self.lock_wait, self.lock_hold)
+        
+        # Pooled user account storage, with password hashing in worker processes
+        self.user_store = UserStore(DATABASE_PATH, registry=self.metrics)
+        self.password_hasher = PasswordHasher(self.metrics)
+        
+        # Player IDs bucketed by tile, for finding attack targets
+        self.player_grid = SpatialGrid(TILE_SIZE)
+        
+        # Recent game_state snapshots by sequence number, used as delta baselines
+        self.state_seq = 0
+        self.state_history = {}
+        self.STATE_HISTORY = 64  # Ticks a client may lag behind before a keyframe
+        
+        # Inputs received since the last tick, as (player ID, message) pairs
+        self.input_queue = deque()
+        
+        # Attack events of the current tick as (x, y, event), sent at its end to the
+        # clients whose area of interest contains (x, y)
+        self.pending_events = []
+        
+        # Players whose position or health changed since their state was last
+        # handed to the store, saved every PLAYER_SAVE_INTERVAL and on disconnect
+        self.dirty_players = set()
+        self.last_player_save = time.time()
+        self.PLAYER_SAVE_INTERVAL = 5.0  # Seconds of progress a crash can lose
+        
+        # Tick cost, reported every METRICS_REPORT_INTERVAL seconds
+        self.tick_count = 0
+        self.tick_time = 0.0
+        self.max_tick_time = 0.0
+        self.tick_overruns = 0
+        self.encode_time = 0.0
+        self.last_metrics_report = time.time()
+        self.METRICS_REPORT_INTERVAL = 10.0
         
         # Define spawn area (center of map)
         self.spawn_x = (MAP_WIDTH * TILE_SIZE) // 2
@@ -60,70 +322,69 @@ class GameServer:
         self.ATTACK_COOLDOWN = 1.0  # Seconds
         self.ATTACK_RANGE = 60      # Pixels
         
+        # Movement limits, checked on every position a client sends
+        self.MAX_MOVE_SPEED = 480.0  # Pixels per second, above the client's 5 px per axis every 16 ms
+        self.MOVE_BURST = 0.5        # Seconds of movement a late batch may catch up on
+        
         # Map seed for fixed map generation
         self.map_seed = 12345
         
-        # Generate server-side map representation for spawn validation
-        self.map_tiles = self.generate_simple_map()
-        
-    def generate_simple_map(self):
-        """Generate a simple map representation to validate spawn points"""
-        # Set the random seed for consistent generation
-        random.seed(self.map_seed)
-        
-        # Initialize with grass
-        tiles = [["grass" for _ in range(MAP_WIDTH)] for _ in range(MAP_HEIGHT)]
+        # Server-side copy of the map for spawn and movement validation, generated or read from the cache
+        self.map_tiles = load_tiles(self.map_seed, MAP_WIDTH, MAP_HEIGHT)
+        self.collision_map = CollisionMap(self.map_tiles, MAP_WIDTH, MAP_HEIGHT, TILE_SIZE)
         
-        # Add fewer trees in a more structured pattern
-        for y in range(MAP_HEIGHT):
-            for x in range(MAP_WIDTH):
-                # Keep the center completely clear to ensure safe spawning
-                distance_to_center = ((x - MAP_WIDTH//2)**2 + (y - MAP_HEIGHT//2)**2)**0.5
-                
-                # Create fewer trees in the outer areas
-                if distance_to_center > 20 and random.random() < 0.2:
-                    tiles[y][x] = "tree"
-                
-                # Create very scattered trees in the mid-range
-                elif 10 < distance_to_center <= 20 and random.random() < 0.08:
-                    tiles[y][x] = "tree"
-                    
-                # Create a few decorative tree clusters
-                elif self.is_in_tree_cluster(x, y):
-                    tiles[y][x] = "tree"
-                    
-        return tiles
-    
-    def is_in_tree_cluster(self, x, y):
-        """Check if position is in a tree cluster"""
-        # Define smaller tree cluster centers (decorative)
-        clusters = [
-            (MAP_WIDTH//5, MAP_HEIGHT//5),
-            (4*MAP_WIDTH//5, MAP_HEIGHT//5),
-            (MAP_WIDTH//5, 4*MAP_HEIGHT//5),
-            (4*MAP_WIDTH//5, 4*MAP_HEIGHT//5)
-        ]
-        
-        # Check if within any cluster radius - smaller clusters
-        for cx, cy in clusters:
-            dist = ((x - cx)**2 + (y - cy)**2)**0.5
-            if dist < 2 and random.random() < 0.7:  # Smaller clusters
-                return True
-        return False
+    def setup_metrics(self):
+        """Create the server's metrics in its registry"""
+        metrics = self.metrics
+        self.lock_wait = metrics.histogram("game_lock_wait_seconds", "Time spent waiting to acquire the game lock")
+        self.lock_hold = metrics.histogram("game_lock_hold_seconds", "Time the game lock was held per acquisition")
+        self.tick_duration = metrics.histogram("game_tick_seconds", "Duration of a simulation tick")
+        self.tick_overrun_count = metrics.counter("game_tick_overruns_total", "Ticks that took longer than their budget")
+        self.broadcast_duration = metrics.histogram("game_broadcast_seconds",
+                                                    "Time to build, encode and queue a tick's game_state for every client")
+        self.attack_duration = metrics.histogram("game_attack_batch_seconds", "Time to resolve a tick's attacks")
+        self.moves_rejected = metrics.counter("game_moves_rejected_total",
+                                              "Movement steps refused by server validation, by reason", label="reason")
+        self.attacks_resolved = metrics.counter("game_attacks_total", "Attack requests resolved, including ones on cooldown")
+        self.auth_duration = metrics.histogram("game_auth_seconds", "Time to handle a register or login request",
+                                               label="type")
+        self.auth_results = metrics.counter("game_auth_total", "Register and login requests by outcome", label="result")
+        self.messages_received = metrics.counter("game_messages_received_total", "Messages received from clients",
+                                                 label="type")
+        self.bytes_received = metrics.counter("game_bytes_received_total", "Bytes received from clients")
+        self.bytes_sent = metrics.counter("game_bytes_sent_total", "Bytes sent to clients")
+        self.connections = metrics.gauge("game_connections", "Open client connections, authenticated or not")
+        self.player_gauge = metrics.gauge("game_players", "Authenticated players in the game", lambda: len(self.players))
+        self.player_updates = metrics.counter("game_player_updates_total",
+                                              "Position and health changes applied to players")
+        metrics.add_collector(self.collect_client_metrics)
+    
+    def collect_client_metrics(self):
+        """Per-client exposition lines, rendered at scrape time"""
+        clients = list(self.clients.items())
+        lines = ["# HELP game_client_bytes_sent_total Bytes sent to each connected client",
+                 "# TYPE game_client_bytes_sent_total counter"]
+        lines.extend(f'game_client_bytes_sent_total{{player_id="{player_id}"}} {client.bytes_sent}'
+                     for player_id, client in clients)
+        lines.extend(["# HELP game_client_queued_frames Frames waiting in each connected client's send queue",
+                      "# TYPE game_client_queued_frames gauge"])
+        lines.extend(f'game_client_queued_frames{{player_id="{player_id}"}} {len(client.queue)}'
+                     for player_id, client in clients)
+        return lines
+    
+    def start_metrics_endpoint(self):
+        """Serve Prometheus metrics on localhost when a metrics port is set"""
+        if not self.metrics_port:
+            return
+        try:
+            start_metrics_server(self.metrics, self.metrics_port)
+            print(f"Metrics on http://127.0.0.1:{self.metrics_port}/metrics")
+        except OSError as e:
+            print(f"Metrics endpoint error: {e}")
     
     def is_valid_spawn_position(self, x, y):
-        """Check if a position is valid for spawning (not on a tree)"""
-        # Convert to tile coordinates
-        tile_x = int(x // TILE_SIZE)
-        tile_y = int(y // TILE_SIZE)
-        
-        # Check bounds
-        if (tile_x < 0 or tile_y < 0 or 
-            tile_x >= MAP_WIDTH or tile_y >= MAP_HEIGHT):
-            return False
-            
-        # Check if not a tree
-        return self.map_tiles[tile_y][tile_x] != "tree"
+        """Check if a position is valid for spawning (centre inside the map, not on a tree)"""
+        return self.collision_map.point_clear(x + COLLISION_OFFSET_X, y + COLLISION_OFFSET_Y)
     
     def get_valid_spawn_position(self):
         """Get a valid spawn position that's not on a tree"""
@@ -141,18 +402,21 @@ class GameServer:
     def start(self):
         try:
             self.server_socket.bind((self.host, self.port))
-            self.server_socket.listen(5)
+            self.server_socket.listen(128)  # Room for bursts of connects
             self.running = True
             print(f"Server started on {self.host}:{self.port}")
+            self.start_metrics_endpoint()
+            self.password_hasher.start()
             
-            # Start broadcasting game state
-            broadcast_thread = threading.Thread(target=self.broadcast_game_state)
-            broadcast_thread.daemon = True
-            broadcast_thread.start()
+            # Start the simulation tick loop
+            tick_thread = threading.Thread(target=self.run_tick_loop)
+            tick_thread.daemon = True
+            tick_thread.start()
             
             while self.running:
                 client_socket, addr = self.server_socket.accept()
                 print(f"Connection from {addr}")
+                self.connections.inc()
                 
                 # Handle authentication before assigning player_id
                 auth_thread = threading.Thread(target=self.handle_authentication, args=(client_socket, addr))
@@ -162,9 +426,26 @@ class GameServer:
         except Exception as e:
             print(f"Server error: {e}")
         finally:
-            self.server_socket.close()
+            self.close()
+    
+    def close(self):
+        """Stop the server and shut down what it started
+        
+        Closes the listening socket and the password worker processes, and
+        writes unsaved player state to the database. Every entry point calls
+        this when it is done with a server, and calling it again does nothing.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        self.running = False
+        self.server_socket.close()
+        self.password_hasher.close()
+        self.save_dirty_players()
+        self.user_store.close()
     
     def handle_authentication(self, client_socket, addr):
+        player_id = None
         try:
             # Wait for auth message
             while True:
@@ -173,57 +454,32 @@ class GameServer:
                     break
                 
                 auth_type = auth_data.get("type")
+                start = time.perf_counter()
                 
                 if auth_type == "register":
                     # Handle registration
                     result = self.register_user(auth_data.get("username"), auth_data.get("password"))
                     self.send_data(client_socket, {"type": "register_result", "success": result[0], "message": result[1]})
+                    self.record_auth("register", result[0], start)
                     if not result[0]:
                         continue  # If registration failed, wait for another auth attempt
                 
                 elif auth_type == "login":
                     # Handle login
                     result = self.login_user(auth_data.get("username"), auth_data.get("password"))
-                    self.send_data(client_socket, {"type": "login_result", "success": result[0], "message": result[1]})
+                    encoding = choose_encoding(auth_data.get("encodings"), self.encodings)
+                    self.send_data(client_socket, {"type": "login_result", "success": result[0], "message": result[1],
+                                                   "encoding": encoding})
+                    self.record_auth("login", result[0], start)
                     if not result[0]:
                         continue  # If login failed, wait for another auth attempt
                     
                     # If login successful, create player and start game handling
                     username = auth_data.get("username")
-                    with self.lock:
-                        self.player_count += 1
-                        player_id = self.player_count
-                        self.clients[player_id] = client_socket
-                        
-                        # Generate valid spawn position (not on trees)
-                        spawn_x, spawn_y = self.get_valid_spawn_position()
-                        
-                        # Initial player data
-                        self.players[player_id] = {
-                            "id": player_id,
-                            "username": username,
-                            "x": spawn_x,
-                            "y": spawn_y,
-                            "health": self.MAX_HEALTH,
-                            "max_health": self.MAX_HEALTH,
-                            "last_attack_time": 0,
-                            "color": (0, 0, 255)  # Default blue
-                        }
-                        
-                        # Send map seed so all clients generate the same map
-                        map_data = {
-                            "type": "map_data",
-                            "seed": self.map_seed
-                        }
-                        self.send_data(client_socket, map_data)
-                    
-                    # Send player ID and spawn position to client
-                    self.send_data(client_socket, {
-                        "type": "player_id", 
-                        "id": player_id,
-                        "x": spawn_x,
-                        "y": spawn_y
-                    })
+                    saved = self.load_player_state(username)
+                    client = ClientConnection(client_socket, addr, encoding, self.bytes_sent)
+                    player_id, spawn_x, spawn_y = self.create_player(username, client, saved)
+                    self.send_spawn_data(client, player_id, spawn_x, spawn_y)
                     
                     # Handle client communication in a separate thread
                     client_thread = threading.Thread(target=self.handle_client, args=(player_id,))
@@ -235,6 +491,67 @@ class GameServer:
         except Exception as e:
             print(f"Authentication error: {e}")
             client_socket.close()
+        finally:
+            if player_id is None:
+                self.connections.dec()  # Never made it into the game
+    
+    def record_auth(self, auth_type, success, start):
+        self.auth_duration.observe(time.perf_counter() - start, auth_type)
+        self.auth_results.inc(label_value=f"{auth_type}_{'ok' if success else 'failed'}")
+    
+    def load_player_state(self, username):
+        """Return a player's saved (x, y, health), or None to start fresh"""
+        try:
+            saved = self.user_store.load_player_state(username)
+        except Exception as e:
+            print(f"Error loading player state: {e}")
+            return None
+        if saved is None:
+            return None
+        # Positions are stored as floats, but spawns go out in whole pixels
+        # like new ones (the client's map drawing needs ints)
+        return int(saved[0]), int(saved[1]), saved[2]
+    
+    def create_player(self, username, client, saved=None):
+        """Register an authenticated client and create its player entry
+        
+        Players continue from their saved (x, y, health) when they have one
+        and it is still a valid position, otherwise they spawn fresh.
+        """
+        with self.lock:
+            self.player_count += 1
+            player_id = self.player_count
+            self.clients[player_id] = client
+            
+            if saved and self.is_valid_spawn_position(saved[0], saved[1]):
+                spawn_x, spawn_y = saved[0], saved[1]
+            else:
+                # Generate valid spawn position (not on trees)
+                spawn_x, spawn_y = self.get_valid_spawn_position()
+            health = saved[2] if saved and 0 < saved[2] <= self.MAX_HEALTH else self.MAX_HEALTH
+            
+            # Initial player data, default blue
+            self.players.add(player_id, username, spawn_x, spawn_y, health, self.MAX_HEALTH, (0, 0, 255))
+            self.player_grid.update(player_id, spawn_x, spawn_y)
+            
+        return player_id, spawn_x, spawn_y
+    
+    def send_spawn_data(self, client, player_id, spawn_x, spawn_y):
+        """Send the map seed and the assigned player ID to a new player"""
+        # Send map seed so all clients generate the same map
+        map_data = {
+            "type": "map_data",
+            "seed": self.map_seed
+        }
+        client.send(map_data)
+        
+        # Send player ID and spawn position to client
+        client.send({
+            "type": "player_id", 
+            "id": player_id,
+            "x": spawn_x,
+            "y": spawn_y
+        })
     
     def register_user(self, username, password):
         if not username or not password:
@@ -247,28 +564,19 @@ class GameServer:
             return (False, "Password must be at least 4 characters")
         
         try:
-            # Hash the password
-            password_hash = hashlib.sha256(password.encode()).hexdigest()
+            # Check first so taken names do not cost a hash
+            if self.user_store.find_user(username):
+                return (False, "Username already exists")
             
-            # Store in database
-            conn = sqlite3.connect('data/game_users.db')
-            cursor = conn.cursor()
+            # Hash the password with a fresh salt in a worker process
+            password_hash = self.password_hasher.hash(password)
             
-            # Check if user already exists
-            cursor.execute("SELECT username FROM users WHERE username = ?", (username,))
-            if cursor.fetchone():
-                conn.close()
+            # Insert new user, unless the name was taken meanwhile
+            if not self.user_store.create_user(username, password_hash):
                 return (False, "Username already exists")
-            
-            # Insert new user
-            created_at = datetime.now().isoformat()
-            cursor.execute(
-                "INSERT INTO users (username, password_hash, created_at) VALUES (?, ?, ?)",
-                (username, password_hash, created_at)
-            )
-            conn.commit()
-            conn.close()
             return (True, "Registration successful")
+        except HasherBusy:
+            return (False, "Server busy, please try again")
         except Exception as e:
             print(f"Registration error: {e}")
             return (False, "Server error during registration")
@@ -283,135 +591,159 @@ class GameServer:
                 if username in self.active_users:
                     return (False, "User already logged in")
                 
-            # Hash the password
-            password_hash = hashlib.sha256(password.encode()).hexdigest()
-            
-            # Check credentials
-            conn = sqlite3.connect('data/game_users.db')
-            cursor = conn.cursor()
-            cursor.execute(
-                "SELECT id FROM users WHERE username = ? AND password_hash = ?", 
-                (username, password_hash)
-            )
-            user = cursor.fetchone()
-            
-            if not user:
-                conn.close()
+            # Check credentials, verifying the hash in a worker process. Unknown
+            # usernames take the same time, so response times do not reveal accounts.
+            user = self.user_store.find_user(username)
+            valid, needs_rehash = self.password_hasher.verify(password, user[1] if user else DUMMY_HASH)
+            if not user or not valid:
                 return (False, "Invalid username or password")
             
-            # Update last login time
-            last_login = datetime.now().isoformat()
-            cursor.execute(
-                "UPDATE users SET last_login = ? WHERE username = ?",
-                (last_login, username)
-            )
-            conn.commit()
-            conn.close()
-            
-            # Mark user as active
+            # Mark user as active, checking again since another login may have
+            # claimed the account while we were verifying
             with self.lock:
+                if username in self.active_users:
+                    return (False, "User already logged in")
                 self.active_users[username] = True
-                
+            
+            # Upgrade old hashes in the background now that we know the password
+            if needs_rehash:
+                rehash_thread = threading.Thread(target=self.rehash_password, args=(username, password))
+                rehash_thread.daemon = True
+                rehash_thread.start()
+            
+            # Update last login time, batched with other logins
+            self.user_store.record_login(username)
+            
             return (True, "Login successful")
+        except HasherBusy:
+            return (False, "Server busy, please try again")
         except Exception as e:
             print(f"Login error: {e}")
             return (False, "Server error during login")
     
+    def rehash_password(self, username, password):
+        """Store a password under the current KDF parameters"""
+        try:
+            self.user_store.update_password_hash(username, self.password_hasher.hash(password))
+        except HasherBusy:
+            pass  # Try again on a later login
+        except Exception as e:
+            print(f"Rehash error: {e}")
+    
     def handle_client(self, player_id):
-        client_socket = self.clients.get(player_id)
-        if not client_socket:
+        client = self.clients.get(player_id)
+        if not client:
+            self.connections.dec()
             return
             
         try:
             while self.running:
-                data = self.receive_data(client_socket)
+                data = self.receive_data(client.sock)
                 if not data:
                     break
                 
-                # Handle movement updates
-                if "x" in data and "y" in data:
-                    with self.lock:
-                        if player_id in self.players:
-                            self.players[player_id]["x"] = data["x"]
-                            self.players[player_id]["y"] = data["y"]
-                
-                # Handle attack requests
-                if data.get("type") == "attack":
-                    self.handle_attack(player_id)
+                self.handle_message(player_id, data)
                 
         except Exception as e:
             print(f"Error handling client {player_id}: {e}")
         finally:
             print(f"Client {player_id} disconnected")
             self.disconnect_player(player_id)
+            self.connections.dec()
     
-    def handle_attack(self, attacker_id):
-        with self.lock:
-            # Check if attacker exists and attack cooldown has passed
-            if attacker_id not in self.players:
-                return
-                
-            attacker = self.players[attacker_id]
-            current_time = time.time()
-            
-            if current_time - attacker.get("last_attack_time", 0) < self.ATTACK_COOLDOWN:
-                return  # Attack on cooldown
-                
-            # Update last attack time
-            attacker["last_attack_time"] = current_time
-            
-            # Get attacker position
-            attacker_x = attacker["x"]
-            attacker_y = attacker["y"]
+    def handle_message(self, player_id, data):
+        """Accept a single in-game message from an authenticated player
+        
+        Movement and attacks are validated here and applied by the next
+        simulation tick. Malformed input raises, which drops the client.
+        """
+        msg_type = data.get("type")
+        
+        # Batched positions since the client's last send, oldest first
+        if msg_type == "input":
+            positions = [self.parse_position(x, y) for x, y in data["positions"]]
+            if positions:
+                self.input_queue.append((player_id, "move", positions))
+        
+        # Single position update from clients that do not batch
+        elif msg_type is None and "x" in data and "y" in data:
+            self.input_queue.append((player_id, "move", [self.parse_position(data["x"], data["y"])]))
+        
+        elif msg_type == "attack":
+            self.input_queue.append((player_id, "attack", None))
+        
+        # Client applied a game_state, so it can serve as its next delta baseline
+        elif msg_type == "ack":
+            client = self.clients.get(player_id)
+            if client and data.get("seq", 0) > client.acked_seq:
+                client.acked_seq = data["seq"]
+    
+    def parse_position(self, x, y):
+        for value in (x, y):
+            # The chained comparison also rejects NaN and infinities
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or not -MAX_COORD <= value <= MAX_COORD:
+                raise ValueError(f"Invalid position ({x!r}, {y!r})")
+        return x, y
+    
+    def resolve_attacks(self, attacker_ids):
+        """Apply a tick's attacks together and respawn killed targets (caller holds the lock)
+        
+        Every attack sees positions as they were before any of them, and
+        a target killed by one attack takes no further hits in the batch.
+        Returns the number of hits.
+        """
+        players = self.players
+        
+        # Attackers that exist and are off cooldown, each once
+        current_time = time.time()
+        attacker_slots = []
+        for attacker_id in dict.fromkeys(attacker_ids):
+            attacker_slot = players.slots.get(attacker_id)
+            if attacker_slot is None:
+                continue
+            if current_time - players.last_attack_time[attacker_slot] < self.ATTACK_COOLDOWN:
+                continue  # Attack on cooldown
+            players.last_attack_time[attacker_slot] = current_time
+            attacker_slots.append(attacker_slot)
+        if not attacker_slots:
+            return 0
+        
+        hits = resolve_hits(players, attacker_slots, self.ATTACK_RANGE, self.ATTACK_DAMAGE, self.player_grid)
+        
+        killed_slots = []
+        killed_events = []
+        for attacker_slot, target_slot, health in hits:
+            target_id = players.ids[target_slot]
+            self.dirty_players.add(target_id)
             
-            # Check for targets in range
-            attacked_players = []
-            for target_id, target in self.players.items():
-                if target_id == attacker_id:
-                    continue  # Skip self
-                    
-                # Calculate distance
-                target_x = target["x"]
-                target_y = target["y"]
-                distance = ((attacker_x - target_x) ** 2 + (attacker_y - target_y) ** 2) ** 0.5
+            # Attack notification for the clients, sent with the rest of the tick's events
+            attack_data = {
+                "type": "attack_event",
+                "attacker_id": players.ids[attacker_slot],
+                "target_id": target_id,
+                "damage": self.ATTACK_DAMAGE,
+                "remaining_health": health
+            }
+            if health <= 0:
+                killed_slots.append(target_slot)
+                killed_events.append(attack_data)
+            self.pending_events.append((players.x[target_slot], players.y[target_slot], attack_data))
+        
+        # Respawn everyone killed this tick with full health near the spawn point
+        if killed_slots:
+            respawns = respawn(players, killed_slots, self.MAX_HEALTH, self.spawn_x, self.spawn_y,
+                               self.spawn_range, self.collision_map)
+            for target_slot, attack_data, (respawn_x, respawn_y) in zip(killed_slots, killed_events, respawns):
+                self.player_grid.update(players.ids[target_slot], respawn_x, respawn_y)
                 
-                if distance <= self.ATTACK_RANGE:
-                    # Apply damage
-                    target["health"] = max(0, target["health"] - self.ATTACK_DAMAGE)
-                    attacked_players.append(target_id)
-                    
-                    # Send attack notification to all clients
-                    attack_data = {
-                        "type": "attack_event",
-                        "attacker_id": attacker_id,
-                        "target_id": target_id,
-                        "damage": self.ATTACK_DAMAGE,
-                        "remaining_health": target["health"]
-                    }
-                    
-                    # If player died, handle respawn
-                    if target["health"] <= 0:
-                        # Get a valid respawn position
-                        respawn_x, respawn_y = self.get_valid_spawn_position()
-                        
-                        # Respawn with full health at spawn point
-                        target["health"] = self.MAX_HEALTH
-                        target["x"] = respawn_x
-                        target["y"] = respawn_y
-                        
-                        # Add death info to the attack event
-                        attack_data["killed"] = True
-                        attack_data["respawn_x"] = respawn_x
-                        attack_data["respawn_y"] = respawn_y
-                    
-                    # Broadcast the attack event
-                    for _, client_socket in self.clients.items():
-                        try:
-                            self.send_data(client_socket, attack_data)
-                        except:
-                            pass  # Handle in the client thread
-                    
-            return len(attacked_players) > 0  # Return true if attack hit someone
+                # Add death info to the attack event
+                attack_data["killed"] = True
+                attack_data["respawn_x"] = respawn_x
+                attack_data["respawn_y"] = respawn_y
+        
+        if hits:
+            self.player_updates.inc(len(hits))
+        return len(hits)
     
     def disconnect_player(self, player_id):
         with self.lock:
@@ -419,18 +751,39 @@ class GameServer:
                 self.clients[player_id].close()
                 del self.clients[player_id]
             if player_id in self.players:
+                # Save where the player left off, written by the store's flusher.
+                # Queued before the username is released so a quick re-login sees it.
+                self.user_store.save_player_states([self.player_save_state(player_id)])
+                self.dirty_players.discard(player_id)
+                
                 # Remove username from active users
-                username = self.players[player_id].get("username")
+                username = self.players.username(player_id)
                 if username and username in self.active_users:
                     del self.active_users[username]
-                # Remove player
-                del self.players[player_id]
+                # Remove player, freeing its slot
+                self.players.remove(player_id)
+                self.player_grid.remove(player_id)
+    
+    def player_save_state(self, player_id):
+        players = self.players
+        slot = players.slots[player_id]
+        return (players.usernames[slot], players.x[slot], players.y[slot], players.health[slot])
+    
+    def save_dirty_players(self):
+        """Hand the state of players changed since the last save to the store's flusher"""
+        with self.lock:
+            states = [self.player_save_state(player_id)
+                      for player_id in self.dirty_players if player_id in self.players]
+            self.dirty_players.clear()
+        self.last_player_save = time.time()
+        if states:
+            self.user_store.save_player_states(states)
     
     def send_data(self, client_socket, data):
         try:
-            message = json.dumps(data).encode('utf-8')
-            message_length = len(message).to_bytes(4, byteorder='big')
-            client_socket.send(message_length + message)
+            frame = encode_message(data)
+            client_socket.sendall(frame)
+            self.bytes_sent.inc(len(frame))
         except Exception as e:
             print(f"Error sending data: {e}")
     
@@ -454,23 +807,552 @@ class GameServer:
                 message += chunk
                 bytes_received += len(chunk)
                 
-            return json.loads(message.decode('utf-8'))
+            return self.count_received(4 + message_length, decode_payload(message))
         except Exception as e:
             print(f"Error receiving data: {e}")
             return None
     
-    def broadcast_game_state(self):
+    def count_received(self, size, data):
+        """Record a received message in the metrics and pass it through"""
+        self.bytes_received.inc(size)
+        self.messages_received.inc(label_value=data.get("type") or "move")
+        return data
+    
+    def run_tick_loop(self):
+        """Run tick() at tick_rate on absolute deadlines so processing time does not drift"""
+        interval = 1.0 / self.tick_rate
+        next_tick = time.perf_counter()
         while self.running:
-            with self.lock:
-                if self.players:
-                    game_state = {"type": "game_state", "players": self.players}
-                    for player_id, client_socket in self.clients.items():
-                        try:
-                            self.send_data(client_socket, game_state)
-                        except:
-                            pass  # Handle in the client thread
-            time.sleep(0.033)  # ~30 updates per second
+            self.run_tick()
+            next_tick += interval
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # Behind schedule: start over instead of bursting to catch up
+                next_tick = time.perf_counter()
+    
+    def run_tick(self):
+        """Run one tick, logging an error instead of letting it stop the simulation"""
+        try:
+            self.tick()
+        except Exception as e:
+            print(f"Error in tick: {e}")
+    
+    def tick(self):
+        """Advance the simulation one step: apply inputs, resolve combat, broadcast"""
+        start = time.perf_counter()
+        moves, attackers = self.collect_inputs()
+        self.simulate(moves, attackers)
+        self.finish_tick(start)
+    
+    def collect_inputs(self):
+        """Drain the input queue into validated moves and the list of attackers"""
+        # Take only what is queued now, late inputs wait for the next tick
+        paths = {}
+        attackers = []
+        for _ in range(len(self.input_queue)):
+            player_id, action, positions = self.input_queue.popleft()
+            if action == "attack":
+                attackers.append(player_id)
+            else:
+                paths.setdefault(player_id, []).extend(positions)
+        return self.validate_moves(paths), attackers
+    
+    def finish_tick(self, start):
+        """Broadcast, save and account for the tick that began at start"""
+        # Broadcast every few ticks, the latest state is all clients need
+        self.ticks_until_broadcast -= 1
+        if self.ticks_until_broadcast <= 0:
+            self.ticks_until_broadcast = max(1, round(self.tick_rate / self.broadcast_rate))
+            with self.broadcast_duration.time():
+                self.send_game_state()
+        
+        # Persist changed players in the background, never a write per move
+        if time.time() - self.last_player_save >= self.PLAYER_SAVE_INTERVAL:
+            self.save_dirty_players()
+        
+        # Tick budget accounting
+        elapsed = time.perf_counter() - start
+        self.tick_count += 1
+        self.tick_time += elapsed
+        self.max_tick_time = max(self.max_tick_time, elapsed)
+        self.tick_duration.observe(elapsed)
+        if elapsed > 1.0 / self.tick_rate:
+            self.tick_overruns += 1
+            self.tick_overrun_count.inc()
+        if time.time() - self.last_metrics_report >= self.METRICS_REPORT_INTERVAL:
+            self.report_tick_metrics()
+    
+    def validate_moves(self, paths):
+        """Check every player's queued positions, returning the latest accepted position per player"""
+        moves = {}
+        with self.lock:
+            now = time.time()
+            for player_id, path in paths.items():
+                position = self.validate_path(player_id, path, now)
+                if position is not None:
+                    moves[player_id] = position
+        return moves
+    
+    def validate_path(self, player_id, path, now):
+        """Accept a player's positions up to the first illegal step (caller holds the lock)
+        
+        A step may not move faster than the player's speed budget allows or
+        cross into a tree tile. When a step is refused the rest of the path
+        is dropped and the client is told where the server has it. Returns
+        the last accepted position, or None when no step was accepted.
+        """
+        players = self.players
+        slot = players.slots.get(player_id)
+        if slot is None:
+            return None
+        
+        # The budget refills at the speed limit, up to a short burst for late batches
+        budget = min(self.MAX_MOVE_SPEED * self.MOVE_BURST,
+                     players.move_budget[slot] + self.MAX_MOVE_SPEED * (now - players.move_time[slot]))
+        x = players.x[slot]
+        y = players.y[slot]
+        collision_map = self.collision_map
+        accepted = None
+        rejected = None
+        for new_x, new_y in path:
+            distance = math.hypot(new_x - x, new_y - y)
+            if distance > budget:
+                rejected = "speed"
+                break
+            if not collision_map.segment_clear(x + COLLISION_OFFSET_X, y + COLLISION_OFFSET_Y,
+                                               new_x + COLLISION_OFFSET_X, new_y + COLLISION_OFFSET_Y):
+                rejected = "collision"
+                break
+            budget -= distance
+            x, y = new_x, new_y
+            accepted = (x, y)
+        players.move_budget[slot] = budget
+        players.move_time[slot] = now
+        
+        if rejected:
+            self.moves_rejected.inc(label_value=rejected)
+            client = self.clients.get(player_id)
+            if client:
+                client.send({"type": "position_correction", "x": wire_coord(float(x)), "y": wire_coord(float(y))})
+        return accepted
+    
+    def simulate(self, moves, attackers):
+        """Apply a tick's movement (latest position per player) and attacks"""
+        with self.lock:
+            # Movement
+            players = self.players
+            for player_id, (x, y) in moves.items():
+                slot = players.slots.get(player_id)
+                if slot is not None:
+                    players.x[slot] = x
+                    players.y[slot] = y
+                    self.player_grid.update(player_id, x, y)
+                    self.dirty_players.add(player_id)
+            if moves:
+                self.player_updates.inc(len(moves))
+            
+            # Attacks, resolved as one batch including respawning killed players
+            if attackers:
+                with self.attack_duration.time():
+                    self.resolve_attacks(attackers)
+                self.attacks_resolved.inc(len(attackers))
+            self.send_events()
+    
+    def send_game_state(self):
+        """Send every connected client what changed around it since its acknowledged state"""
+        with self.lock:
+            if not self.clients:
+                return
+            
+            # Only start a new snapshot when something actually changed
+            snapshot = self.snapshot_players()
+            if snapshot != self.state_history.get(self.state_seq):
+                self.state_seq += 1
+                self.state_history[self.state_seq] = snapshot
+                self.state_history.pop(self.state_seq - self.STATE_HISTORY, None)
+            
+            grid = None
+            changes = {}  # (player ID, base seq) -> changed fields, shared by all clients
+            encoded_records = {}  # Encoded records, shared by all frames this tick
+            for player_id, client in self.clients.items():
+                if client.sent_seq == self.state_seq:
+                    continue  # Already up to date or in flight
+                if player_id not in snapshot:
+                    continue
+                
+                # Bucket players once per tick, only when someone needs an update
+                if grid is None:
+                    grid = SpatialGrid(AOI_CELL_SIZE)
+                    for other_id, (x, y) in snapshot.positions().items():
+                        grid.update(other_id, x, y)
+                
+                previous = client.visible_history.get(client.sent_seq, ())
+                visible = self.visible_players(player_id, snapshot, grid, previous)
+                
+                # Unknown or expired baseline: send a keyframe
+                base_seq = client.acked_seq
+                if base_seq not in self.state_history or base_seq not in client.visible_history:
+                    base_seq = 0
+                
+                records, removed = self.build_state_delta(client, base_seq, snapshot, visible, changes)
+                if not records and not removed and base_seq > self.state_seq - self.STATE_HISTORY // 2:
+                    continue  # Nothing changed nearby and the baseline is not about to expire
+                
+                start = time.perf_counter()
+                frame = encode_game_state(self.state_seq, base_seq, records, removed, client.encoding, encoded_records)
+                self.encode_time += time.perf_counter() - start
+                
+                if client.enqueue(frame, "game_state"):
+                    client.sent_seq = self.state_seq
+                    client.visible_history[self.state_seq] = visible
+                    # Drop baselines that are older than the acknowledged one or expired
+                    oldest = max(client.acked_seq, self.state_seq - self.STATE_HISTORY + 1)
+                    for old_seq in [seq for seq in client.visible_history if seq < oldest]:
+                        del client.visible_history[old_seq]
+    
+    def send_events(self):
+        """Queue the tick's attack events for the clients around them, one frame each (caller holds the lock)
+        
+        An event is placed where its target was hit and goes to every client
+        whose viewport, widened by the AOI leave margin, contains that spot.
+        That covers everyone who can see the target or the attacker, and the
+        two players involved.
+        """
+        if not self.pending_events:
+            return
+        events, self.pending_events = self.pending_events, []
+        
+        grid = SpatialGrid(AOI_CELL_SIZE)
+        for index, (x, y, _) in enumerate(events):
+            grid.update(index, x, y)
+        
+        players = self.players
+        encoded_events = {}  # Encoded events, shared by all frames this tick
+        for player_id, client in self.clients.items():
+            slot = players.slots.get(player_id)
+            if slot is None:
+                continue
+            view_x, view_y = view_origin(players.x[slot], players.y[slot])
+            left = view_x - AOI_LEAVE_MARGIN
+            top = view_y - AOI_LEAVE_MARGIN
+            right = view_x + VIEW_WIDTH + AOI_LEAVE_MARGIN
+            bottom = view_y + VIEW_HEIGHT + AOI_LEAVE_MARGIN
+            
+            # Event order is the order the hits were applied in
+            nearby = sorted(index for index in grid.query_rect(left, top, right, bottom)
+                            if left <= events[index][0] <= right and top <= events[index][1] <= bottom)
+            if not nearby:
+                continue
+            
+            start = time.perf_counter()
+            frame = encode_attack_events([(index, events[index][2]) for index in nearby], client.encoding,
+                                         encoded_events)
+            self.encode_time += time.perf_counter() - start
+            client.enqueue(frame, "attack_events")
+    
+    def report_tick_metrics(self):
+        """Print tick cost against its budget, and a summary of the server metrics since the last report"""
+        interval = max(0.001, time.time() - self.last_metrics_report)
+        with self.lock:
+            write_time = 0.0
+            max_client_sent = 0
+            for client in self.clients.values():
+                write_time += client.write_time
+                client.write_time = 0.0
+                max_client_sent = max(max_client_sent, client.bytes_sent - client.bytes_reported)
+                client.bytes_reported = client.bytes_sent
+        
+        ticks = max(1, self.tick_count)
+        budget = 1000.0 / self.tick_rate
+        print(f"Tick: {self.tick_count} ticks at {self.tick_rate} Hz, "
+              f"avg {self.tick_time / ticks * 1000:.3f} ms, max {self.max_tick_time * 1000:.3f} ms "
+              f"of {budget:.1f} ms budget, {self.tick_overruns} overruns; "
+              f"broadcast encode {self.encode_time / ticks * 1000:.3f} ms/tick, "
+              f"write {write_time / ticks * 1000:.3f} ms/tick")
+        
+        lock_wait = summarize_window(self.lock_wait)
+        lock_hold = summarize_window(self.lock_hold)
+        broadcast = summarize_window(self.broadcast_duration)
+        attacks = summarize_window(self.attack_duration)
+        attack_count = sum(self.attacks_resolved.take_window().values())
+        moves_refused = sum(self.moves_rejected.take_window().values())
+        auth = summarize_window(self.auth_duration)
+        hash_wait = summarize_window(self.password_hasher.queue_wait)
+        updates = sum(self.player_updates.take_window().values())
+        rows = sum(self.user_store.rows_written.take_window().values())
+        flushes = sum(self.user_store.flushes.take_window().values())
+        sent = sum(self.bytes_sent.take_window().values())
+        received = sum(self.bytes_received.take_window().values())
+        messages = self.messages_received.take_window()
+        print(f"Metrics: {self.connections.get()} connections, {len(self.players)} players; "
+              f"lock wait avg {lock_wait[1] * 1000:.3f} max {lock_wait[2] * 1000:.3f} ms, "
+              f"hold avg {lock_hold[1] * 1000:.3f} max {lock_hold[2] * 1000:.3f} ms; "
+              f"broadcast avg {broadcast[1] * 1000:.3f} max {broadcast[2] * 1000:.3f} ms; "
+              f"{attack_count} attacks in {attacks[0]} batches avg {attacks[1] * 1e6:.1f} us; "
+              f"{moves_refused} moves refused; "
+              f"{auth[0]} auth avg {auth[1] * 1000:.1f} max {auth[2] * 1000:.1f} ms, "
+              f"password queue avg {hash_wait[1] * 1000:.1f} max {hash_wait[2] * 1000:.1f} ms; "
+              f"{updates} player updates saved as {rows} rows in {flushes} flushes; "
+              f"sent {sent / interval / 1024:.1f} KiB/s (max client {max_client_sent / interval / 1024:.1f} KiB/s), "
+              f"received {received / interval / 1024:.1f} KiB/s; messages/s "
+              + ", ".join(f"{msg_type} {count / interval:.0f}" for msg_type, count in sorted(messages.items())))
+        
+        self.tick_count = 0
+        self.tick_time = 0.0
+        self.max_tick_time = 0.0
+        self.tick_overruns = 0
+        self.encode_time = 0.0
+        self.last_metrics_report = time.time()
+    
+    def snapshot_players(self):
+        """Copy the client-visible columns of every player"""
+        return self.players.snapshot()
+    
+    def visible_players(self, player_id, snapshot, grid, previous):
+        """Return the IDs of players inside a client's area of interest"""
+        # Mirror the client camera, which stops scrolling at the map edges
+        positions = snapshot.positions()
+        view_x, view_y = view_origin(*positions[player_id])
+        
+        visible = {player_id}
+        for other_id in grid.query_rect(view_x - AOI_LEAVE_MARGIN, view_y - AOI_LEAVE_MARGIN,
+                                        view_x + VIEW_WIDTH + AOI_LEAVE_MARGIN,
+                                        view_y + VIEW_HEIGHT + AOI_LEAVE_MARGIN):
+            # Players already known stay visible until they pass the wider leave margin
+            margin = AOI_LEAVE_MARGIN if other_id in previous else AOI_MARGIN
+            other_x, other_y = positions[other_id]
+            if (view_x - margin <= other_x <= view_x + VIEW_WIDTH + margin and
+                    view_y - margin <= other_y <= view_y + VIEW_HEIGHT + margin):
+                visible.add(other_id)
+        return visible
+    
+    def build_state_delta(self, client, base_seq, snapshot, visible, changes):
+        """Collect the records a client needs since base_seq (0 = keyframe)
+        
+        Returns (records, removed): records are (cache key, player ID, fields)
+        with players entering the area of interest sent in full, and removed
+        lists players that left it or disconnected. Changed fields are
+        computed once per (player, baseline) and shared through changes.
+        """
+        baseline = self.state_history.get(base_seq)
+        base_slots = baseline.slots if baseline is not None else {}
+        base_visible = client.visible_history.get(base_seq, ())
+        
+        records = []
+        for player_id in visible:
+            if player_id in base_visible and player_id in base_slots:
+                key = (player_id, base_seq)
+                fields = changes.get(key)
+                if fields is None:
+                    fields = changes[key] = snapshot.changed_fields(player_id, baseline)
+                if not fields:
+                    continue
+            else:
+                # New to this client, send the full record
+                key = (player_id, 0)
+                fields = changes.get(key)
+                if fields is None:
+                    fields = changes[key] = snapshot.fields(player_id)
+            records.append((key, player_id, fields))
+        
+        removed = [player_id for player_id in base_visible if player_id not in visible]
+        return records, removed
+    
+def summarize_window(histogram):
+    """(count, average, max) of a histogram since its last window, over all labels"""
+    count, total, maximum = 0, 0.0, 0.0
+    for window_count, window_sum, window_max in histogram.take_window().values():
+        count += window_count
+        total += window_sum
+        maximum = max(maximum, window_max)
+    return count, total / count if count else 0.0, maximum
+
+class AsyncGameServer(GameServer):
+    """GameServer variant that runs on a single asyncio event loop.
+    
+    Every connection, the authentication flow and the broadcast loop are
+    coroutines on one loop instead of one thread per client. The wire
+    protocol and game rules are shared with the threaded GameServer.
+    """
+    
+    def start(self):
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            pass
+        except Exception as e:
+            print(f"Server error: {e}")
+        finally:
+            self.close()
+    
+    async def serve(self):
+        self.server_socket.bind((self.host, self.port))
+        self.server_socket.listen(128)  # Room for bursts of connects
+        self.server_socket.setblocking(False)
+        server = await asyncio.start_server(self.handle_connection, sock=self.server_socket)
+        self.running = True
+        print(f"Server started on {self.host}:{self.port} (asyncio)")
+        self.start_metrics_endpoint()
+        self.password_hasher.start()
+        
+        # Start the simulation tick loop
+        tick_task = asyncio.create_task(self.run_tick_loop())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.running = False
+            tick_task.cancel()
+    
+    async def handle_connection(self, reader, writer):
+        addr = writer.get_extra_info("peername")
+        print(f"Connection from {addr}")
+        self.connections.inc()
+        
+        try:
+            player_id = await self.handle_authentication(reader, writer)
+            if player_id is None:
+                writer.close()
+                return
+            
+            await self.handle_client(player_id, reader)
+        finally:
+            self.connections.dec()
+    
+    async def handle_authentication(self, reader, writer):
+        """Run the register/login exchange, returning the new player ID"""
+        loop = asyncio.get_running_loop()
+        try:
+            # Wait for auth message
+            while True:
+                auth_data = await self.receive_data(reader)
+                if not auth_data:
+                    return None
+                
+                auth_type = auth_data.get("type")
+                start = time.perf_counter()
+                
+                if auth_type == "register":
+                    # Database access blocks, so keep it off the event loop
+                    result = await loop.run_in_executor(
+                        None, self.register_user, auth_data.get("username"), auth_data.get("password"))
+                    self.send_data(writer, {"type": "register_result", "success": result[0], "message": result[1]})
+                    self.record_auth("register", result[0], start)
+                
+                elif auth_type == "login":
+                    result = await loop.run_in_executor(
+                        None, self.login_user, auth_data.get("username"), auth_data.get("password"))
+                    encoding = choose_encoding(auth_data.get("encodings"), self.encodings)
+                    self.send_data(writer, {"type": "login_result", "success": result[0], "message": result[1],
+                                            "encoding": encoding})
+                    self.record_auth("login", result[0], start)
+                    if not result[0]:
+                        continue  # If login failed, wait for another auth attempt
+                    
+                    # If login successful, create player and start game handling
+                    username = auth_data.get("username")
+                    saved = await loop.run_in_executor(None, self.load_player_state, username)
+                    client = AsyncClientConnection(writer, encoding, self.bytes_sent)
+                    player_id, spawn_x, spawn_y = self.create_player(username, client, saved)
+                    self.send_spawn_data(client, player_id, spawn_x, spawn_y)
+                    return player_id
+        except Exception as e:
+            print(f"Authentication error: {e}")
+            return None
+    
+    async def handle_client(self, player_id, reader):
+        try:
+            while self.running:
+                data = await self.receive_data(reader)
+                if not data:
+                    break
+                
+                self.handle_message(player_id, data)
+                
+        except Exception as e:
+            print(f"Error handling client {player_id}: {e}")
+        finally:
+            print(f"Client {player_id} disconnected")
+            self.disconnect_player(player_id)
+    
+    def send_data(self, writer, data):
+        try:
+            frame = encode_message(data)
+            writer.write(frame)
+            self.bytes_sent.inc(len(frame))
+        except Exception as e:
+            print(f"Error sending data: {e}")
+    
+    async def receive_data(self, reader):
+        try:
+            # Receive message length (4 bytes), then the actual message
+            message_length_bytes = await reader.readexactly(4)
+            message_length = int.from_bytes(message_length_bytes, byteorder='big')
+            message = await reader.readexactly(message_length)
+            return self.count_received(4 + message_length, decode_payload(message))
+        except asyncio.IncompleteReadError:
+            return None
+        except Exception as e:
+            print(f"Error receiving data: {e}")
+            return None
+    
+    async def run_tick_loop(self):
+        interval = 1.0 / self.tick_rate
+        next_tick = time.perf_counter()
+        while self.running:
+            await self.run_tick_async()
+            next_tick += interval
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                # Behind schedule: yield to connections, then start over
+                await asyncio.sleep(0)
+                next_tick = time.perf_counter()
+    
+    async def run_tick_async(self):
+        """Run one tick from the tick loop, for subclasses that need to await part of it"""
+        self.run_tick()
+
+# Server implementations selectable at startup
+SERVER_MODES = {
+    "threaded": GameServer,
+    "asyncio": AsyncGameServer,
+}
 
 if __name__ == "__main__":
-    server = GameServer()
+    parser = argparse.ArgumentParser(description="2D MMO game server")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=5555)
+    parser.add_argument("--mode", choices=sorted(SERVER_MODES), default="threaded",
+                        help="threaded: one thread per connection, asyncio: single event loop")
+    parser.add_argument("--json-only", action="store_true",
+                        help="do not offer the binary wire encoding to clients")
+    parser.add_argument("--tick-rate", type=int, default=30,
+                        help="simulation ticks per second")
+    parser.add_argument("--broadcast-rate", type=int, default=None,
+                        help=f"game_state updates sent to clients per second, at most the tick rate "
+                             f"(default {DEFAULT_BROADCAST_RATE} or the tick rate if lower). Sends happen every "
+                             f"round(tick rate / broadcast rate) ticks, so the actual rate can differ: "
+                             f"--tick-rate 30 --broadcast-rate 20 sends at 15 Hz")
+    parser.add_argument("--metrics-port", type=int, default=9555,
+                        help="serve Prometheus metrics on 127.0.0.1 at this port (0 disables)")
+    parser.add_argument("--zones", type=int, default=1,
+                        help="split the world into this many zones, each simulated in its own process")
+    args = parser.parse_args()
+    
+    try:
+        if args.zones > 1:
+            from zones import ZONED_SERVER_MODES
+            server = ZONED_SERVER_MODES[args.mode](args.host, args.port, args.tick_rate, args.broadcast_rate,
+                                                   zones=args.zones)
+        else:
+            server = SERVER_MODES[args.mode](args.host, args.port, args.tick_rate, args.broadcast_rate)
+    except ValueError as e:
+        parser.error(str(e))
+    server.metrics_port = args.metrics_port
+    if args.json_only:
+        server.encodings = [ENCODING_JSON]
     server.start() 
\ No newline at end of file
@@ -0,0 +1,228 @@
+"""SQLite storage for user accounts and saved player state.
+
+Connections are pooled instead of opened per request, the database runs
+in WAL mode so logins (readers) do not block on registrations (writers),
+and writes are buffered and committed in one transaction by a background
+flusher: last_login timestamps once per flush interval, player state as
+soon as the server hands it over. Repeated updates for the same user
+between flushes collapse into a single row write.
+"""
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+DATABASE_PATH = 'data/game_users.db'
+POOL_SIZE = 4  # Connections shared by the auth threads
+FLUSH_INTERVAL = 1.0  # Seconds between batched writes when nothing asks for an earlier flush
+BUSY_TIMEOUT_MS = 5000  # How long a writer waits for another writer
+
+# SQL is kept in constants so each connection's statement cache reuses the
+# prepared statements instead of parsing them on every call
+CREATE_USERS = '''
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT UNIQUE NOT NULL,
+    password_hash TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    last_login TEXT
+)
+'''
+SELECT_USER = "SELECT id, password_hash FROM users WHERE username = ?"
+INSERT_USER = "INSERT INTO users (username, password_hash, created_at) VALUES (?, ?, ?)"
+UPDATE_LAST_LOGIN = "UPDATE users SET last_login = ? WHERE username = ?"
+UPDATE_PASSWORD_HASH = "UPDATE users SET password_hash = ? WHERE username = ?"
+
+# Last known position and health per user, restored at login. WITHOUT ROWID
+# keeps each row in the primary key b-tree, so a save touches one index, not two.
+CREATE_PLAYER_STATE = '''
+CREATE TABLE IF NOT EXISTS player_state (
+    username TEXT PRIMARY KEY,
+    x REAL NOT NULL,
+    y REAL NOT NULL,
+    health INTEGER NOT NULL,
+    updated_at TEXT NOT NULL
+) WITHOUT ROWID
+'''
+SELECT_PLAYER_STATE = "SELECT x, y, health FROM player_state WHERE username = ?"
+UPSERT_PLAYER_STATE = "INSERT OR REPLACE INTO player_state (username, x, y, health, updated_at) VALUES (?, ?, ?, ?, ?)"
+
+class UserStore:
+    """Pooled access to the users and player_state tables"""
+
+    def __init__(self, path=DATABASE_PATH, pool_size=POOL_SIZE, flush_interval=FLUSH_INTERVAL, registry=None):
+        self.path = path
+        self.pool_size = pool_size
+        self.pool = queue.LifoQueue()  # Most recently used first, so idle connections stay warm
+        self.created = 0
+        self.pool_lock = threading.Lock()
+
+        # Latest login time and player state per username, waiting for the next flush.
+        # States being written stay readable in flushing_states until committed.
+        self.pending_logins = {}
+        self.pending_states = {}
+        self.flushing_states = {}
+        self.pending_lock = threading.Lock()
+        self.flush_interval = flush_interval
+        self.flush_wakeup = threading.Event()
+        self.flush_thread = None
+        self.closed = False
+
+        if registry is not None:
+            self.rows_written = registry.counter("game_storage_rows_written_total",
+                                                 "Rows written by batched flushes", label="table")
+            self.flushes = registry.counter("game_storage_flushes_total", "Batched write transactions committed")
+            self.flush_duration = registry.histogram("game_storage_flush_seconds", "Time spent in a batched flush")
+        else:
+            self.rows_written = self.flushes = self.flush_duration = None
+
+        self.setup()
+
+    def setup(self):
+        conn = self.acquire()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")  # Stored in the database file
+            conn.execute(CREATE_USERS)
+            conn.execute(CREATE_PLAYER_STATE)
+            conn.commit()
+        finally:
+            self.release(conn)
+
+    def connect(self):
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+        conn.execute("PRAGMA synchronous=NORMAL")  # Safe with WAL, avoids an fsync per commit
+        return conn
+
+    def acquire(self):
+        """Take a pooled connection, opening a new one while under pool_size"""
+        try:
+            return self.pool.get_nowait()
+        except queue.Empty:
+            pass
+        with self.pool_lock:
+            if self.created < self.pool_size:
+                self.created += 1
+                return self.connect()
+        return self.pool.get()
+
+    def release(self, conn):
+        self.pool.put(conn)
+
+    def find_user(self, username):
+        """Return (id, password_hash) for a username, or None"""
+        conn = self.acquire()
+        try:
+            return conn.execute(SELECT_USER, (username,)).fetchone()
+        finally:
+            self.release(conn)
+
+    def create_user(self, username, password_hash):
+        """Insert a user, returning False if the username is taken"""
+        conn = self.acquire()
+        try:
+            with conn:
+                conn.execute(INSERT_USER, (username, password_hash, datetime.now().isoformat()))
+            return True
+        except sqlite3.IntegrityError:
+            return False
+        finally:
+            self.release(conn)
+
+    def update_password_hash(self, username, password_hash):
+        conn = self.acquire()
+        try:
+            with conn:
+                conn.execute(UPDATE_PASSWORD_HASH, (password_hash, username))
+        finally:
+            self.release(conn)
+
+    def record_login(self, username):
+        """Buffer a last_login update for the next batched flush"""
+        with self.pending_lock:
+            self.pending_logins[username] = datetime.now().isoformat()
+            self.start_flusher()
+
+    def load_player_state(self, username):
+        """Return the saved (x, y, health) for a username, or None"""
+        with self.pending_lock:
+            state = self.pending_states.get(username) or self.flushing_states.get(username)
+        if state is not None:
+            return state[:3]  # Saved but not written yet
+
+        conn = self.acquire()
+        try:
+            return conn.execute(SELECT_PLAYER_STATE, (username,)).fetchone()
+        finally:
+            self.release(conn)
+
+    def save_player_states(self, states):
+        """Buffer (username, x, y, health) tuples and wake the flusher to write them"""
+        now = datetime.now().isoformat()
+        with self.pending_lock:
+            for username, x, y, health in states:
+                self.pending_states[username] = (x, y, health, now)
+            self.start_flusher()
+        self.flush_wakeup.set()
+
+    def start_flusher(self):
+        # Caller holds pending_lock
+        if self.flush_thread is None and not self.closed:
+            self.flush_thread = threading.Thread(target=self.flush_loop)
+            self.flush_thread.daemon = True
+            self.flush_thread.start()
+
+    def flush_loop(self):
+        while not self.closed:
+            self.flush_wakeup.wait(self.flush_interval)
+            self.flush_wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """Write every buffered last_login and player state in a single transaction"""
+        with self.pending_lock:
+            if not self.pending_logins and not self.pending_states:
+                return 0
+            logins, self.pending_logins = self.pending_logins, {}
+            states, self.pending_states = self.pending_states, {}
+            self.flushing_states = states
+
+        start = time.perf_counter()
+        conn = self.acquire()
+        try:
+            with conn:
+                if logins:
+                    conn.executemany(UPDATE_LAST_LOGIN, [(last_login, username) for username, last_login in logins.items()])
+                if states:
+                    conn.executemany(UPSERT_PLAYER_STATE, [(username,) + state for username, state in states.items()])
+        except sqlite3.Error as e:
+            # Keep the writes for the next flush, unless they were superseded meanwhile
+            with self.pending_lock:
+                self.pending_logins = {**logins, **self.pending_logins}
+                self.pending_states = {**states, **self.pending_states}
+            print(f"Error saving buffered writes, keeping {len(logins) + len(states)} for the next flush: {e}")
+            return 0
+        finally:
+            self.release(conn)
+            with self.pending_lock:
+                self.flushing_states = {}
+
+        if self.flushes is not None:
+            self.flushes.inc()
+            self.flush_duration.observe(time.perf_counter() - start)
+            self.rows_written.inc(len(logins), "users")
+            self.rows_written.inc(len(states), "player_state")
+        return len(logins) + len(states)
+
+    def close(self):
+        """Flush buffered writes and close every pooled connection"""
+        self.closed = True
+        self.flush_wakeup.set()
+        if self.flush_thread is not None:
+            self.flush_thread.join()
+        self.flush()
+        while True:
+            try:
+                self.pool.get_nowait().close()
+            except queue.Empty:
+                break
@@ -0,0 +1,471 @@
+"""Zone sharding: the world split into vertical strips, each simulated in its own process.
+
+The front-end is a normal GameServer (threaded or asyncio) that keeps the
+client sockets, authentication, storage and the game_state broadcast. Its
+simulation step is replaced: each tick it sends every zone worker the
+inputs of the players inside that zone's strip in one message, waits for
+all of them, and merges their replies into its own copy of the players.
+The zones do their work in parallel, each in its own process with its own GIL.
+
+A player whose position leaves a zone's strip is handed off. The old zone
+drops them and returns their state, and the front-end adds them to the new
+zone in the next tick's message. Attacks near a border also see the
+neighbouring zones' players as ghosts, at their positions from the end of
+the previous tick. Hits on a ghost are forwarded to the zone that owns the
+target and applied one tick later.
+
+A worker that dies or stops answering for ZONE_REPLY_TIMEOUT is replaced
+by a new process, and its players rejoin it from the front-end's copy.
+In asyncio mode the wait for the zones runs in a thread of its own, so
+the event loop keeps serving connections meanwhile.
+
+    python server.py --zones 4
+"""
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from game_map import CollisionMap, load_tiles
+from server import AsyncGameServer, GameServer, SpatialGrid, MAP_WIDTH, MAP_HEIGHT, TILE_SIZE
+
+WORLD_WIDTH = MAP_WIDTH * TILE_SIZE
+ZONE_REPLY_TIMEOUT = 5.0  # Seconds to wait for a zone's reply before restarting its worker
+
+def zone_of(x, zone_count):
+    """Index of the zone strip containing a world x coordinate"""
+    return min(zone_count - 1, max(0, int(x * zone_count // WORLD_WIDTH)))
+
+def zone_bounds(zone, zone_count):
+    return zone * WORLD_WIDTH / zone_count, (zone + 1) * WORLD_WIDTH / zone_count
+
+class ZoneSimulation:
+    """Movement, combat and respawns for the players inside one zone"""
+
+    # Spawn validation shares the front-end's rules and map
+    is_valid_spawn_position = GameServer.is_valid_spawn_position
+    get_valid_spawn_position = GameServer.get_valid_spawn_position
+
+    def __init__(self, zone, zone_count, config):
+        self.zone = zone
+        self.zone_count = zone_count
+        self.players = {}  # Player ID -> {"x", "y", "health", "last_attack_time"}
+        self.player_grid = SpatialGrid(TILE_SIZE)
+        self.MAX_HEALTH = config["max_health"]
+        self.ATTACK_DAMAGE = config["attack_damage"]
+        self.ATTACK_COOLDOWN = config["attack_cooldown"]
+        self.ATTACK_RANGE = config["attack_range"]
+        self.spawn_x, self.spawn_y, self.spawn_range = config["spawn"]
+        self.map_tiles = load_tiles(config["map_seed"], MAP_WIDTH, MAP_HEIGHT)
+        self.collision_map = CollisionMap(self.map_tiles, MAP_WIDTH, MAP_HEIGHT, TILE_SIZE)
+
+    def step(self, message):
+        """Apply one tick's message from the front-end and return what changed"""
+        start = time.perf_counter()
+        events = []
+        forwarded_hits = []
+        changed = set()
+        attack_times = {}  # Attackers whose cooldown restarted, for the front-end's copy
+
+        for player_id, state in message["joins"].items():
+            self.players[player_id] = state
+            self.player_grid.update(player_id, state["x"], state["y"])
+        for player_id in message["leaves"]:
+            if self.players.pop(player_id, None) is not None:
+                self.player_grid.remove(player_id)
+
+        # Hits on our players from attackers in other zones, one tick late
+        for attacker_id, target_id in message["hits"]:
+            if target_id in self.players:
+                self.hit(attacker_id, target_id, events, changed)
+
+        for player_id, (x, y) in message["moves"].items():
+            player = self.players.get(player_id)
+            if player is not None:
+                player["x"] = x
+                player["y"] = y
+                self.player_grid.update(player_id, x, y)
+                changed.add(player_id)
+
+        attack_start = time.perf_counter()
+        if message["attacks"]:
+            ghost_grid = SpatialGrid(TILE_SIZE)
+            for ghost_id, (x, y) in message["ghosts"].items():
+                ghost_grid.update(ghost_id, x, y)
+            for attacker_id in message["attacks"]:
+                self.attack(attacker_id, message["time"], message["ghosts"], ghost_grid, events, changed,
+                            forwarded_hits, attack_times)
+        attack_duration = time.perf_counter() - attack_start
+
+        # Players that left the strip go back to the front-end for the new zone
+        handoffs = {}
+        for player_id in changed:
+            player = self.players[player_id]
+            if zone_of(player["x"], self.zone_count) != self.zone:
+                handoffs[player_id] = self.players.pop(player_id)
+                self.player_grid.remove(player_id)
+
+        states = {player_id: (self.players[player_id]["x"], self.players[player_id]["y"],
+                              self.players[player_id]["health"])
+                  for player_id in changed if player_id in self.players}
+        return {"states": states, "handoffs": handoffs, "events": events, "hits": forwarded_hits,
+                "attack_times": attack_times, "duration": time.perf_counter() - start, "attack_duration": attack_duration}
+
+    def attack(self, attacker_id, now, ghosts, ghost_grid, events, changed, forwarded_hits, attack_times):
+        """Same rules as GameServer.resolve_attacks applied one attack at a time, with ghosts hit by forwarding"""
+        attacker = self.players.get(attacker_id)
+        if attacker is None or now - attacker["last_attack_time"] < self.ATTACK_COOLDOWN:
+            return
+        attacker["last_attack_time"] = now
+        attack_times[attacker_id] = now
+
+        attacker_x = attacker["x"]
+        attacker_y = attacker["y"]
+        attack_range = self.ATTACK_RANGE
+        range_squared = attack_range * attack_range
+        rect = (attacker_x - attack_range, attacker_y - attack_range,
+                attacker_x + attack_range, attacker_y + attack_range)
+
+        for target_id in list(self.player_grid.query_rect(*rect)):
+            if target_id == attacker_id:
+                continue
+            target = self.players[target_id]
+            dx = attacker_x - target["x"]
+            dy = attacker_y - target["y"]
+            if dx * dx + dy * dy <= range_squared:
+                self.hit(attacker_id, target_id, events, changed)
+
+        for target_id in ghost_grid.query_rect(*rect):
+            x, y = ghosts[target_id]
+            dx = attacker_x - x
+            dy = attacker_y - y
+            if dx * dx + dy * dy <= range_squared:
+                forwarded_hits.append((attacker_id, target_id))
+
+    def hit(self, attacker_id, target_id, events, changed):
+        """Damage one of our players, respawning them if killed"""
+        target = self.players[target_id]
+        target_x = target["x"]
+        target_y = target["y"]
+        target["health"] = max(0, target["health"] - self.ATTACK_DAMAGE)
+        changed.add(target_id)
+
+        attack_data = {
+            "type": "attack_event",
+            "attacker_id": attacker_id,
+            "target_id": target_id,
+            "damage": self.ATTACK_DAMAGE,
+            "remaining_health": target["health"]
+        }
+        if target["health"] <= 0:
+            respawn_x, respawn_y = self.get_valid_spawn_position()
+            target["health"] = self.MAX_HEALTH
+            target["x"] = respawn_x
+            target["y"] = respawn_y
+            self.player_grid.update(target_id, respawn_x, respawn_y)
+            attack_data["killed"] = True
+            attack_data["respawn_x"] = respawn_x
+            attack_data["respawn_y"] = respawn_y
+        events.append((target_x, target_y, attack_data))
+
+def zone_main(zone, zone_count, config, conn):
+    """Worker process: answer each tick message until the front-end goes away"""
+    simulation = ZoneSimulation(zone, zone_count, config)
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            break  # Front-end closed the pipe or died
+        if message is None:
+            break
+        conn.send(simulation.step(message))
+
+class ZonedServerMixin:
+    """Replaces GameServer.simulate with a round trip to the zone workers"""
+
+    def __init__(self, host='localhost', port=5555, tick_rate=30, broadcast_rate=None, zones=2):
+        super().__init__(host, port, tick_rate, broadcast_rate)
+        self.zone_count = zones
+        self.zone_conns = []
+        self.zone_processes = []
+        self.player_zone = {}  # Player ID -> zone that owns them
+
+        # Work for each zone, sent with its next tick message
+        self.zone_joins = [{} for _ in range(zones)]
+        self.zone_leaves = [[] for _ in range(zones)]
+        self.zone_hits = [[] for _ in range(zones)]
+
+        self.zone_step_duration = self.metrics.histogram("game_zone_step_seconds",
+                                                         "Time a zone worker spent on one tick", label="zone")
+        self.zone_round_trip = self.metrics.histogram("game_zone_round_trip_seconds",
+                                                      "Time the front-end waited for every zone to answer a tick")
+        self.zone_handoffs = self.metrics.counter("game_zone_handoffs_total", "Players handed to another zone")
+        self.zone_restarts = self.metrics.counter("game_zone_restarts_total",
+                                                  "Zone workers replaced after dying or not answering")
+        self.metrics.gauge("game_zone_count", "Zone worker processes", lambda: len(self.zone_processes))
+
+    def start(self):
+        self.start_zones()
+        super().start()
+
+    def close(self):
+        super().close()
+        self.stop_zones()
+
+    def start_zones(self):
+        """Spawn one worker process per zone"""
+        if self.zone_processes:
+            return
+        for zone in range(self.zone_count):
+            conn, process = self.start_zone(zone)
+            self.zone_conns.append(conn)
+            self.zone_processes.append(process)
+        print(f"Started {self.zone_count} zone workers")
+
+    def start_zone(self, zone):
+        """Spawn the worker process for a zone, returning its pipe and process"""
+        config = {
+            "max_health": self.MAX_HEALTH,
+            "attack_damage": self.ATTACK_DAMAGE,
+            "attack_cooldown": self.ATTACK_COOLDOWN,
+            "attack_range": self.ATTACK_RANGE,
+            "spawn": (self.spawn_x, self.spawn_y, self.spawn_range),
+            "map_seed": self.map_seed
+        }
+        # Spawned, not forked: the front-end has threads (and held locks) by now
+        context = multiprocessing.get_context("spawn")
+        parent_conn, child_conn = context.Pipe()
+        process = context.Process(target=zone_main, args=(zone, self.zone_count, config, child_conn))
+        process.daemon = True
+        process.start()
+        child_conn.close()
+        return parent_conn, process
+
+    def restart_zone(self, zone):
+        """Replace a zone's worker and rejoin its players to the new one"""
+        print(f"Zone {zone} worker stopped answering, restarting it")
+        self.zone_conns[zone].close()
+        self.zone_processes[zone].terminate()
+        self.zone_processes[zone].join(timeout=1.0)
+        self.zone_conns[zone], self.zone_processes[zone] = self.start_zone(zone)
+        self.zone_restarts.inc()
+
+        # The new worker starts empty, so everyone the zone owns joins it again
+        with self.lock:
+            players = self.players
+            self.zone_leaves[zone] = []
+            for player_id, player_zone in self.player_zone.items():
+                slot = players.slots.get(player_id)
+                if player_zone == zone and slot is not None:
+                    self.zone_joins[zone][player_id] = {"x": players.x[slot], "y": players.y[slot],
+                                                        "health": players.health[slot],
+                                                        "last_attack_time": players.last_attack_time[slot]}
+
+    def stop_zones(self):
+        for conn in self.zone_conns:
+            try:
+                conn.send(None)
+                conn.close()
+            except OSError:
+                pass
+        for process in self.zone_processes:
+            process.join(timeout=1.0)
+        self.zone_conns = []
+        self.zone_processes = []
+
+    def create_player(self, username, client, saved=None):
+        player_id, spawn_x, spawn_y = super().create_player(username, client, saved)
+        self.assign_zone(player_id)
+        return player_id, spawn_x, spawn_y
+
+    def assign_zone(self, player_id):
+        """Add a player from self.players to the zone containing them"""
+        with self.lock:
+            players = self.players
+            slot = players.slots.get(player_id)
+            if slot is None:
+                return
+            zone = zone_of(players.x[slot], self.zone_count)
+            self.player_zone[player_id] = zone
+            self.zone_joins[zone][player_id] = {"x": players.x[slot], "y": players.y[slot],
+                                                "health": players.health[slot],
+                                                "last_attack_time": players.last_attack_time[slot]}
+
+    def disconnect_player(self, player_id):
+        with self.lock:
+            zone = self.player_zone.pop(player_id, None)
+            if zone is not None and self.zone_joins[zone].pop(player_id, None) is None:
+                self.zone_leaves[zone].append(player_id)
+        super().disconnect_player(player_id)
+
+    def simulate(self, moves, attackers):
+        """Send each zone its share of the tick's inputs and merge the replies"""
+        messages = self.zone_messages(moves, attackers)
+        self.merge_zone_replies(self.exchange(messages), attackers)
+
+    def zone_messages(self, moves, attackers):
+        """Build this tick's message for every zone"""
+        if not self.zone_conns:
+            self.start_zones()
+        now = time.time()
+
+        with self.lock:
+            messages = []
+            for zone in range(self.zone_count):
+                messages.append({"time": now, "joins": self.zone_joins[zone], "leaves": self.zone_leaves[zone],
+                                 "hits": self.zone_hits[zone], "moves": {}, "attacks": [], "ghosts": {}})
+            self.zone_joins = [{} for _ in range(self.zone_count)]
+            self.zone_leaves = [[] for _ in range(self.zone_count)]
+            self.zone_hits = [[] for _ in range(self.zone_count)]
+
+            for player_id, position in moves.items():
+                zone = self.player_zone.get(player_id)
+                if zone is not None:
+                    messages[zone]["moves"][player_id] = position
+            for player_id in attackers:
+                zone = self.player_zone.get(player_id)
+                if zone is not None:
+                    messages[zone]["attacks"].append(player_id)
+            for zone, message in enumerate(messages):
+                if message["attacks"]:
+                    message["ghosts"] = self.border_ghosts(zone)
+        return messages
+
+    def exchange(self, messages):
+        """Send every zone its message and wait for the replies, without holding the lock
+
+        The zones work in parallel meanwhile. A zone whose worker died or
+        did not answer in time gets a new worker and a reply of None.
+        """
+        start = time.perf_counter()
+        sent = []
+        for conn, message in zip(self.zone_conns, messages):
+            try:
+                conn.send(message)
+                sent.append(True)
+            except (OSError, ValueError):
+                sent.append(False)  # Worker gone, its end of the pipe is closed
+
+        replies = []
+        for zone, conn in enumerate(self.zone_conns):
+            reply = None
+            try:
+                if sent[zone] and conn.poll(ZONE_REPLY_TIMEOUT):
+                    reply = conn.recv()
+            except (EOFError, OSError):
+                pass
+            if reply is None:
+                self.restart_zone(zone)
+            replies.append(reply)
+        self.zone_round_trip.observe(time.perf_counter() - start)
+        return replies
+
+    def merge_zone_replies(self, replies, attackers):
+        """Apply the zones' replies to the front-end's players and queue their events"""
+        if attackers:
+            # Zones resolve their attacks in parallel, so the slowest one is the batch time
+            self.attack_duration.observe(max((reply["attack_duration"] for reply in replies if reply), default=0.0))
+            self.attacks_resolved.inc(len(attackers))
+
+        with self.lock:
+            updates = 0
+            for zone, reply in enumerate(replies):
+                if reply is None:
+                    continue  # Lost with its worker, the players rejoin from our copy
+                self.zone_step_duration.observe(reply["duration"], zone)
+                for player_id, (x, y, health) in reply["states"].items():
+                    self.apply_zone_state(player_id, x, y, health)
+                updates += len(reply["states"])
+                for player_id, attack_time in reply["attack_times"].items():
+                    self.apply_attack_time(player_id, attack_time)
+
+                # Disconnected players were already told to leave, so only move the rest
+                for player_id, state in reply["handoffs"].items():
+                    if player_id not in self.player_zone:
+                        continue
+                    self.apply_zone_state(player_id, state["x"], state["y"], state["health"])
+                    self.apply_attack_time(player_id, state["last_attack_time"])
+                    new_zone = zone_of(state["x"], self.zone_count)
+                    self.player_zone[player_id] = new_zone
+                    self.zone_joins[new_zone][player_id] = state
+                    self.zone_handoffs.inc()
+                updates += len(reply["handoffs"])
+
+            # Route hits after the handoffs so they reach the target's new zone
+            for reply in replies:
+                if reply is None:
+                    continue
+                for attacker_id, target_id in reply["hits"]:
+                    zone = self.player_zone.get(target_id)
+                    if zone is not None:
+                        self.zone_hits[zone].append((attacker_id, target_id))
+                for event in reply["events"]:
+                    if event[2]["target_id"] in self.players:
+                        self.pending_events.append(event)
+            self.send_events()
+            if updates:
+                self.player_updates.inc(updates)
+
+    def apply_zone_state(self, player_id, x, y, health):
+        players = self.players
+        slot = players.slots.get(player_id)
+        if slot is None:
+            return
+        players.x[slot] = x
+        players.y[slot] = y
+        players.health[slot] = health
+        self.player_grid.update(player_id, x, y)
+        self.dirty_players.add(player_id)
+
+    def apply_attack_time(self, player_id, attack_time):
+        # Kept in step with the zones so a restarted worker keeps cooldowns running
+        slot = self.players.slots.get(player_id)
+        if slot is not None:
+            self.players.last_attack_time[slot] = attack_time
+
+    def border_ghosts(self, zone):
+        """Positions of other zones' players within attack range of a zone's strip (caller holds the lock)"""
+        left, right = zone_bounds(zone, self.zone_count)
+        left -= self.ATTACK_RANGE
+        right += self.ATTACK_RANGE
+        players = self.players
+        ghosts = {}
+        for player_id, player_zone in self.player_zone.items():
+            if player_zone != zone:
+                slot = players.slots[player_id]
+                if left <= players.x[slot] <= right:
+                    ghosts[player_id] = (players.x[slot], players.y[slot])
+        return ghosts
+
+class ZonedGameServer(ZonedServerMixin, GameServer):
+    """Threaded front-end with zone workers"""
+
+class ZonedAsyncGameServer(ZonedServerMixin, AsyncGameServer):
+    """asyncio front-end with zone workers"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Waits for the zones, apart from the default executor that logins queue on
+        self.zone_executor = ThreadPoolExecutor(1)
+
+    async def run_tick_async(self):
+        """Run tick() with the zone round trip in a thread, so the event loop is not blocked"""
+        try:
+            start = time.perf_counter()
+            moves, attackers = self.collect_inputs()
+            messages = self.zone_messages(moves, attackers)
+            replies = await asyncio.get_running_loop().run_in_executor(self.zone_executor, self.exchange, messages)
+            self.merge_zone_replies(replies, attackers)
+            self.finish_tick(start)
+        except Exception as e:
+            print(f"Error in tick: {e}")
+
+    def close(self):
+        super().close()
+        self.zone_executor.shutdown(wait=False)
+
+# Front-ends selectable with --zones, by --mode
+ZONED_SERVER_MODES = {
+    "threaded": ZonedGameServer,
+    "asyncio": ZonedAsyncGameServer,
+}